@@ -6,7 +6,8 @@ from users.models import User
 from .models import Account
 from .serializers import AccountSerializer
 
-from user_sessions.utils import verify_session, get_user_from_session
+from user_sessions.utils import get_auth_context
+from backend.writes import coordinated_write
 
 # Create your views here.
 
@@ -15,18 +16,18 @@ def list_all(request):
     if request.method != 'GET':
         return Response({"error":"Invalid request method."}, status=status.HTTP_400_BAD_REQUEST)
     
-    authorization_header = request.headers.get("Authorization")
+    auth = get_auth_context(request)
 
-    if not authorization_header:
+    if not auth.token:
         return Response({"error": "Authorization header missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    is_session_valid = verify_session(authorization_header)
+    is_session_valid = auth.is_valid
 
     if not is_session_valid:
         return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
     try:
-        user = get_user_from_session(authorization_header)
+        user = auth.user
     except User.DoesNotExist:
         return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
     
@@ -37,22 +38,23 @@ def list_all(request):
     return Response(accounts, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
+@coordinated_write('accounts.create_account')
 def create_account(request):
     if request.method != 'POST':
         return Response({"error":"Invalid request method."}, status=status.HTTP_400_BAD_REQUEST)
     
-    authorization_header = request.headers.get("Authorization")
+    auth = get_auth_context(request)
 
-    if not authorization_header:
+    if not auth.token:
         return Response({"error": "Authorization header missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    is_session_valid = verify_session(authorization_header)
+    is_session_valid = auth.is_valid
 
     if not is_session_valid:
         return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
     try:
-        user = get_user_from_session(authorization_header)
+        user = auth.user
     except User.DoesNotExist:
         return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
     
@@ -0,0 +1,150 @@
+"""
+Earnings time series bucketed by day, week or month.
+
+Sums for periods that have fully ended are stored in EarningsBucket the
+first time they are computed and served from there afterwards; only the
+open period and periods not yet cached are aggregated, with a single
+GROUP BY over the payment_details table. Payment detail changes drop the
+buckets covering the affected dates (see analytics.models).
+
+Stored buckets are read, and closed periods aggregated, on the primary even
+under @replica_reads: a bucket is kept until a payment detail in it changes,
+so totals read from a lagging replica would be served for good, and a
+bucket dropped on the primary could still be read from the replica.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from payments.models import PaymentDetail
+
+from .models import EarningsBucket
+
+INTERVALS = ("day", "week", "month")
+MAX_PERIODS = 1000
+EMPTY = (Decimal("0.00"), 0)
+
+
+def period_start(value, interval):
+    """Start of the (UTC) day, ISO week or month containing a date or datetime"""
+    if isinstance(value, datetime):
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        value = value.astimezone(dt_timezone.utc).date()
+    if interval == "day":
+        return value
+    if interval == "week":
+        return value - timedelta(days=value.weekday())
+    return value.replace(day=1)
+
+
+def next_period(start, interval):
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(weeks=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _periods(first, last, interval):
+    current = first
+    while current <= last:
+        yield current
+        current = next_period(current, interval)
+
+
+def _runs(periods, interval):
+    """Group sorted periods into contiguous [start, end) ranges"""
+    runs = []
+    for period in periods:
+        if runs and runs[-1][1] == period:
+            runs[-1][1] = next_period(period, interval)
+        else:
+            runs.append([period, next_period(period, interval)])
+    return runs
+
+
+def _aggregate(interval, periods, using=None):
+    """Sum payment details per period for the given periods in one GROUP BY"""
+    ranges = Q()
+    for start, end in _runs(periods, interval):
+        ranges |= Q(
+            payment_date__gte=datetime.combine(start, time.min, dt_timezone.utc),
+            payment_date__lt=datetime.combine(end, time.min, dt_timezone.utc),
+        )
+    rows = (
+        PaymentDetail.objects.db_manager(using).order_by()
+        .filter(ranges)
+        .annotate(period=Trunc("payment_date", interval, output_field=models.DateField(), tzinfo=dt_timezone.utc))
+        .values("period")
+        .annotate(total=Sum("amount"), payment_count=Count("id"))
+    )
+    return {row["period"]: (row["total"], row["payment_count"]) for row in rows}
+
+
+def earnings_series(interval, start, end):
+    """
+    Return [(period_start, total, payment_count)] for every period from the
+    one containing `start` to the one containing `end`, empty periods included.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"interval must be one of: {', '.join(INTERVALS)}.")
+
+    first, last = period_start(start, interval), period_start(end, interval)
+    open_period = period_start(timezone.now(), interval)
+    periods = list(_periods(first, last, interval))
+    if len(periods) > MAX_PERIODS:
+        raise ValueError(f"Range spans more than {MAX_PERIODS} {interval}s; use a wider interval.")
+
+    # Buckets are invalidated on the primary; a replica could still serve a deleted one
+    cached = {
+        bucket.period_start: (bucket.total, bucket.payment_count)
+        for bucket in EarningsBucket.objects.using(DEFAULT_DB_ALIAS).filter(
+            interval=interval, period_start__gte=first, period_start__lte=last)
+    }
+    missing = [period for period in periods if period not in cached]
+    # Only periods that have ended are stored; the open one is always recomputed
+    closed = [period for period in missing if period < open_period]
+    current = [period for period in missing if period >= open_period]
+
+    computed = {}
+    if current:
+        computed.update(_aggregate(interval, current))
+    if closed:
+        computed.update(_aggregate(interval, closed, using=DEFAULT_DB_ALIAS))
+        EarningsBucket.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+            [
+                EarningsBucket(interval=interval, period_start=period, total=total, payment_count=payment_count)
+                for period in closed
+                for total, payment_count in [computed.get(period, EMPTY)]
+            ],
+            ignore_conflicts=True,
+        )
+
+    return [(period, *cached.get(period, computed.get(period, EMPTY))) for period in periods]
+
+
+def default_range(interval):
+    """Twelve periods ending with the current one"""
+    end = timezone.now().date()
+    start = period_start(end, interval)
+    for _ in range(11):
+        start = period_start(start - timedelta(days=1), interval)
+    return start, end
+
+
+def parse_range_dates(raw_start, raw_end, interval):
+    """Parse the `from`/`to` query values (YYYY-MM-DD), defaulting to default_range()"""
+    default_start, default_end = default_range(interval)
+    start = parse_date(raw_start) if raw_start else default_start
+    end = parse_date(raw_end) if raw_end else default_end
+    if start is None or end is None:
+        raise ValueError("Dates must be formatted as YYYY-MM-DD.")
+    if start > end:
+        raise ValueError("'from' must not be after 'to'.")
+    return start, end
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from analytics.models import DashboardSnapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dashboard KPI snapshot from the source tables to correct any drift."
+
+    def handle(self, *args, **options):
+        before = DashboardSnapshot.objects.filter(pk=DashboardSnapshot.SNAPSHOT_ID).values().first()
+        snapshot = DashboardSnapshot.recompute()
+        after = DashboardSnapshot.objects.filter(pk=snapshot.pk).values().first()
+
+        ignored = {"computed_at"}
+        drifted = [
+            f"{field}: {before[field]} -> {value}"
+            for field, value in after.items()
+            if before is not None and field not in ignored and before[field] != value
+        ]
+        for line in drifted:
+            self.stdout.write(f"  {line}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Dashboard snapshot recomputed ({len(drifted)} drifted field(s))."
+        ))
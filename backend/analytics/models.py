@@ -0,0 +1,373 @@
+import logging
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from backend.batching import after_commit, defer
+from backend.writes import WriteContention, run_write
+
+from customers.models import Customer
+from niches.models import Niche, niche_status_changed
+from occupants.models import Occupant
+from payments.models import Payment, PaymentDetail
+
+logger = logging.getLogger(__name__)
+
+# API resources with a ResourceVersion, and the models each one is built from
+RESOURCE_MODELS = {
+    'niches': (Niche, Occupant),
+    'occupants': (Occupant, Niche),
+    'customers': (Customer,),
+    'payments': (Payment, PaymentDetail),
+}
+
+# Readers rebuilding a stale dashboard snapshot hold this key in the default cache
+SNAPSHOT_REBUILD_KEY = 'analytics.snapshot_rebuild'
+SNAPSHOT_REBUILD_LEASE = 60
+
+# Niche statuses with their own dashboard counter
+NICHE_STATUS_FIELDS = {
+    'Available': 'available_niches',
+    'Occupied': 'occupied_niches',
+    'Full': 'full_niches',
+}
+
+
+def month_start(value=None):
+    """First day of the (UTC) month of a datetime, matching the dashboard's monthly window"""
+    value = value or timezone.now()
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value.astimezone(dt_timezone.utc).date().replace(day=1)
+
+
+# Create your models here.
+class DashboardSnapshot(models.Model):
+    """
+    Single-row table holding the dashboard KPIs. Signals keep it current with
+    relative updates; recompute() rebuilds it from the source tables. The row
+    and its sources are read from the primary, also in @replica_reads views,
+    so a rebuild from a lagging replica never overwrites the applied deltas.
+    """
+    SNAPSHOT_ID = 1
+    # ResourceVersion bumped whenever the row changes, for cached dashboard responses
+    RESOURCE = 'dashboard'
+
+    total_niches = models.IntegerField(default=0)
+    available_niches = models.IntegerField(default=0)
+    occupied_niches = models.IntegerField(default=0)
+    full_niches = models.IntegerField(default=0)
+    total_customers = models.IntegerField(default=0)
+    total_occupants = models.IntegerField(default=0)
+    total_earnings = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    month = models.DateField()
+    monthly_earnings = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Dashboard snapshot computed at {self.computed_at}"
+
+    @property
+    def is_stale(self):
+        max_age = getattr(settings, 'DASHBOARD_SNAPSHOT_MAX_AGE', 900)
+        return (
+            self.month != month_start()
+            or (max_age is not None and timezone.now() - self.computed_at > timedelta(seconds=max_age))
+        )
+
+    @classmethod
+    def recompute(cls):
+        """Rebuild the snapshot from the source tables"""
+        month = month_start()
+        niches = Niche.objects.using(DEFAULT_DB_ALIAS).aggregate(
+            total_niches=Count('id'),
+            **{field: Count('id', filter=Q(status=niche_status)) for niche_status, field in NICHE_STATUS_FIELDS.items()}
+        )
+        earnings = PaymentDetail.objects.using(DEFAULT_DB_ALIAS).order_by().aggregate(
+            total_earnings=Sum('amount'),
+            monthly_earnings=Sum('amount', filter=Q(payment_date__gte=datetime.combine(month, time.min, dt_timezone.utc))),
+        )
+        snapshot, _ = cls.objects.update_or_create(pk=cls.SNAPSHOT_ID, defaults={
+            **niches,
+            'total_customers': Customer.objects.using(DEFAULT_DB_ALIAS).count(),
+            'total_occupants': Occupant.objects.using(DEFAULT_DB_ALIAS).count(),
+            'total_earnings': earnings['total_earnings'] or Decimal('0.00'),
+            'month': month,
+            'monthly_earnings': earnings['monthly_earnings'] or Decimal('0.00'),
+            'computed_at': timezone.now(),
+        })
+        ResourceVersion.bump(cls.RESOURCE)
+        return snapshot
+
+    @classmethod
+    def current(cls):
+        """Return the snapshot, rebuilding it when missing, older than the max age or from a past month"""
+        snapshot = cls.objects.using(DEFAULT_DB_ALIAS).filter(pk=cls.SNAPSHOT_ID).first()
+        if snapshot is None or snapshot.is_stale:
+            snapshot = cls._rebuild(snapshot)
+        return snapshot
+
+    @classmethod
+    async def acurrent(cls):
+        """Async current(); the rare rebuild runs in a thread, as it writes"""
+        snapshot = await cls.objects.using(DEFAULT_DB_ALIAS).filter(pk=cls.SNAPSHOT_ID).afirst()
+        if snapshot is None or snapshot.is_stale:
+            snapshot = await sync_to_async(cls._rebuild)(snapshot)
+        return snapshot
+
+    @classmethod
+    def _rebuild(cls, stale):
+        """
+        Rebuild on read through run_write(), one reader at a time. While
+        another reader rebuilds, or when the database stays locked, the stale
+        row is served; with no row at all WriteContention is raised.
+        """
+        # In the default cache, so the lease spans workers when that cache is shared
+        leased = cache.add(SNAPSHOT_REBUILD_KEY, True, SNAPSHOT_REBUILD_LEASE)
+        if not leased and stale is not None:
+            return stale
+        try:
+            return run_write('analytics.dashboard_snapshot', cls._recompute_if_stale)
+        except WriteContention:
+            if stale is None:
+                raise
+            logger.warning("Serving the stale dashboard snapshot from %s; the database is locked", stale.computed_at)
+            return stale
+        finally:
+            if leased:
+                cache.delete(SNAPSHOT_REBUILD_KEY)
+
+    @classmethod
+    def _recompute_if_stale(cls):
+        # Holding the write lock now; another worker may have rebuilt the row meanwhile
+        snapshot = cls.objects.using(DEFAULT_DB_ALIAS).filter(pk=cls.SNAPSHOT_ID).first()
+        if snapshot is None or snapshot.is_stale:
+            snapshot = cls.recompute()
+        return snapshot
+
+    @classmethod
+    def apply_delta(cls, earnings=(), **counters):
+        """
+        Adjust counters by relative amounts once the current transaction commits.
+        `earnings` is a list of (amount, payment_date) changes.
+        """
+        change = Counter(counters)
+        for amount, payment_date in earnings:
+            change['total_earnings'] += amount
+            change[('month', month_start(payment_date))] += amount
+        defer('dashboard_snapshot', cls._apply_change, change)
+
+    @classmethod
+    def _apply_change(cls, change):
+        # After commit so rolled-back writes are never counted and the row is not locked for the transaction
+        after_commit('dashboard_snapshot', cls._write_change, change)
+
+    @classmethod
+    def _write_change(cls, change):
+        updates = {field: F(field) + delta for field, delta in change.items() if isinstance(field, str) and delta}
+        monthly = [(key[1], amount) for key, amount in change.items() if isinstance(key, tuple) and amount]
+        if monthly:
+            # Payments dated in or after the snapshot's month count towards it
+            expression = F('monthly_earnings')
+            for month, amount in monthly:
+                expression = expression + Case(
+                    When(month__lte=month, then=Value(amount)),
+                    default=Value(Decimal('0')),
+                    output_field=models.DecimalField(max_digits=14, decimal_places=2),
+                )
+            updates['monthly_earnings'] = expression
+        if updates:
+            cls.objects.filter(pk=cls.SNAPSHOT_ID).update(**updates)
+            ResourceVersion.bump(cls.RESOURCE)
+
+
+class EarningsBucket(models.Model):
+    """Cached PaymentDetail totals for a day, week or month that has ended (see analytics.earnings)"""
+    interval = models.CharField(max_length=5) # day, week or month
+    period_start = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    payment_count = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['interval', 'period_start'], name='unique_earnings_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.interval} from {self.period_start}: {self.total}"
+
+
+class ResourceVersion(models.Model):
+    """
+    Change counter for an API resource, bumped after every committed change to
+    a model it is built from (see RESOURCE_MODELS and backend.conditional).
+    """
+    resource = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.resource} v{self.version}"
+
+    @classmethod
+    def current(cls, resources):
+        """Return {resource: version}; resources never changed are at version 0"""
+        versions = dict(cls.objects.filter(resource__in=resources).values_list('resource', 'version'))
+        return {resource: versions.get(resource, 0) for resource in resources}
+
+    @classmethod
+    async def acurrent(cls, resources):
+        versions = {resource: version async for resource, version
+                    in cls.objects.filter(resource__in=resources).values_list('resource', 'version')}
+        return {resource: versions.get(resource, 0) for resource in resources}
+
+    @classmethod
+    def bump(cls, *resources):
+        """Advance the versions of `resources` once the current transaction commits"""
+        defer('resource_versions', cls._apply_bump, set(resources))
+
+    @classmethod
+    def _apply_bump(cls, resources):
+        # After commit, so a client can never get the new version with the old rows
+        after_commit('resource_versions', cls._write_bump, resources)
+
+    @classmethod
+    def _write_bump(cls, resources):
+        if cls.objects.filter(resource__in=resources).update(version=F('version') + 1) < len(resources):
+            cls.objects.bulk_create([cls(resource=resource, version=1) for resource in resources],
+                                    ignore_conflicts=True)
+
+
+MODEL_RESOURCES = {
+    model: [resource for resource, sources in RESOURCE_MODELS.items() if model in sources]
+    for sources in RESOURCE_MODELS.values()
+    for model in sources
+}
+
+
+def invalidate_earnings_buckets(*payment_dates):
+    """Drop cached buckets covering the given payment dates once the change commits"""
+    from .earnings import INTERVALS, period_start
+
+    buckets = {
+        (interval, period_start(payment_date, interval))
+        for payment_date in payment_dates
+        for interval in INTERVALS
+    }
+    defer('earnings_buckets', _drop_earnings_buckets, buckets)
+
+
+def _drop_earnings_buckets(buckets):
+    after_commit('earnings_buckets', _delete_earnings_buckets, buckets)
+
+
+def _delete_earnings_buckets(buckets):
+    query = Q()
+    for interval, start in buckets:
+        query |= Q(interval=interval, period_start=start)
+    if query:
+        EarningsBucket.objects.filter(query).delete()
+
+
+@receiver(post_save, sender=Niche)
+def update_snapshot_on_niche_save(sender, instance, created, raw=False, **kwargs):
+    # Status changes on existing niches are written by niches.models.refresh_statuses(),
+    # which reports them through niche_status_changed
+    if created and not raw:
+        instance._loaded_status = instance.status
+        _apply_niche_status_change(None, instance.status, total_niches=1)
+
+
+@receiver(niche_status_changed)
+def update_snapshot_on_niche_status_change(sender, previous_status, status, count=1, **kwargs):
+    _apply_niche_status_change(previous_status, status, count)
+
+
+def _apply_niche_status_change(previous_status, status, count=1, **counters):
+    counters = Counter(counters)
+    counters[NICHE_STATUS_FIELDS.get(previous_status)] -= count
+    counters[NICHE_STATUS_FIELDS.get(status)] += count
+    counters.pop(None, None)
+    DashboardSnapshot.apply_delta(**counters)
+
+
+@receiver(post_delete, sender=Niche)
+def update_snapshot_on_niche_delete(sender, instance, **kwargs):
+    counters = {'total_niches': -1}
+    field = NICHE_STATUS_FIELDS.get(getattr(instance, '_loaded_status', instance.status))
+    if field:
+        counters[field] = -1
+    DashboardSnapshot.apply_delta(**counters)
+
+
+@receiver(post_save, sender=Occupant)
+def update_snapshot_on_occupant_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        DashboardSnapshot.apply_delta(total_occupants=1)
+
+
+@receiver(post_delete, sender=Occupant)
+def update_snapshot_on_occupant_delete(sender, instance, **kwargs):
+    DashboardSnapshot.apply_delta(total_occupants=-1)
+
+
+@receiver(post_save, sender=Customer)
+def update_snapshot_on_customer_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        DashboardSnapshot.apply_delta(total_customers=1)
+
+
+@receiver(post_delete, sender=Customer)
+def update_snapshot_on_customer_delete(sender, instance, **kwargs):
+    DashboardSnapshot.apply_delta(total_customers=-1)
+
+
+def _earning(amount, payment_date, sign=1):
+    # Values assigned in code may still be strings or floats before a refresh
+    amount = PaymentDetail._meta.get_field('amount').to_python(amount)
+    payment_date = PaymentDetail._meta.get_field('payment_date').to_python(payment_date)
+    return sign * amount, payment_date
+
+
+@receiver(post_save, sender=PaymentDetail)
+def update_snapshot_on_payment_detail_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    earnings = [_earning(instance.amount, instance.payment_date)]
+    if not created:
+        stored_amount, stored_date = instance.stored_value('amount'), instance.stored_value('payment_date')
+        if stored_amount is None or stored_date is None:
+            # Previous values unknown; the snapshot's max age bounds the drift
+            invalidate_earnings_buckets(earnings[0][1])
+            return
+        earnings.append(_earning(stored_amount, stored_date, sign=-1))
+    DashboardSnapshot.apply_delta(earnings=earnings)
+    invalidate_earnings_buckets(*{payment_date for _, payment_date in earnings})
+
+
+@receiver(post_delete, sender=PaymentDetail)
+def update_snapshot_on_payment_detail_delete(sender, instance, **kwargs):
+    amount = instance.stored_value('amount')
+    payment_date = instance.stored_value('payment_date')
+    earning = _earning(instance.amount if amount is None else amount,
+                       instance.payment_date if payment_date is None else payment_date, sign=-1)
+    DashboardSnapshot.apply_delta(earnings=[earning])
+    invalidate_earnings_buckets(earning[1])
+
+
+@receiver([post_save, post_delete], sender=Niche)
+@receiver([post_save, post_delete], sender=Occupant)
+@receiver([post_save, post_delete], sender=Customer)
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=PaymentDetail)
+def bump_resource_versions(sender, raw=False, **kwargs):
+    if not raw:
+        ResourceVersion.bump(*MODEL_RESOURCES[sender])
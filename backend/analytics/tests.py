@@ -0,0 +1,225 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.connection import ConnectionDoesNotExist
+
+from backend import replicas
+from backend.testing import SignedInMixin, auth_headers, sign_in
+from backend.writes import WriteContention
+from customers.models import Customer
+from niches.models import Niche
+from payments.models import Payment, PaymentDetail
+from roles.models import Role
+from user_sessions.models import Session
+from user_sessions.utils import AuthContext
+from users.models import User
+
+from . import earnings
+from .models import SNAPSHOT_REBUILD_KEY, DashboardSnapshot
+
+
+@contextmanager
+def replica_reads():
+    """Route reads as @replica_reads does, to a 'replica' alias that does not exist"""
+    with override_settings(REPLICA_DATABASE="replica"):
+        token = replicas._replica_reads.set(True)
+        try:
+            yield
+        finally:
+            replicas._replica_reads.reset(token)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    router = replicas.ReplicaRouter()
+
+    def test_reads_go_to_the_replica_only_inside_replica_reads(self):
+        self.assertEqual(self.router.db_for_read(Niche), DEFAULT_DB_ALIAS)
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Niche), "replica")
+            self.assertEqual(self.router.db_for_write(Niche), DEFAULT_DB_ALIAS)
+
+    def test_without_a_replica_everything_reads_the_primary(self):
+        with replica_reads(), override_settings(REPLICA_DATABASE=None):
+            self.assertEqual(self.router.db_for_read(Niche), DEFAULT_DB_ALIAS)
+
+    def test_authentication_tables_stay_on_the_primary(self):
+        with replica_reads():
+            for model in (Session, User, Role):
+                self.assertEqual(self.router.db_for_read(model), DEFAULT_DB_ALIAS)
+
+    def test_transactions_read_the_primary(self):
+        with replica_reads(), mock.patch.object(transaction.get_connection(), "in_atomic_block", True):
+            self.assertEqual(self.router.db_for_read(Niche), DEFAULT_DB_ALIAS)
+
+
+class ReplicaReadsTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get("/")
+        user = User(pk=7, username="staff")
+        self.request.auth_context = AuthContext("token", Session(user=user, expiry=datetime.max.replace(tzinfo=dt_timezone.utc)))
+
+    @staticmethod
+    @replicas.replica_reads
+    def view(request):
+        return replicas._replica_reads.get()
+
+    def test_routes_the_view_and_resets_afterwards(self):
+        with override_settings(REPLICA_DATABASE="replica"):
+            self.assertTrue(self.view(self.request))
+        self.assertFalse(replicas._replica_reads.get())
+
+    def test_pinned_users_read_the_primary(self):
+        with override_settings(REPLICA_DATABASE="replica"):
+            replicas.pin_to_primary(7)
+            self.assertTrue(replicas.is_pinned(7))
+            self.assertFalse(self.view(self.request))
+
+
+@override_settings(REPLICA_DATABASE="replica", AUDIT_ASYNC=False)
+class ReplicaPinMiddlewareTests(SignedInMixin, TestCase):
+    permissions = ("view_dashboard", "add_record")
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def create(self, data):
+        return self.client.post("/api/customers/create-new/", data, headers=self.auth)
+
+    def test_successful_write_pins_the_user(self):
+        self.assertEqual(self.create({"name": "Ana"}).status_code, 201)
+        self.assertTrue(replicas.is_pinned(self.user.pk))
+
+    def test_rejected_write_does_not_pin(self):
+        self.assertEqual(self.create({}).status_code, 400)
+        self.assertFalse(replicas.is_pinned(self.user.pk))
+
+    def test_reads_do_not_pin(self):
+        self.client.get("/api/customers/list-all/", headers=self.auth)
+        self.assertFalse(replicas.is_pinned(self.user.pk))
+
+
+class PrimaryReadsTests(TransactionTestCase):
+    """Outside a transaction, so reads really are routed; any read sent to the replica raises"""
+
+    def setUp(self):
+        Niche.objects.create(amount=1000, location="A-1", max_occupants=2)
+        Customer.objects.create(name="Ana")
+
+    def test_routed_reads_reach_the_replica(self):
+        with replica_reads(), self.assertRaises(ConnectionDoesNotExist):
+            Niche.objects.count()
+
+    def test_snapshot_reads_the_primary(self):
+        with replica_reads():
+            snapshot = DashboardSnapshot.recompute()
+            self.assertEqual((snapshot.total_niches, snapshot.total_customers), (1, 1))
+            self.assertEqual(DashboardSnapshot.current().pk, snapshot.pk)
+
+    def test_stored_earnings_periods_are_computed_on_the_primary(self):
+        start, end = datetime(2024, 1, 1, tzinfo=dt_timezone.utc), datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        with replica_reads(), mock.patch.object(earnings, "_aggregate", wraps=earnings._aggregate) as aggregate:
+            earnings.earnings_series("month", start, end)
+            # Now served from the stored buckets, still without touching the replica
+            earnings.earnings_series("month", start, end)
+
+        # Every period of the range has ended, so all of them are stored in one primary query
+        aggregate.assert_called_once()
+        self.assertEqual(aggregate.call_args.kwargs, {"using": DEFAULT_DB_ALIAS})
+        self.assertEqual(earnings.EarningsBucket.objects.filter(interval="month").count(), 3)
+
+
+class StaleSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        DashboardSnapshot.recompute()
+        DashboardSnapshot.objects.update(computed_at=timezone.now() - timedelta(days=1))
+        # Counted by the rebuild only; signal deltas need a commit
+        Customer.objects.create(name="Ana")
+
+    def test_stale_snapshot_is_rebuilt(self):
+        snapshot = DashboardSnapshot.current()
+
+        self.assertFalse(snapshot.is_stale)
+        self.assertEqual(snapshot.total_customers, 1)
+
+    def test_locked_database_serves_the_stale_snapshot(self):
+        with mock.patch("analytics.models.run_write", side_effect=WriteContention("locked")):
+            snapshot = DashboardSnapshot.current()
+
+        self.assertTrue(snapshot.is_stale)
+        self.assertEqual(snapshot.total_customers, 0)
+        self.assertIsNone(cache.get(SNAPSHOT_REBUILD_KEY))
+
+    def test_readers_do_not_rebuild_while_another_one_is(self):
+        cache.add(SNAPSHOT_REBUILD_KEY, True)
+        with mock.patch.object(DashboardSnapshot, "recompute") as recompute:
+            snapshot = DashboardSnapshot.current()
+
+        recompute.assert_not_called()
+        self.assertTrue(snapshot.is_stale)
+
+    async def test_async_reader_serves_the_stale_snapshot(self):
+        with mock.patch("analytics.models.run_write", side_effect=WriteContention("locked")):
+            snapshot = await DashboardSnapshot.acurrent()
+        self.assertEqual(snapshot.total_customers, 0)
+
+    def test_missing_snapshot_on_a_locked_database_answers_503(self):
+        DashboardSnapshot.objects.all().delete()
+        _, token = sign_in("view_dashboard")
+
+        with mock.patch("analytics.models.run_write", side_effect=WriteContention("locked")):
+            response = self.client.get("/api/analytics/data/", headers=auth_headers(token))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+
+
+class CacheStatsTests(SignedInMixin, TestCase):
+    permissions = ("view_audit",)
+
+    def test_reports_the_audit_writer_queue(self):
+        response = self.client.get("/api/analytics/cache-stats/", headers=self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        writer = response.json()["audit_writer"]
+        for key in ("queue_depth", "queue_capacity", "enqueued", "written", "dropped", "failed"):
+            self.assertIn(key, writer)
+
+
+class PaymentDetailDeltaTests(TestCase):
+    def setUp(self):
+        self.payment = Payment.objects.create(payer="Test", amount_due=Decimal("500.00"), maintenance_fee=Decimal("0.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            PaymentDetail.post(self.payment.pk, Decimal("100.00"))
+        DashboardSnapshot.recompute()
+
+    def total_earnings(self):
+        return DashboardSnapshot.objects.get().total_earnings
+
+    def test_edit_applies_the_difference_from_the_stored_amount(self):
+        detail = PaymentDetail.objects.get()
+        detail.amount = Decimal("150.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            detail.save()
+        self.assertEqual(self.total_earnings(), Decimal("150.00"))
+
+        # Saved again from the same instance: the stored amount is now 150
+        detail.amount = Decimal("120.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            detail.save()
+        self.assertEqual(self.total_earnings(), Decimal("120.00"))
+
+    def test_delete_subtracts_the_stored_amount(self):
+        detail = PaymentDetail.objects.get()
+        detail.amount = Decimal("999.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            detail.delete()
+        self.assertEqual(self.total_earnings(), Decimal("0.00"))
@@ -1,6 +1,9 @@
 from django.urls import path
+from backend.async_views import read_view
 from .views import *
 
 urlpatterns = [
-    path('data/', get_analytics_data, name='get_analytics_data'),
+    path('data/', read_view(get_analytics_data, aget_analytics_data), name='get_analytics_data'),
+    path('earnings/', get_earnings_series, name='get_earnings_series'),
+    path('cache-stats/', get_cache_stats, name='get_cache_stats'),
 ]
\ No newline at end of file
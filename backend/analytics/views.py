@@ -2,86 +2,165 @@ from django.shortcuts import render
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Sum, Count
-from django.utils import timezone
-from datetime import datetime, timedelta
-from decimal import Decimal
+from django.views.decorators.http import require_GET
 
-from niches.models import Niche
-from payments.models import Payment, PaymentDetail
-from customers.models import Customer
-from occupants.models import Occupant
-from user_sessions.utils import verify_session, get_user_from_session
+from user_sessions.utils import aget_auth_context, get_auth_context
+from backend.response_cache import acached_response, cached_response, get_cache_stats as get_response_cache_stats
+from roles.cache import get_cache_stats as get_role_cache_stats
+from user_sessions.cache import get_cache_stats as get_session_cache_stats
+from audit.writer import get_writer_stats as get_audit_writer_stats
+from backend.writes import WriteContention, acontention_response, contention_response, get_write_stats
+from backend.replicas import replica_reads
+from backend.async_views import json_response
+from .models import DashboardSnapshot, month_start
+from .earnings import earnings_series, parse_range_dates
 
 
 @api_view(['GET'])
+@replica_reads
 def get_analytics_data(request):
     """Get all analytics data for the dashboard"""
-    authorization_header = request.headers.get("Authorization")
-    if not authorization_header:
+    auth = get_auth_context(request)
+    if not auth.token:
         return Response({"error": "Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    if not verify_session(authorization_header):
+    if not auth.is_valid:
         return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    user = get_user_from_session(authorization_header)
+    user = auth.user
     if not user.has_permission("view_dashboard"):
         return Response({"error": "You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
     
+    def respond():
+        try:
+            # KPIs come from the incrementally maintained snapshot row
+            return Response(dashboard_data(DashboardSnapshot.current()), status=status.HTTP_200_OK)
+        except WriteContention:
+            # Only when there is no snapshot yet to fall back on
+            return contention_response()
+        except Exception as e:
+            return Response({"error": f"Error fetching analytics data: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    # Keyed by month too, since the monthly figure rolls over without any data change
+    return cached_response(request, f'analytics.dashboard.{month_start():%Y-%m}', [DashboardSnapshot.RESOURCE],
+                           respond, conditional=False)
+
+
+@require_GET
+@replica_reads
+async def aget_analytics_data(request):
+    """get_analytics_data for the ASGI deployment (see backend/async_views.py)"""
+    auth = await aget_auth_context(request)
+    if not auth.token:
+        return json_response({"error": "Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.is_valid:
+        return json_response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_dashboard"):
+        return json_response({"error": "You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
+
+    async def respond():
+        try:
+            return json_response(dashboard_data(await DashboardSnapshot.acurrent()))
+        except WriteContention:
+            return acontention_response()
+        except Exception as e:
+            return json_response({"error": f"Error fetching analytics data: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return await acached_response(request, f'analytics.dashboard.{month_start():%Y-%m}', [DashboardSnapshot.RESOURCE],
+                                  respond, conditional=False)
+
+
+def dashboard_data(snapshot):
+    """Body of the analytics endpoint, from the dashboard snapshot"""
+    # 1. Occupancy Rate Data
+    total_niches = snapshot.total_niches
+    occupied_niches = snapshot.occupied_niches
+    full_niches = snapshot.full_niches
+    available_niches = snapshot.available_niches
+
+    # Total occupied includes both 'Occupied' and 'Full' for rate calculation
+    total_occupied = occupied_niches + full_niches
+
+    occupancy_data = {
+        'occupied': occupied_niches,
+        'full': full_niches,
+        'available': available_niches,
+        'total': total_niches,
+        'occupancy_rate': round((total_occupied / total_niches * 100), 2) if total_niches > 0 else 0
+    }
+
+    # 2. Total Earnings
+    total_earnings = snapshot.total_earnings
+
+    # 3. Monthly Earnings (current month)
+    monthly_earnings = snapshot.monthly_earnings
+
+    # Additional KPI data
+    kpi_data = {
+        'total_niches': total_niches,
+        'occupied_niches': occupied_niches,
+        'full_niches': full_niches,
+        'available_niches': available_niches,
+        'total_customers': snapshot.total_customers,
+        'total_occupants': snapshot.total_occupants
+    }
+
+    return {
+        'occupancy': occupancy_data,
+        'total_earnings': float(total_earnings),
+        'monthly_earnings': float(monthly_earnings),
+        'kpi': kpi_data
+    }
+
+
+@api_view(['GET'])
+@replica_reads
+def get_earnings_series(request):
+    """Earnings per day, week or month between `from` and `to` (YYYY-MM-DD)"""
+    auth = get_auth_context(request)
+    if not auth.token:
+        return Response({"error": "Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    if not auth.is_valid:
+        return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    if not auth.has_permission("view_dashboard"):
+        return Response({"error": "You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
+    
+    interval = request.query_params.get('interval', 'month')
     try:
-        # 1. Occupancy Rate Data
-        total_niches = Niche.objects.count()
-        occupied_niches = Niche.objects.filter(status='Occupied').count()
-        full_niches = Niche.objects.filter(status='Full').count()
-        available_niches = Niche.objects.filter(status='Available').count()
-        
-        # Total occupied includes both 'Occupied' and 'Full' for rate calculation
-        total_occupied = occupied_niches + full_niches
-        
-        occupancy_data = {
-            'occupied': occupied_niches,
-            'full': full_niches,
-            'available': available_niches,
-            'total': total_niches,
-            'occupancy_rate': round((total_occupied / total_niches * 100), 2) if total_niches > 0 else 0
-        }
-        
-        # 2. Total Earnings
-        total_earnings = PaymentDetail.objects.aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        # 3. Monthly Earnings (current month)
-        now = timezone.now()
-        current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_earnings = PaymentDetail.objects.filter(
-            payment_date__gte=current_month_start
-        ).aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        # 4. Customer Count
-        total_customers = Customer.objects.count()
-        
-        # 5. Occupant Count
-        total_occupants = Occupant.objects.count()
-        
-        # Additional KPI data
-        kpi_data = {
-            'total_niches': total_niches,
-            'occupied_niches': occupied_niches,
-            'full_niches': full_niches,
-            'available_niches': available_niches,
-            'total_customers': total_customers,
-            'total_occupants': total_occupants
-        }
-        
-        return Response({
-            'occupancy': occupancy_data,
-            'total_earnings': float(total_earnings),
-            'monthly_earnings': float(monthly_earnings),
-            'kpi': kpi_data
-        }, status=status.HTTP_200_OK)
-        
-    except Exception as e:
-        return Response({"error": f"Error fetching analytics data: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        start, end = parse_range_dates(request.query_params.get('from'), request.query_params.get('to'), interval)
+        series = earnings_series(interval, start, end)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'interval': interval,
+        'from': series[0][0],
+        'to': series[-1][0],
+        'series': [
+            {'period': period, 'total': float(total), 'payment_count': payment_count}
+            for period, total, payment_count in series
+        ]
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_cache_stats(request):
+    """
+    Hit rates of this worker's response, role permission and session token
+    caches, its write lock waits and its audit writer's queue
+    """
+    auth = get_auth_context(request)
+    if not auth.is_valid:
+        return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_audit"):
+        return Response({"error": "You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
+
+    return Response({
+        "responses": get_response_cache_stats(),
+        "role_permissions": get_role_cache_stats(),
+        "sessions": get_session_cache_stats(),
+        "writes": get_write_stats(),
+        "audit_writer": get_audit_writer_stats(),
+    }, status=status.HTTP_200_OK)
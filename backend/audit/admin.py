@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import AuditLog
+from .models import AuditArchive, AuditLog, AuditLogTarget
 
 # Register your models here.
-admin.site.register(AuditLog)
\ No newline at end of file
+admin.site.register(AuditLog)
+admin.site.register(AuditArchive)
+admin.site.register(AuditLogTarget)
\ No newline at end of file
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from audit.retention import archive_audit_logs
+
+
+class Command(BaseCommand):
+    help = "Move audit logs older than the retention window into compressed, date-partitioned archive files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days", type=int, default=None,
+            help="Archive rows older than this many days (default: AUDIT_RETENTION_DAYS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows archived and deleted per transaction.")
+
+    def handle(self, *args, **options):
+        days = options["older_than_days"]
+        if days is None:
+            days = getattr(settings, "AUDIT_RETENTION_DAYS", 90)
+        archived = archive_audit_logs(older_than_days=days, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} audit log(s) older than {days} day(s)."))
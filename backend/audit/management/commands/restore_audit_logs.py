@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from audit.retention import restore_audit_logs
+
+
+class Command(BaseCommand):
+    help = "Restore archived audit logs for a date range back into the audit table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", help="First day to restore (YYYY-MM-DD).")
+        parser.add_argument("end", nargs="?", help="Last day to restore (YYYY-MM-DD). Defaults to start.")
+
+    def handle(self, *args, **options):
+        start = parse_date(options["start"])
+        end = parse_date(options["end"]) if options["end"] else start
+        if not start or not end:
+            raise CommandError("Dates must be in YYYY-MM-DD format.")
+
+        restored = restore_audit_logs(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Restored {restored} audit log(s) from {start} to {end}."))
@@ -1,34 +1,44 @@
-from .models import AuditLog
+import logging
+
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
-import json
-from .serializers import AuditLogSerializer
-from user_sessions.models import Session
-from users.models import User
-from audit.models import AuditLog
+from user_sessions.utils import get_auth_context
+from .writer import record_audit_entry
 from django.contrib.auth.models import AnonymousUser
 
+logger = logging.getLogger(__name__)
+
 class AuditMiddleware(MiddlewareMixin):
     def process_request(self, request):
         if request.path.startswith("/admin/"):
             return 
         
-        authorization_header = request.headers.get("Authorization", "")
-
-        if authorization_header.startswith("Session "):
-            token = authorization_header.split(" ")[1]
-            print("Token received:", token)
+        auth = get_auth_context(request)
+        request.user = auth.session.user if auth.session else None
 
+        if request.method in ['POST', 'PUT', 'DELETE'] and not self.is_multipart(request):
+            # Cache the body now; once DRF reads the stream it is no longer available for the log
             try:
-                session = Session.objects.get(session_token=token)
-                user = session.user
-
-                request.user = user
-            except Session.DoesNotExist:
-                request.user = None
-            except User.DoesNotExist:
-                request.user = None
-        else:
-            request.user = None
+                request.body
+            except Exception:
+                pass
+
+    def is_multipart(self, request):
+        # Uploads are streamed to the parsers, never held in memory for the log
+        return request.content_type.startswith('multipart/')
+
+    def get_upload_data(self, request):
+        """Form fields and the name and size of each uploaded file, in place of the body"""
+        try:
+            files = request.FILES
+            fields = request.POST.dict()
+        except Exception:
+            return None
+        fields['files'] = [
+            {'field': field, 'name': upload.name, 'size': upload.size}
+            for field, upload in files.items()
+        ]
+        return fields
 
     def get_client_ip(self, request):
         xff = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -38,35 +48,14 @@ class AuditMiddleware(MiddlewareMixin):
         if request.path.startswith("/admin/"):
             return response
 
-        authorization_header = request.headers.get("Authorization", "")
-
-        if authorization_header.startswith("Session "):
-            token = authorization_header.split(" ")[1]
-            print("Token received:", token)
+        auth = get_auth_context(request)
+        request.user = auth.session.user if auth.session else None
 
-            try:
-                session = Session.objects.get(session_token=token)
-                user = session.user
-
-                request.user = user
-                print("User authenticated: ", user.username)
-            except Session.DoesNotExist:
-                print("Session does NOT exist")
-                request.user = None
-            except User.DoesNotExist:
-                print("User does NOT exist")
-                request.user = None
-        else:
-            request.user = None
-        
         path = request.path
         method = request.method
         user = getattr(request, 'user', None)
         ip_address = self.get_client_ip(request)
 
-
-        print("User: ", user)
-
         if path.startswith('/api/') and method in ['POST', 'PUT', 'DELETE']:
             if path == '/api/users/login-api/' or path== "/api/users/logout-api/": return response
 
@@ -78,33 +67,36 @@ class AuditMiddleware(MiddlewareMixin):
             action_map = {'create-new': 'create', 'edit': 'update', 'delete': 'delete', 'list-all': 'view',}
             action = action_map.get(action, action)
 
-            # Request body
-            try:
-                req_body = json.loads(request.body.decode('utf-8')) if request.body else None
-            except Exception:
-                req_body = None
-            
-            # Response body
-            try:
-                res_body = json.loads(response.content.decode('utf-8')) if response.content else None
-            except Exception:
-                res_body = None
-
-            log = AuditLog.objects.create(
-                user=user if user else None,
-                app=app,
-                action=action,
-                method=method,
-                request_data=req_body,
-                response_data=res_body,
-                path=path,
-                status_code=response.status_code,
-                ip_address=ip_address
-            )
-
-            print("Logging: ", AuditLogSerializer(log).data)
+            request_body, request_data = None, None
+            if self.is_multipart(request):
+                request_data = self.get_upload_data(request)
+            else:
+                # Request body may already have been consumed as a stream
+                try:
+                    request_body = request.body
+                except Exception:
+                    request_body = None
+
+            # Bodies are decoded by the audit writer, off the request path
+            record_audit_entry({
+                'user': user if user else None,
+                'app': app,
+                'action': action,
+                'method': method,
+                'request_body': request_body,
+                'request_data': request_data,
+                'response_body': None if response.streaming else response.content,
+                'path': path,
+                'status_code': response.status_code,
+                'ip_address': ip_address,
+                'timestamp': timezone.now(),
+                # Raw inputs for the writer to extract the touched objects from
+                'resource': parts[1] if len(parts) > 1 else None,
+                'path_kwargs': dict(request.resolver_match.kwargs) if request.resolver_match else {},
+                'query_params': request.GET.dict(),
+            })
         else:
-            print("Not logging for path:", path, "and method:", method)
+            logger.debug("Not logging for path %s and method %s", path, method)
             request.user = AnonymousUser()
 
     
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from users.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -23,10 +24,53 @@ class AuditLog(models.Model):
     response_data = models.JSONField(null=True, blank=True) # server returned
     status_code = models.PositiveIntegerField(null=True, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now) # set by the middleware at request time, entries are written later in batches
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp', 'id']),
+            models.Index(fields=['app', 'timestamp']),
+            models.Index(fields=['action', 'timestamp']),
+            models.Index(fields=['user', 'timestamp']),
+            models.Index(fields=['status_code', 'timestamp']),
+        ]
 
     def __str__(self):
         return f"[{self.timestamp:%Y-%m-%d %H:%M:%S}] {self.user.username} - {self.action} - {self.app}"
+
+
+class AuditLogTarget(models.Model):
+    """An object touched by an audited request, e.g. ("payment", 42)"""
+    log = models.ForeignKey(AuditLog, on_delete=models.CASCADE, related_name='targets')
+    object_type = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['object_type', 'object_id', 'log']),
+        ]
+
+    def __str__(self):
+        return f"{self.object_type} {self.object_id}"
+
+
+class AuditArchive(models.Model):
+    """Manifest entry for one archived segment of audit logs (a gzipped JSONL file)"""
+    partition = models.DateField(db_index=True) # UTC day the rows were logged on
+    path = models.CharField(max_length=500) # relative to AUDIT_ARCHIVE_DIR
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    row_count = models.PositiveIntegerField()
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['partition', 'first_id']
+        constraints = [
+            models.UniqueConstraint(fields=['path'], name='unique_audit_archive_path'),
+        ]
+
+    def __str__(self):
+        return f"{self.partition} ({self.row_count} rows, ids {self.first_id}-{self.last_id})"
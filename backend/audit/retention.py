@@ -0,0 +1,170 @@
+"""
+Audit log retention: roll old rows out of the hot AuditLog table into
+date-partitioned, gzipped JSONL segments and keep an AuditArchive manifest so
+archived ranges can still be searched or restored.
+
+Layout: <AUDIT_ARCHIVE_DIR>/YYYY/MM/DD/audit-<first_id>-<last_id>.jsonl.gz
+
+Each batch gets its own segment file named by its id range, written to a
+temporary name and renamed into place before the rows are deleted. Re-running
+after a crash rewrites the same file instead of duplicating rows.
+"""
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users.models import User
+from .models import AuditArchive, AuditLog, AuditLogTarget
+
+
+def get_archive_dir():
+    return Path(getattr(settings, "AUDIT_ARCHIVE_DIR", Path(settings.BASE_DIR) / "audit_archive"))
+
+
+def _field_names():
+    return [field.attname for field in AuditLog._meta.concrete_fields]
+
+
+def _write_segment(relative_path, rows):
+    path = get_archive_dir() / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for row in rows:
+            # isoformat keeps microseconds, which DjangoJSONEncoder would truncate
+            row = {**row, "timestamp": row["timestamp"].isoformat()}
+            f.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def archive_audit_logs(older_than_days=None, batch_size=5000):
+    """
+    Move audit rows older than the retention window into archive segments.
+    Works in bounded batches so the hot table is never locked for long.
+    Returns the number of rows archived.
+    """
+    if older_than_days is None:
+        older_than_days = getattr(settings, "AUDIT_RETENTION_DAYS", 90)
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    fields = _field_names()
+    archived = 0
+
+    while True:
+        rows = list(
+            AuditLog.objects.filter(timestamp__lt=cutoff)
+            .order_by("id")
+            .values(*fields)[:batch_size]
+        )
+        if not rows:
+            return archived
+
+        targets = defaultdict(list)
+        batch_targets = AuditLogTarget.objects.filter(log_id__in=[row["id"] for row in rows])
+        for log_id, object_type, object_id in batch_targets.values_list("log_id", "object_type", "object_id"):
+            targets[log_id].append([object_type, object_id])
+        for row in rows:
+            row["targets"] = targets.get(row["id"], [])
+
+        by_day = defaultdict(list)
+        for row in rows:
+            by_day[row["timestamp"].astimezone(dt_timezone.utc).date()].append(row)
+
+        manifest = []
+        for day, day_rows in sorted(by_day.items()):
+            first_id, last_id = day_rows[0]["id"], day_rows[-1]["id"]
+            relative_path = f"{day:%Y/%m/%d}/audit-{first_id}-{last_id}.jsonl.gz"
+            _write_segment(relative_path, day_rows)
+            manifest.append(AuditArchive(
+                partition=day,
+                path=relative_path,
+                first_id=first_id,
+                last_id=last_id,
+                row_count=len(day_rows),
+                start_time=min(row["timestamp"] for row in day_rows),
+                end_time=max(row["timestamp"] for row in day_rows),
+            ))
+
+        with transaction.atomic():
+            AuditArchive.objects.filter(path__in=[entry.path for entry in manifest]).delete()
+            AuditArchive.objects.bulk_create(manifest)
+            AuditLog.objects.filter(id__in=[row["id"] for row in rows]).delete()
+        archived += len(rows)
+
+
+def _read_segment(entry):
+    with gzip.open(get_archive_dir() / entry.path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _matches(row, filters):
+    return all(str(row.get(key)) == str(value) for key, value in filters.items() if value not in (None, ""))
+
+
+def iter_archived_logs(start_date, end_date, target=None, **filters):
+    """
+    Yield archived rows (as dicts) logged between start_date and end_date
+    inclusive. Keyword filters match row fields exactly, e.g. app="Payments";
+    `target` restricts to rows that touched an (object_type, object_id).
+    Only the segments listed in the manifest for that range are opened.
+    """
+    target = [target[0], int(target[1])] if target else None
+    segments = AuditArchive.objects.filter(partition__gte=start_date, partition__lte=end_date)
+    for entry in segments.iterator():
+        for row in _read_segment(entry):
+            if _matches(row, filters) and (target is None or target in row.get("targets", [])):
+                yield row
+
+
+def restore_audit_logs(start_date, end_date, batch_size=1000):
+    """
+    Re-insert archived rows for a date range into the hot table with their
+    original ids, then drop the segments. Returns the number of rows restored.
+    Restored rows are rolled out again by the next archive run if they are
+    still outside the retention window.
+    """
+    fields = set(_field_names())
+    restored = 0
+    segments = list(AuditArchive.objects.filter(partition__gte=start_date, partition__lte=end_date))
+
+    for entry in segments:
+        logs, targets = [], []
+        for row in _read_segment(entry):
+            targets.extend(
+                AuditLogTarget(log_id=row["id"], object_type=object_type, object_id=object_id)
+                for object_type, object_id in row.get("targets", [])
+            )
+            row = {key: value for key, value in row.items() if key in fields}
+            row["timestamp"] = parse_datetime(row["timestamp"])
+            logs.append(AuditLog(**row))
+
+        # Users deleted since archiving would have been SET_NULL on the live rows
+        user_ids = {log.user_id for log in logs if log.user_id is not None}
+        live_user_ids = set(User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+        for log in logs:
+            if log.user_id not in live_user_ids:
+                log.user_id = None
+
+        with transaction.atomic():
+            existing = set(AuditLog.objects.filter(id__in=[log.id for log in logs]).values_list("id", flat=True))
+            AuditLog.objects.bulk_create([log for log in logs if log.id not in existing], batch_size=batch_size)
+            AuditLogTarget.objects.bulk_create(
+                [target for target in targets if target.log_id not in existing], batch_size=batch_size
+            )
+            entry.delete()
+        (get_archive_dir() / entry.path).unlink(missing_ok=True)
+        restored += len(logs) - len(existing)
+
+    return restored
@@ -1,10 +1,19 @@
 from rest_framework import serializers
-from .models import AuditLog
+from .models import AuditArchive, AuditLog
 
 class AuditLogSerializer(serializers.ModelSerializer):
     user = serializers.CharField(source='user.username', read_only=True)
     role = serializers.CharField(source='user.role', read_only=True )
+    targets = serializers.SerializerMethodField()
+
+    def get_targets(self, obj):
+        return [{"object_type": target.object_type, "object_id": target.object_id} for target in obj.targets.all()]
 
     class Meta:
         model = AuditLog
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class AuditArchiveSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditArchive
+        fields = '__all__'
@@ -1,3 +1,122 @@
-from django.test import TestCase
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from backend.testing import SignedInMixin
+from customers.models import Customer
+
+from .models import AuditArchive, AuditLog, AuditLogTarget
+from .retention import archive_audit_logs, get_archive_dir, iter_archived_logs, restore_audit_logs
+from .utils import extract_targets
+
+
+class ExtractTargetsTests(SimpleTestCase):
+    def test_ids_returned_by_create_views(self):
+        targets = extract_targets("niches", {}, {}, {"location": "B1-F1-001"}, {"ids": [7]})
+        self.assertEqual(targets, [("niche", 7)])
+
+    def test_related_ids_in_the_request(self):
+        targets = extract_targets("occupants", {}, {}, {"niche_id": 3, "name": "A"}, {"ids": [9]})
+        self.assertEqual(targets, [("niche", 3), ("occupant", 9)])
+
+    def test_add_payment_records_the_created_detail(self):
+        response = {
+            "payment_detail": {"id": 41, "amount": "100.00"},
+            "updated_payment": {"id": 5, "amount_paid": "100.00"},
+        }
+        targets = extract_targets("payments", {"payment_id": 5}, {}, {"amount": "100.00"}, response)
+        self.assertEqual(targets, [("payment", 5), ("payment_detail", 41)])
+
+    def test_rejected_posting_records_only_the_payment(self):
+        response = {"error": "Amount exceeds the remaining balance", "type": "amount_exceeds_balance"}
+        targets = extract_targets("payments", {"payment_id": 5}, {}, {"amount": "100.00"}, response)
+        self.assertEqual(targets, [("payment", 5)])
+
+
+@override_settings(AUDIT_ASYNC=False)
+class AuditMiddlewareTests(SignedInMixin, TestCase):
+    permissions = ("view_dashboard", "add_record")
+
+    def test_json_body_is_logged(self):
+        response = self.client.post("/api/customers/create-new/", {"name": "Ana"}, content_type="application/json",
+                                    headers=self.auth)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(AuditLog.objects.get().request_data, {"name": "Ana"})
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=64)
+    def test_uploads_are_logged_by_name_and_size_without_reading_the_body(self):
+        content = b"name\n" + b"".join(b"Customer %d\n" % index for index in range(20))
+
+        response = self.client.post(
+            "/api/customers/import/",
+            {"file": SimpleUploadedFile("customers.csv", content, content_type="text/csv")},
+            headers=self.auth,
+        )
+
+        # A body over DATA_UPLOAD_MAX_MEMORY_SIZE would have raised RequestDataTooBig if read whole
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Customer.objects.count(), 20)
+        self.assertEqual(AuditLog.objects.get().request_data,
+                         {"files": [{"field": "file", "name": "customers.csv", "size": len(content)}]})
+
+
+class AuditRetentionTests(TestCase):
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings = override_settings(AUDIT_ARCHIVE_DIR=archive_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.old = [self.log("Payments", datetime(2024, 1, 5, 9, tzinfo=dt_timezone.utc), ("payment", 5)),
+                    self.log("Niches", datetime(2024, 1, 5, 17, tzinfo=dt_timezone.utc), ("niche", 3)),
+                    self.log("Payments", datetime(2024, 1, 6, 8, tzinfo=dt_timezone.utc), ("payment", 6))]
+        self.recent = self.log("Payments", timezone.now(), ("payment", 5))
+
+    def log(self, app, timestamp, target):
+        log = AuditLog.objects.create(app=app, path="/api/", timestamp=timestamp, status_code=200)
+        AuditLogTarget.objects.create(log=log, object_type=target[0], object_id=target[1])
+        return log
+
+    def test_old_rows_move_to_daily_segments(self):
+        self.assertEqual(archive_audit_logs(older_than_days=30), 3)
+
+        self.assertEqual(list(AuditLog.objects.values_list("pk", flat=True)), [self.recent.pk])
+        manifest = AuditArchive.objects.order_by("first_id")
+        self.assertEqual([(entry.partition, entry.row_count) for entry in manifest],
+                         [(date(2024, 1, 5), 2), (date(2024, 1, 6), 1)])
+        for entry in manifest:
+            self.assertTrue((get_archive_dir() / entry.path).exists())
+
+    def test_batches_write_their_own_segments(self):
+        self.assertEqual(archive_audit_logs(older_than_days=30, batch_size=1), 3)
+
+        # One segment per batch, even within a day
+        self.assertEqual(list(AuditArchive.objects.order_by("first_id").values_list("partition", "first_id")),
+                         [(date(2024, 1, 5), self.old[0].pk), (date(2024, 1, 5), self.old[1].pk),
+                          (date(2024, 1, 6), self.old[2].pk)])
+        self.assertEqual(archive_audit_logs(older_than_days=30, batch_size=1), 0)
+
+    def test_archived_rows_are_searchable(self):
+        archive_audit_logs(older_than_days=30)
+
+        rows = iter_archived_logs(date(2024, 1, 1), date(2024, 1, 31), target=("payment", "5"))
+        self.assertEqual([row["id"] for row in rows], [self.old[0].pk])
+        rows = iter_archived_logs(date(2024, 1, 6), date(2024, 1, 6), app="Payments")
+        self.assertEqual([row["id"] for row in rows], [self.old[2].pk])
+
+    def test_restore_brings_rows_back_with_their_ids_and_targets(self):
+        archive_audit_logs(older_than_days=30)
+
+        self.assertEqual(restore_audit_logs(date(2024, 1, 5), date(2024, 1, 5)), 2)
+
+        restored = AuditLog.objects.filter(pk__in=[log.pk for log in self.old[:2]])
+        self.assertEqual(restored.count(), 2)
+        self.assertEqual(restored.get(pk=self.old[0].pk).timestamp, self.old[0].timestamp)
+        self.assertEqual(list(AuditLogTarget.objects.filter(log=self.old[1]).values_list("object_type", "object_id")),
+                         [("niche", 3)])
+        self.assertEqual(list(AuditArchive.objects.values_list("partition", flat=True)), [date(2024, 1, 6)])
@@ -1,7 +1,11 @@
 from django.urls import path
+from backend.async_views import read_view
 
 from .views import *
 
 urlpatterns = [
-    path("list-all/", list_audit_logs, name="list_audit_logs"),
+    path("list-all/", read_view(list_audit_logs, alist_audit_logs), name="list_audit_logs"),
+    path("history/<str:object_type>/<int:object_id>/", audit_entity_history, name="audit_entity_history"),
+    path("archives/", list_audit_archives, name="list_audit_archives"),
+    path("archives/logs/", search_archived_audit_logs, name="search_archived_audit_logs"),
 ]
\ No newline at end of file
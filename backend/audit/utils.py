@@ -11,4 +11,61 @@ def log_action(user, instance, action, description="", ip=None):
         content_type=ContentType.objects.get_for_model(instance),
         description = description,
         ip_address = ip,
-    )
\ No newline at end of file
+    )
+
+# URL kwargs that name the object a request acts on
+PATH_KWARG_TYPES = {'payment_id': 'payment', 'detail_id': 'payment_detail'}
+# Response fields holding an object the request created, e.g. the posting from add-payment
+RESPONSE_OBJECT_TYPES = {'payment_detail': 'payment_detail'}
+
+
+def _as_ids(value):
+    values = value if isinstance(value, (list, tuple)) else [value]
+    ids = []
+    for item in values:
+        try:
+            ids.append(int(item))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def extract_targets(resource, path_kwargs, query_params, request_data, response_data):
+    """
+    Work out which objects an audited request touched, as (object_type, object_id) pairs.
+
+    `resource` is the URL segment after /api/ (e.g. "payments"). The primary ids
+    come from the path, the {"ids": [...]} every create/edit/delete view returns,
+    or the element ids sent in the request. Objects returned in a
+    RESPONSE_OBJECT_TYPES field and any other "<type>_id" value in the request
+    (e.g. niche_id when adding an occupant) are recorded as well.
+    """
+    object_type = resource.rstrip('s') if resource else None
+    request_data = request_data if isinstance(request_data, dict) else {}
+    response_data = response_data if isinstance(response_data, dict) else {}
+    targets = set()
+
+    for kwarg, kwarg_type in PATH_KWARG_TYPES.items():
+        for object_id in _as_ids(path_kwargs.get(kwarg)):
+            targets.add((kwarg_type, object_id))
+
+    if not targets and object_type:
+        for source in (response_data.get('ids'), request_data.get('element_ids'),
+                       request_data.get('element_id'), request_data.get('id'),
+                       query_params.get(f'{object_type}_id')):
+            ids = _as_ids(source) if source is not None else []
+            if ids:
+                targets.update((object_type, object_id) for object_id in ids)
+                break
+
+    for key, key_type in RESPONSE_OBJECT_TYPES.items():
+        created = response_data.get(key)
+        if isinstance(created, dict):
+            targets.update((key_type, object_id) for object_id in _as_ids(created.get('id')))
+
+    for params in (request_data, query_params):
+        for key, value in params.items():
+            if key.endswith('_id') and key[:-3] != object_type and key not in PATH_KWARG_TYPES:
+                targets.update((key[:-3], object_id) for object_id in _as_ids(value))
+
+    return sorted(targets)
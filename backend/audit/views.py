@@ -4,21 +4,116 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from django.views.decorators.csrf import csrf_exempt, requires_csrf_token
+from django.views.decorators.http import require_GET
 
-from .models import AuditLog
-from .serializers import AuditLogSerializer
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+import json
+
+from .models import AuditArchive, AuditLog
+from .serializers import AuditArchiveSerializer, AuditLogSerializer
+from .retention import iter_archived_logs
+from backend.listing import alist_response, list_response
+from backend.replicas import replica_reads
+from backend.async_views import json_response
+from user_sessions.utils import aget_auth_context, get_auth_context
+
+AUDIT_FILTERS = {
+    'app': 'app',
+    'action': 'action',
+    'user': 'user_id',
+    'status': 'status_code',
+    'after': 'timestamp__gte',
+    'before': 'timestamp__lt',
+}
+AUDIT_ORDERINGS = {'timestamp': 'timestamp'}
 
 # Create your views here.
 @api_view(['GET'])
 @csrf_exempt
+@replica_reads
 def list_audit_logs(request: Request) -> Response:
     # Your logic to list audit logs
     if request.method == 'GET':
 
-        user = request.user
-        if not user or not user.has_permission("view_audit"):
+        if not get_auth_context(request).has_permission("view_audit"):
             return Response({"error": "You do not have permission to view audit logs."}, status=status.HTTP_403_FORBIDDEN)
 
-        logs = AuditLog.objects.all().order_by('-timestamp')
-        serializer = AuditLogSerializer(logs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        logs = AuditLog.objects.select_related('user__role').prefetch_related('targets')
+        return list_response(request, logs, AuditLogSerializer, filters=AUDIT_FILTERS,
+                             orderings=AUDIT_ORDERINGS, default_ordering='-timestamp')
+
+@require_GET
+@replica_reads
+async def alist_audit_logs(request):
+    """list_audit_logs for the ASGI deployment (see backend/async_views.py)"""
+    if not (await aget_auth_context(request)).has_permission("view_audit"):
+        return json_response({"error": "You do not have permission to view audit logs."}, status=status.HTTP_403_FORBIDDEN)
+
+    logs = AuditLog.objects.select_related('user__role').prefetch_related('targets')
+    return await alist_response(request, logs, AuditLogSerializer, filters=AUDIT_FILTERS,
+                                orderings=AUDIT_ORDERINGS, default_ordering='-timestamp')
+
+@api_view(['GET'])
+@replica_reads
+def audit_entity_history(request, object_type, object_id):
+    """Every audited change to one object, e.g. history/payment/42/, newest first"""
+    auth = get_auth_context(request)
+    if not auth.is_valid:
+        return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_audit"):
+        return Response({"error": "You do not have permission to view audit logs."}, status=status.HTTP_403_FORBIDDEN)
+
+    logs = AuditLog.objects.select_related('user__role').prefetch_related('targets').filter(
+        targets__object_type=object_type, targets__object_id=object_id
+    ).distinct()
+    return list_response(request, logs, AuditLogSerializer, filters=AUDIT_FILTERS,
+                         orderings=AUDIT_ORDERINGS, default_ordering='-timestamp')
+
+
+@api_view(['GET'])
+def list_audit_archives(request):
+    """List archived audit ranges from the manifest"""
+    auth = get_auth_context(request)
+    if not auth.is_valid:
+        return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_audit"):
+        return Response({"error": "You do not have permission to view audit logs."}, status=status.HTTP_403_FORBIDDEN)
+
+    archives = AuditArchive.objects.all()
+    return Response(AuditArchiveSerializer(archives, many=True).data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def search_archived_audit_logs(request):
+    """Stream archived audit rows between `from` and `to` (YYYY-MM-DD), optionally filtered by app, action, user or object"""
+    auth = get_auth_context(request)
+    if not auth.is_valid:
+        return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_audit"):
+        return Response({"error": "You do not have permission to view audit logs."}, status=status.HTTP_403_FORBIDDEN)
+
+    start = parse_date(request.query_params.get("from") or "")
+    end = parse_date(request.query_params.get("to") or "") or start
+    if not start:
+        return Response({"error": "A 'from' date (YYYY-MM-DD) is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    object_type, object_id = request.query_params.get("object_type"), request.query_params.get("object_id")
+    if object_id and not object_id.isdigit():
+        return Response({"error": "object_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = iter_archived_logs(
+        start, end,
+        target=(object_type, object_id) if object_type and object_id else None,
+        app=request.query_params.get("app"),
+        action=request.query_params.get("action"),
+        user_id=request.query_params.get("user"),
+    )
+
+    def stream():
+        yield "["
+        for i, row in enumerate(rows):
+            yield ("," if i else "") + json.dumps(row)
+        yield "]"
+
+    return StreamingHttpResponse(stream(), content_type="application/json")
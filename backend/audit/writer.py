@@ -0,0 +1,246 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from backend.writes import WriteContention, run_write
+
+from .utils import extract_targets
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "block", "sync")
+
+
+def _decode_body(raw):
+    try:
+        return json.loads(raw.decode('utf-8')) if raw else None
+    except Exception:
+        return None
+
+
+def build_audit_log(entry):
+    """
+    Turn a queued entry into an unsaved AuditLog, decoding the raw bodies.
+    The objects the request touched are attached as log.pending_targets.
+    """
+    from .models import AuditLog
+
+    fields = dict(entry)
+    resource = fields.pop('resource', None)
+    path_kwargs = fields.pop('path_kwargs', None) or {}
+    query_params = fields.pop('query_params', None) or {}
+    # Multipart requests arrive already summarised, as request_data
+    request_body = fields.pop('request_body', None)
+    if fields.get('request_data') is None:
+        fields['request_data'] = _decode_body(request_body)
+    fields['response_data'] = _decode_body(fields.pop('response_body', None))
+
+    log = AuditLog(**fields)
+    log.pending_targets = extract_targets(
+        resource, path_kwargs, query_params, fields['request_data'], fields['response_data']
+    )
+    return log
+
+
+def save_audit_logs(logs):
+    """Insert audit logs and their targets, in bulk when the database returns new ids"""
+    from .models import AuditLog, AuditLogTarget
+
+    if len(logs) > 1 and connection.features.can_return_rows_from_bulk_insert:
+        AuditLog.objects.bulk_create(logs)
+    else:
+        for log in logs:
+            log.save()
+
+    AuditLogTarget.objects.bulk_create([
+        AuditLogTarget(log=log, object_type=object_type, object_id=object_id)
+        for log in logs
+        for object_type, object_id in getattr(log, 'pending_targets', ())
+    ])
+
+
+class _FlushMarker:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class AuditWriter:
+    """
+    Buffers audit entries in a bounded in-process queue and writes them from
+    a background thread with bulk_create, so requests never wait on the
+    audit insert.
+    """
+
+    def __init__(self, max_queue_size=10000, batch_size=200, flush_interval=1.0,
+                 overflow_policy="drop_oldest", block_timeout=0.5):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy '{overflow_policy}'.")
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+
+        self._lock = threading.Lock()
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+        self._pid = None
+        self._thread = None
+        self._queue = None
+
+    def _ensure_started(self):
+        # Restart after a fork (e.g. gunicorn --preload): threads do not survive it
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def submit(self, entry):
+        """Queue an audit entry (a dict of AuditLog fields plus raw bodies)"""
+        self._ensure_started()
+        try:
+            if self.overflow_policy == "block":
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self._handle_overflow(entry)
+            return
+        self._count("enqueued")
+
+    def _handle_overflow(self, entry):
+        if self.overflow_policy == "drop_oldest":
+            try:
+                oldest = self._queue.get_nowait()
+                self._queue.task_done()
+                if isinstance(oldest, _FlushMarker):
+                    oldest.done.set()
+                else:
+                    self._count("dropped")
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(entry)
+                self._count("enqueued")
+                return
+            except queue.Full:
+                pass
+        elif self.overflow_policy == "sync":
+            self._write([entry])
+            return
+        self._count("dropped")
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch, markers = [], []
+            while True:
+                (markers if isinstance(item, _FlushMarker) else batch).append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + len(markers)):
+                self._queue.task_done()
+            for marker in markers:
+                marker.done.set()
+
+    def _write(self, entries):
+        close_old_connections()
+        try:
+            # Logs are rebuilt on each attempt, so a retried insert never carries ids from a rolled-back one
+            run_write("audit", lambda: save_audit_logs([build_audit_log(entry) for entry in entries]))
+            written = len(entries)
+        except Exception:
+            # One bad row (e.g. a user deleted meanwhile) should not lose the whole batch
+            logger.exception("Bulk audit write failed, retrying %d entries one by one", len(entries))
+            written = 0
+            for entry in entries:
+                try:
+                    run_write("audit", lambda: save_audit_logs([build_audit_log(entry)]))
+                    written += 1
+                except Exception:
+                    logger.exception("Failed to write audit log entry for %s", entry.get('path'))
+            self._count("failed", len(entries) - written)
+        with self._lock:
+            self._stats["written"] += written
+            self._stats["batches"] += 1
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far has been written. Returns False on timeout."""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return True
+        marker = _FlushMarker()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        stats["queue_capacity"] = self.max_queue_size
+        stats["overflow_policy"] = self.overflow_policy
+        return stats
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditWriter(
+                    max_queue_size=getattr(settings, "AUDIT_QUEUE_SIZE", 10000),
+                    batch_size=getattr(settings, "AUDIT_BATCH_SIZE", 200),
+                    flush_interval=getattr(settings, "AUDIT_FLUSH_INTERVAL", 1.0),
+                    overflow_policy=getattr(settings, "AUDIT_OVERFLOW_POLICY", "drop_oldest"),
+                )
+                atexit.register(_writer.flush)
+    return _writer
+
+
+def get_writer_stats():
+    """Queue depth and enqueued, written, dropped and failed counts of this worker's audit writer"""
+    return get_audit_writer().stats()
+
+
+def record_audit_entry(entry):
+    """Write an audit entry through the background writer, or inline when AUDIT_ASYNC is off"""
+    if getattr(settings, "AUDIT_ASYNC", True):
+        get_audit_writer().submit(entry)
+        return
+    try:
+        run_write("audit", lambda: save_audit_logs([build_audit_log(entry)]))
+    except WriteContention:
+        # The request itself already succeeded; queue the entry rather than fail it
+        logger.warning("Database busy, queueing audit entry for %s", entry.get('path'))
+        get_audit_writer().submit(entry)
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Serve the read endpoints with their async views, e.g.
+#   uvicorn backend.asgi:application --workers 4
+# next to (or instead of) the WSGI deployment, which keeps the sync views.
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,37 @@
+"""
+Async read endpoints for the ASGI deployment.
+
+The hot read paths (list endpoints, payment details, analytics and
+verify_token) each have an async twin (alist_niches next to list_niches)
+built on Django's async ORM, so a request waiting on the database does not
+hold a worker thread. asgi.py turns ASYNC_READ_VIEWS on, and the URLconfs
+route through read_view() to the twin; the WSGI deployment keeps serving
+the sync DRF views from the same code.
+
+The twins answer with the same status codes, bodies and headers: JSON is
+rendered like DRF's JSONRenderer, and ETags and the response cache are
+shared with the sync views (see the a-prefixed helpers in
+backend.conditional, backend.response_cache and backend.listing).
+"""
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def read_view(sync_view, async_view):
+    """The view to route: the async twin when serving through ASGI"""
+    return async_view if getattr(settings, "ASYNC_READ_VIEWS", False) else sync_view
+
+
+def api_request(request):
+    """Wrap a Django request for the helpers that read DRF's request.query_params; nothing is parsed"""
+    return request if isinstance(request, Request) else Request(request)
+
+
+def json_response(data, status=200):
+    """JSON rendered as DRF's JSONRenderer would; `data` is kept for the response cache"""
+    response = JsonResponse(data, status=status, safe=False, encoder=JSONEncoder,
+                            json_dumps_params={"ensure_ascii": False, "allow_nan": False, "separators": (",", ":")})
+    response.data = data
+    return response
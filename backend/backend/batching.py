@@ -0,0 +1,115 @@
+"""
+Coalescing of derived-state updates during bulk operations.
+
+Signal receivers that maintain derived state (niche occupancy, dashboard
+counters, cached earnings) hand their change to defer(). Normally it is
+applied right away; inside a batched() block changes are merged per key and
+each key is applied once when the block exits, so deleting or importing
+hundreds of rows costs one update per affected parent instead of one per row.
+
+Updates that must wait for the commit (dashboard deltas, resource versions,
+earnings buckets, niche statuses) go through after_commit(). Inside
+post_commit_batch(), which backend.writes.run_write() opens around every
+write transaction, they are merged per key and applied together in one
+transaction right after the commit, so a crash cannot keep some and lose
+others.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+_state = threading.local()
+
+
+@contextmanager
+def batched():
+    """Collect deferred updates made in this block and apply them once per key on exit"""
+    if getattr(_state, "pending", None) is not None:
+        # Nested blocks join the outermost one
+        yield
+        return
+
+    _state.pending = {}
+    try:
+        yield
+        pending = _state.pending
+    finally:
+        _state.pending = None
+
+    for apply, change in pending.values():
+        apply(change)
+
+
+def defer(key, apply, change):
+    """
+    Apply `change` (a Counter or set) with `apply(change)`, or merge it into
+    the pending change for `key` when inside batched().
+    """
+    pending = getattr(_state, "pending", None)
+    if pending is None:
+        apply(change)
+    elif key in pending:
+        pending[key][1].update(change)
+    else:
+        pending[key] = (apply, change)
+
+
+class _PostCommitBatch:
+    def __init__(self):
+        self.pending = {}
+        self.flushing = False
+
+    def add(self, key, apply, change):
+        if key in self.pending:
+            self.pending[key][1].update(change)
+        else:
+            self.pending[key] = (apply, change)
+
+    def flush(self, using):
+        if not self.pending:
+            return
+        with transaction.atomic(using=using):
+            self.flushing = True
+            # Changes queued while applying (a dashboard delta bumps a resource version)
+            # are merged into this transaction, into the key's entry if it is still pending
+            while self.pending:
+                apply, change = self.pending.pop(next(iter(self.pending)))
+                apply(change)
+
+
+@contextmanager
+def post_commit_batch(using=DEFAULT_DB_ALIAS):
+    """Apply the after_commit() changes of the transactions in this block together, on exit"""
+    if getattr(_state, "post_commit", None) is not None:
+        yield
+        return
+
+    batch = _state.post_commit = _PostCommitBatch()
+    try:
+        yield
+        batch.flush(using)
+    finally:
+        _state.post_commit = None
+
+
+def _collect(key, apply, change):
+    batch = getattr(_state, "post_commit", None)
+    if batch is None:
+        apply(change)
+    else:
+        batch.add(key, apply, change)
+
+
+def after_commit(key, apply, change):
+    """
+    Apply `change` (a Counter or set) with `apply(change)` once the current
+    transaction commits; dropped if it rolls back. Inside post_commit_batch()
+    changes are merged per key and applied in one transaction after the commit.
+    """
+    batch = getattr(_state, "post_commit", None)
+    if batch is not None and batch.flushing:
+        batch.add(key, apply, change)
+        return
+    # One callback per change, so a rolled-back savepoint drops exactly its own
+    transaction.on_commit(lambda: _collect(key, apply, change))
@@ -0,0 +1,240 @@
+"""
+Shared set-based helpers for the bulk endpoints.
+
+bulk_delete_response() backs every delete endpoint: the selected ids are
+validated with one query and deleted together in a single transaction, so a
+missing id deletes nothing.
+
+import_response() and import_rows() load CSV or XLSX files: rows are read
+one at a time, validated in batches with the resource's serializer and
+inserted with bulk_create inside one transaction, producing a per-row error
+report. By default a file with any invalid row inserts nothing. import_file()
+runs an import through backend.writes.run_write(), reading the file again
+when a lock conflict makes it retry.
+
+In both cases derived state maintained by signal receivers is updated once
+per affected parent (see backend.batching).
+"""
+import csv
+import io
+from datetime import datetime, time
+from itertools import islice
+
+from django.db import connections, router, transaction
+from django.db.models.signals import post_save
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+from .batching import batched
+from .writes import WriteContention, contention_response, run_write
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+
+def parse_element_ids(raw_ids):
+    """Return element_ids as a list of ints, raising ValueError when malformed"""
+    if not isinstance(raw_ids, list) or not raw_ids:
+        raise ValueError("element_ids must be a non-empty list of ids.")
+    try:
+        return [int(element_id) for element_id in raw_ids]
+    except (TypeError, ValueError):
+        raise ValueError("element_ids must be a non-empty list of ids.")
+
+
+def bulk_delete(queryset, ids):
+    """
+    Delete the rows of `queryset` with the given primary keys, all or nothing.
+    Returns the ids that do not exist (nothing is deleted in that case).
+    """
+    with transaction.atomic(), batched():
+        existing = set(queryset.filter(pk__in=ids).values_list("pk", flat=True))
+        missing = [element_id for element_id in dict.fromkeys(ids) if element_id not in existing]
+        if not missing:
+            queryset.filter(pk__in=existing).delete()
+    return missing
+
+
+def bulk_delete_response(request, queryset, not_found_message, success_status=status.HTTP_200_OK):
+    """
+    Delete the request's element_ids from `queryset` and build the endpoint's
+    response. `not_found_message` is formatted with the first missing id.
+    """
+    raw_ids = request.data.get("element_ids")
+    try:
+        ids = parse_element_ids(raw_ids)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    missing = bulk_delete(queryset, ids)
+    if missing:
+        return Response(
+            {"error": not_found_message.format(id=missing[0]), "missing_ids": missing},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return Response({"ids": raw_ids}, status=success_status)
+
+
+class Importer:
+    """
+    Validates import rows with a serializer and builds unsaved instances.
+    Subclasses can resolve related objects for a whole batch in prepare().
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+
+    def prepare(self, rows):
+        """Return shared context for a batch of row dicts"""
+        return {}
+
+    def build(self, validated_data, row, context):
+        """Return an unsaved instance, or raise serializers.ValidationError"""
+        return self.model(**validated_data)
+
+    def validate(self, row, context):
+        """Return (instance, None) or (None, errors) for one row"""
+        serializer = self.serializer_class(data=row)
+        if not serializer.is_valid():
+            return None, serializer.errors
+        try:
+            return self.build(serializer.validated_data, row, context), None
+        except serializers.ValidationError as e:
+            return None, e.detail
+
+
+def _clean_row(headers, values):
+    row = {}
+    for header, value in zip(headers, values):
+        if isinstance(value, str):
+            value = value.strip()
+        elif isinstance(value, datetime) and value.time() == time.min:
+            value = value.date() # spreadsheet date cells come back as midnight datetimes
+        # Blank cells fall back to the model defaults
+        if header and value not in (None, ""):
+            row[header] = value
+    return row
+
+
+def _csv_lines(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        # Closing the wrapper would close the file, which a retried import reads again
+        text.detach()
+
+
+def read_rows(fileobj, filename):
+    """
+    Yield (row number, dict) for each non-empty data row of a CSV or XLSX file
+    opened in binary mode. Headers are lower-cased; row numbers match the sheet.
+    """
+    if filename.lower().endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("XLSX import requires the openpyxl package; upload a CSV file instead.")
+        sheet = load_workbook(fileobj, read_only=True, data_only=True).active
+        lines = sheet.iter_rows(values_only=True)
+    elif filename.lower().endswith(".csv"):
+        lines = _csv_lines(fileobj)
+    else:
+        raise ValueError("Only .csv and .xlsx files can be imported.")
+
+    headers = [str(header or "").strip().lower() for header in next(lines, [])]
+    if not any(headers):
+        raise ValueError("The file has no header row.")
+    for number, values in enumerate(lines, start=2):
+        row = _clean_row(headers, values)
+        if row:
+            yield number, row
+
+
+def _insert(model, instances):
+    """bulk_create a batch and send post_save so signal-maintained state stays correct"""
+    using = router.db_for_write(model)
+    if not connections[using].features.can_return_rows_from_bulk_insert:
+        for instance in instances:
+            instance.save(using=using)
+        return
+    model.objects.using(using).bulk_create(instances)
+    for instance in instances:
+        post_save.send(sender=model, instance=instance, created=True, update_fields=None, raw=False, using=using)
+
+
+def import_rows(importer, rows, dry_run=False, skip_invalid=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validate and insert (row number, dict) pairs. Unless skip_invalid is set,
+    any invalid row rolls back the whole import; dry_run never keeps anything.
+    Returns the report dict.
+    """
+    report = {"total_rows": 0, "created": 0, "error_count": 0, "errors": [], "dry_run": dry_run}
+    rows = iter(rows)
+
+    with transaction.atomic():
+        with batched():
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                report["total_rows"] += len(batch)
+                context = importer.prepare([row for _, row in batch])
+
+                valid = []
+                for number, row in batch:
+                    instance, errors = importer.validate(row, context)
+                    if errors:
+                        report["error_count"] += 1
+                        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                            report["errors"].append({"row": number, "errors": errors})
+                    else:
+                        valid.append(instance)
+
+                # Once a row failed in all-or-nothing mode keep validating for the report only
+                if valid and (skip_invalid or not report["error_count"]):
+                    _insert(importer.model, valid)
+                    report["created"] += len(valid)
+
+        failed = report["error_count"] and not skip_invalid
+        if failed:
+            report["created"] = 0
+        if failed or dry_run:
+            # A dry run still inserts, so database constraints are checked too
+            transaction.set_rollback(True)
+    return report
+
+
+def import_file(importer, fileobj, filename, endpoint, **options):
+    """
+    import_rows() over a CSV or XLSX file opened in binary mode, as one
+    run_write() transaction recorded under `endpoint`. Raises WriteContention
+    when the database stays locked.
+    """
+    def attempt():
+        fileobj.seek(0)
+        return import_rows(importer, read_rows(fileobj, filename), **options)
+    return run_write(endpoint, attempt)
+
+
+def import_response(request, importer, endpoint):
+    """Import the uploaded `file` (CSV or XLSX) and respond with the row report"""
+    upload = request.FILES.get("file")
+    if upload is None:
+        return Response({"error": "Upload a CSV or XLSX file in the 'file' field."}, status=status.HTTP_400_BAD_REQUEST)
+
+    dry_run = request.query_params.get("dry_run") in ("1", "true")
+    skip_invalid = request.query_params.get("skip_invalid") in ("1", "true")
+    try:
+        report = import_file(importer, upload.file, upload.name, endpoint, dry_run=dry_run, skip_invalid=skip_invalid)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return Response({"error": f"Could not read the file: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+    except WriteContention:
+        return contention_response()
+
+    if report["error_count"] and not skip_invalid:
+        return Response(report, status=status.HTTP_400_BAD_REQUEST)
+    if report["created"] and not report["dry_run"]:
+        return Response(report, status=status.HTTP_201_CREATED)
+    return Response(report, status=status.HTTP_200_OK)
@@ -0,0 +1,79 @@
+"""
+Conditional GET for API resources.
+
+Each resource (niches, occupants, customers, payments) has a version counter
+in analytics.ResourceVersion that advances after every committed change to
+the models it is built from. The ETag is derived from those versions alone,
+so an unchanged resource is answered with 304 before any row is read or
+serialized. The query string is part of the URL, which the client already
+keys its cache on.
+"""
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from analytics.models import ResourceVersion
+
+
+def resource_versions(request, resources):
+    """Current versions of `resources`, read once per request"""
+    request = getattr(request, "_request", request) # unwrap DRF requests
+    key = tuple(sorted(resources))
+    cached = getattr(request, "_resource_versions", {})
+    if key not in cached:
+        cached[key] = ResourceVersion.current(key)
+        request._resource_versions = cached
+    return cached[key]
+
+
+async def aresource_versions(request, resources):
+    request = getattr(request, "_request", request)
+    key = tuple(sorted(resources))
+    cached = getattr(request, "_resource_versions", {})
+    if key not in cached:
+        cached[key] = await ResourceVersion.acurrent(key)
+        request._resource_versions = cached
+    return cached[key]
+
+
+def version_tag(versions):
+    return "-".join(f"{resource}.{version}" for resource, version in sorted(versions.items()))
+
+
+def resource_etag(request, resources):
+    return quote_etag(version_tag(resource_versions(request, resources)))
+
+
+def _not_modified(request, etag):
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    client_tags = [tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match", ""))]
+    return etag in client_tags or "*" in client_tags
+
+
+def _tagged(response, etag):
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response["ETag"] = etag
+        # Let browsers keep the body but revalidate it on every use
+        response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def conditional_response(request, resources, respond):
+    """
+    Return 304 when If-None-Match matches the current versions of `resources`,
+    otherwise respond(). Successful responses carry the ETag.
+    """
+    # Read the versions before the rows, so a concurrent change can only make the tag older
+    etag = resource_etag(request, resources)
+    if _not_modified(request, etag):
+        return _tagged(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+    return _tagged(respond(), etag)
+
+
+async def aconditional_response(request, resources, respond):
+    """conditional_response() for async views; `respond` is a coroutine function"""
+    etag = quote_etag(version_tag(await aresource_versions(request, resources)))
+    if _not_modified(request, etag):
+        return _tagged(HttpResponseNotModified(), etag)
+    return _tagged(await respond(), etag)
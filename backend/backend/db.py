@@ -0,0 +1,106 @@
+"""
+Database engine profiles, selected with the DB_PROFILE environment variable.
+
+- sqlite (default): the project's SQLite file, tuned for several workers
+  writing at once. WAL lets readers run alongside the single writer,
+  busy_timeout makes a writer wait for the lock instead of failing with
+  "database is locked", and the cache/mmap sizes keep hot pages in memory.
+  The pragmas are applied to every new connection by apply_sqlite_pragmas().
+- sqlite-basic: the same file with SQLite's defaults, for comparison.
+- postgres: persistent connections (CONN_MAX_AGE) with health checks.
+- postgres-pool: a psycopg connection pool per worker (needs psycopg[pool]).
+
+PostgreSQL connection details come from POSTGRES_DB, POSTGRES_USER,
+POSTGRES_PASSWORD, POSTGRES_HOST and POSTGRES_PORT. Compare profiles on the
+write mix with `manage.py benchmark_db --profile sqlite-basic --profile sqlite`.
+
+DB_REPLICA adds a read replica (see backend/replicas.py): the replica's file
+for the SQLite profiles, the standby's host for the PostgreSQL ones.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # with WAL, only a power loss can drop the latest commits
+    "busy_timeout": 5000,  # milliseconds
+    "cache_size": -64000,  # negative means KiB: 64 MB per connection
+    "mmap_size": 268435456,  # 256 MB
+    "temp_store": "MEMORY",
+}
+
+
+def sqlite_profile(name, pragmas=SQLITE_PRAGMAS):
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": name,
+        "PRAGMAS": dict(pragmas or {}),
+    }
+
+
+def postgres_profile(pooled=False):
+    database = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("POSTGRES_DB", "columbarium"),
+        "USER": os.environ.get("POSTGRES_USER", "postgres"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        # Drop a persistent connection that died between requests instead of failing on it
+        "CONN_HEALTH_CHECKS": True,
+    }
+    if pooled:
+        # The pool owns connection reuse, so Django must not keep its own
+        database["CONN_MAX_AGE"] = 0
+        database["OPTIONS"] = {"pool": {
+            "min_size": int(os.environ.get("POSTGRES_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("POSTGRES_POOL_MAX_SIZE", 10)),
+            "timeout": 10,
+        }}
+    else:
+        database["CONN_MAX_AGE"] = int(os.environ.get("POSTGRES_CONN_MAX_AGE", 600))
+    return database
+
+
+def database_profile(profile, sqlite_name):
+    if profile == "sqlite":
+        return sqlite_profile(sqlite_name)
+    if profile == "sqlite-basic":
+        return sqlite_profile(sqlite_name, pragmas=None)
+    if profile == "postgres":
+        return postgres_profile()
+    if profile == "postgres-pool":
+        return postgres_profile(pooled=True)
+    raise ImproperlyConfigured(
+        f"Unknown DB_PROFILE '{profile}'. Use sqlite, sqlite-basic, postgres or postgres-pool."
+    )
+
+
+def replica_profile(profile, replica):
+    """The read replica's settings for a profile: `replica` is a file name for SQLite, a host for PostgreSQL"""
+    if profile.startswith("sqlite"):
+        # The copy is written only by `manage.py sync_replica`, never through Django
+        pragmas = {"query_only": "ON"}
+        if profile == "sqlite":
+            pragmas.update(busy_timeout=SQLITE_PRAGMAS["busy_timeout"], cache_size=SQLITE_PRAGMAS["cache_size"],
+                           mmap_size=SQLITE_PRAGMAS["mmap_size"])
+        database = sqlite_profile(replica, pragmas)
+    else:
+        database = postgres_profile(pooled=profile == "postgres-pool")
+        database["HOST"] = replica
+    # Tests read their writes back, so the replica is the primary's test database
+    database["TEST"] = {"MIRROR": "default"}
+    return database
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = connection.settings_dict.get("PRAGMAS") or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,328 @@
+"""
+Shared filtering, sorting and keyset pagination for the list-all endpoints.
+
+Every list view passes its queryset and serializer to list_response() along
+with the query parameters it accepts. Without `limit` or `cursor` the response
+is the plain JSON array the frontend already expects; with them it becomes
+{"results": [...], "next_cursor": "..."}. With `stream=1` the full array is
+streamed in chunks so memory stays flat regardless of table size.
+
+csv_response() serves the export endpoints the same way: the filtered
+queryset is read with values_list() in chunks and written as CSV through a
+generator-backed response.
+
+alist_response() does the same for the async views served through ASGI.
+"""
+import base64
+import csv
+import json
+import re
+from itertools import islice
+
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .async_views import api_request, json_response
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+# Phone numbers and signed amounts ("+63 917 123 4567", "-12.50"): no formula can be spelled with these
+PLAIN_NUMBER = re.compile(r"[+-]?[\d\s().-]*\d[\d\s().-]*")
+
+
+class ListParamError(ValueError):
+    pass
+
+
+def prefix_range(field):
+    """
+    Filter matching values that start with the query value, as a range an
+    index on `field` can serve; SQLite runs __startswith as LIKE ... ESCAPE,
+    which always scans the table. Matches are case-sensitive.
+    """
+    def lookup(value):
+        return Q(**{f"{field}__gte": value, f"{field}__lt": value + "\uffff"})
+    return lookup
+
+
+def apply_filters(request, queryset, filters):
+    """
+    Apply the whitelisted `filters` present in the request. Each maps a query
+    param to an ORM lookup, or to a callable returning a Q for the value.
+    """
+    for param, lookup in (filters or {}).items():
+        value = request.query_params.get(param)
+        if value in (None, ""):
+            continue
+        if callable(lookup):
+            queryset = queryset.filter(lookup(value))
+        else:
+            queryset = queryset.filter(**{lookup: value})
+    return queryset
+
+
+def _encode_cursor(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ListParamError("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ListParamError("Invalid cursor.")
+    return values
+
+
+def _resolve_ordering(request, orderings, default_ordering):
+    ordering = request.query_params.get("ordering") or default_ordering
+    descending = ordering.startswith("-")
+    name = ordering.lstrip("-")
+    if name != "id" and name not in orderings:
+        allowed = ", ".join(sorted({"id", *orderings}))
+        raise ListParamError(f"Cannot sort by '{name}'. Allowed: {allowed}.")
+    return name, descending
+
+
+def _page_size(request):
+    try:
+        limit = int(request.query_params.get("limit") or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        raise ListParamError("limit must be an integer.")
+    if limit < 1:
+        raise ListParamError("limit must be greater than 0.")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _is_nullable(queryset, field):
+    try:
+        return queryset.model._meta.get_field(field).null
+    except FieldDoesNotExist:
+        # Annotated sort keys may be NULL
+        return True
+
+
+def build_list_queryset(request, queryset, filters=None, orderings=None, default_ordering="id"):
+    """
+    Filter and order `queryset` from the request.
+
+    `orderings` maps sortable names to a model field name or, for computed
+    values, a query expression that is annotated onto the queryset. Rows are
+    always ordered by (sort key, pk) so pagination is stable; NULL sort keys
+    come first, and last when descending, on every database.
+    Returns (queryset, sort_attr, descending).
+    """
+    orderings = orderings or {}
+    queryset = apply_filters(request, queryset, filters)
+
+    name, descending = _resolve_ordering(request, orderings, default_ordering)
+    field = orderings.get(name) or name
+    if not isinstance(field, str):
+        alias = f"sort_{name}"
+        queryset = queryset.annotate(**{alias: field})
+        field = alias
+
+    prefix = "-" if descending else ""
+    if field in ("id", "pk"):
+        order_by = [f"{prefix}{field}"]
+    elif _is_nullable(queryset, field):
+        key = F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_first=True)
+        order_by = [key, f"{prefix}pk"]
+    else:
+        order_by = [f"{prefix}{field}", f"{prefix}pk"]
+    return queryset.order_by(*order_by), field, descending
+
+
+def _apply_cursor(queryset, cursor, field, descending):
+    value, pk = _decode_cursor(cursor)
+    op = "lt" if descending else "gt"
+    if field in ("id", "pk"):
+        return queryset.filter(**{f"pk__{op}": pk})
+    if value is None:
+        # NULLs sort first: ascending, every non-NULL key is still ahead; descending, nothing is
+        after = Q(**{f"{field}__isnull": True, f"pk__{op}": pk})
+        return queryset.filter(after if descending else after | Q(**{f"{field}__isnull": False}))
+    after = Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"pk__{op}": pk})
+    if descending and _is_nullable(queryset, field):
+        after |= Q(**{f"{field}__isnull": True})
+    return queryset.filter(after)
+
+
+def _stream_json_array(queryset, serializer_class, serializer_context):
+    rows = queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+    # Same encoding options as DRF's JSONRenderer defaults (UNICODE_JSON, COMPACT_JSON)
+    encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    first = True
+    yield "["
+    while True:
+        chunk = list(islice(rows, STREAM_CHUNK_SIZE))
+        if not chunk:
+            break
+        for item in serializer_class(chunk, many=True, context=serializer_context).data:
+            yield ("" if first else ",") + encoder.encode(item)
+            first = False
+    yield "]"
+
+
+def stream_response(queryset, serializer_class, serializer_context=None):
+    """Stream `queryset` as a JSON array without materializing it"""
+    return StreamingHttpResponse(
+        _stream_json_array(queryset, serializer_class, serializer_context or {}),
+        content_type="application/json",
+    )
+
+
+def list_response(request, queryset, serializer_class, filters=None, orderings=None,
+                  default_ordering="id", serializer_context=None):
+    """Serialize a filtered, sorted and optionally keyset-paginated list"""
+    try:
+        queryset, field, descending = build_list_queryset(request, queryset, filters, orderings, default_ordering)
+
+        if request.query_params.get("stream") in ("1", "true"):
+            return stream_response(queryset, serializer_class, serializer_context)
+
+        cursor = request.query_params.get("cursor")
+        if not cursor and "limit" not in request.query_params:
+            serializer = serializer_class(queryset, many=True, context=serializer_context or {})
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        limit = _page_size(request)
+        if cursor:
+            queryset = _apply_cursor(queryset, cursor, field, descending)
+        rows = list(queryset[:limit + 1])
+    except (ListParamError, ValidationError, FieldError, ValueError) as e:
+        message = e.messages[0] if isinstance(e, ValidationError) else str(e)
+        return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor([getattr(last, field), last.pk])
+
+    serializer = serializer_class(rows, many=True, context=serializer_context or {})
+    return Response({"results": serializer.data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
+
+
+async def _astream_json_array(queryset, serializer_class, serializer_context):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    first = True
+    chunk = []
+    yield "["
+    async for row in queryset.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) < STREAM_CHUNK_SIZE:
+            continue
+        for item in serializer_class(chunk, many=True, context=serializer_context).data:
+            yield ("" if first else ",") + encoder.encode(item)
+            first = False
+        chunk = []
+    for item in serializer_class(chunk, many=True, context=serializer_context).data:
+        yield ("" if first else ",") + encoder.encode(item)
+        first = False
+    yield "]"
+
+
+async def alist_response(request, queryset, serializer_class, filters=None, orderings=None,
+                         default_ordering="id", serializer_context=None):
+    """
+    list_response() for async views, reading rows with the async ORM.
+    `queryset` must select_related() whatever the serializer follows.
+    """
+    request = api_request(request)
+    serializer_context = serializer_context or {}
+    try:
+        queryset, field, descending = build_list_queryset(request, queryset, filters, orderings, default_ordering)
+
+        if request.query_params.get("stream") in ("1", "true"):
+            return StreamingHttpResponse(_astream_json_array(queryset, serializer_class, serializer_context),
+                                         content_type="application/json")
+
+        cursor = request.query_params.get("cursor")
+        paginated = bool(cursor) or "limit" in request.query_params
+        if paginated:
+            limit = _page_size(request)
+            if cursor:
+                queryset = _apply_cursor(queryset, cursor, field, descending)
+            queryset = queryset[:limit + 1]
+        rows = [row async for row in queryset]
+    except (ListParamError, ValidationError, FieldError, ValueError) as e:
+        message = e.messages[0] if isinstance(e, ValidationError) else str(e)
+        return json_response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not paginated:
+        return json_response(serializer_class(rows, many=True, context=serializer_context).data)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor([getattr(last, field), last.pk])
+
+    serializer = serializer_class(rows, many=True, context=serializer_context)
+    return json_response({"results": serializer.data, "next_cursor": next_cursor})
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@") and not PLAIN_NUMBER.fullmatch(value):
+        # Keep spreadsheet apps from evaluating user-entered text as a formula
+        return "'" + value
+    return value
+
+
+def _csv_rows(queryset, headers):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    rows = queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+    while True:
+        chunk = list(islice(rows, STREAM_CHUNK_SIZE))
+        if not chunk:
+            break
+        yield "".join(writer.writerow([_csv_value(value) for value in row]) for row in chunk)
+
+
+def csv_response(request, queryset, columns, filename, filters=None, orderings=None, default_ordering="id"):
+    """
+    Stream a filtered, sorted queryset as a CSV attachment.
+
+    `columns` is a list of (header, value) pairs where value is a field path
+    such as "niche__location" or a query expression annotated onto each row.
+    """
+    try:
+        queryset, _, _ = build_list_queryset(request, queryset, filters, orderings, default_ordering)
+    except (ListParamError, ValidationError, FieldError, ValueError) as e:
+        message = e.messages[0] if isinstance(e, ValidationError) else str(e)
+        return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+
+    names, expressions = [], {}
+    for index, (_, value) in enumerate(columns):
+        if isinstance(value, str):
+            names.append(value)
+        else:
+            names.append(f"export_{index}")
+            expressions[f"export_{index}"] = value
+    queryset = queryset.annotate(**expressions).values_list(*names)
+
+    response = StreamingHttpResponse(_csv_rows(queryset, [header for header, _ in columns]), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
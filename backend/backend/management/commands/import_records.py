@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from backend.bulk import IMPORT_BATCH_SIZE, import_file
+from backend.writes import WriteContention
+
+# The importers used by the matching /api/<resource>/import/ endpoints
+IMPORTERS = {
+    "niches": "niches.views.NICHE_IMPORTER",
+    "customers": "customers.views.CUSTOMER_IMPORTER",
+    "occupants": "occupants.views.OCCUPANT_IMPORTER",
+    "payments": "payments.views.PAYMENT_IMPORTER",
+}
+
+
+class Command(BaseCommand):
+    help = "Bulk-load niches, customers, occupants or payments from a CSV or XLSX file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("resource", choices=sorted(IMPORTERS))
+        parser.add_argument("path", help="CSV or XLSX file with a header row of field names.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate and report without keeping any rows.")
+        parser.add_argument("--skip-invalid", action="store_true", help="Insert the valid rows even if others fail.")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Rows validated and inserted per batch.")
+
+    def handle(self, *args, **options):
+        importer = import_string(IMPORTERS[options["resource"]])
+        try:
+            with open(options["path"], "rb") as fileobj:
+                report = import_file(
+                    importer,
+                    fileobj,
+                    options["path"],
+                    f"import_records.{options['resource']}",
+                    dry_run=options["dry_run"],
+                    skip_invalid=options["skip_invalid"],
+                    batch_size=options["batch_size"],
+                )
+        except (OSError, ValueError, WriteContention) as e:
+            raise CommandError(str(e))
+
+        for error in report["errors"]:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+
+        summary = (
+            f"{report['total_rows']} row(s) read, {report['error_count']} invalid, "
+            f"{report['created']} {'would be ' if options['dry_run'] else ''}created."
+        )
+        if report["error_count"] and not options["skip_invalid"]:
+            raise CommandError(f"{summary} Nothing was imported.")
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,169 @@
+"""
+Read replica routing (REPLICA_DATABASE, configured from DB_REPLICA).
+
+Views decorated with @replica_reads (analytics, list, export and audit
+reads) run their queries against the replica, so reporting traffic does not
+compete with cashier writes on the primary. Everything else reads from the
+primary, and so do:
+
+- writes, and reads inside a transaction on the primary;
+- the session, user and role tables, so a token issued a moment ago is
+  always found;
+- users who wrote within the last REPLICA_STICKY_SECONDS, so they see their
+  own changes before the replica catches up (ReplicaPinMiddleware marks them
+  in the default cache, which must be shared for this to span workers).
+
+With the SQLite profiles the replica is a second database file refreshed
+from the primary with SQLite's backup API by `manage.py sync_replica`.
+"""
+import contextvars
+import sqlite3
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+from user_sessions.utils import aget_auth_context, get_auth_context
+
+# Authentication data is read on every request and must never lag behind a login
+PRIMARY_ONLY_APPS = {"user_sessions", "users", "roles", "auth", "sessions"}
+UNSAFE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+_replica_reads = contextvars.ContextVar("replica_reads", default=False)
+
+
+def replica_alias():
+    return getattr(settings, "REPLICA_DATABASE", None)
+
+
+def _pin_key(user_id):
+    return f"replica.pinned.{user_id}"
+
+
+def pin_to_primary(user_id):
+    """Serve this user's reads from the primary for the next REPLICA_STICKY_SECONDS"""
+    cache.set(_pin_key(user_id), True, getattr(settings, "REPLICA_STICKY_SECONDS", 15))
+
+
+def is_pinned(user_id):
+    return cache.get(_pin_key(user_id), False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if (alias and _replica_reads.get() and model._meta.app_label not in PRIMARY_ONLY_APPS
+                and not connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Also for instances loaded from the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica is a copy of the primary, never migrated on its own
+        return db == DEFAULT_DB_ALIAS
+
+
+def _stream_from_replica(content):
+    # Streamed exports are evaluated after the view returns, a chunk at a time
+    content = iter(content)
+    while True:
+        token = _replica_reads.set(True)
+        try:
+            chunk = next(content)
+        except StopIteration:
+            return
+        finally:
+            _replica_reads.reset(token)
+        yield chunk
+
+
+async def _astream_from_replica(content):
+    content = aiter(content)
+    while True:
+        token = _replica_reads.set(True)
+        try:
+            chunk = await anext(content)
+        except StopAsyncIteration:
+            return
+        finally:
+            _replica_reads.reset(token)
+        yield chunk
+
+
+def replica_reads(view):
+    """Run a read-only view's queries on the replica, unless the user wrote recently"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def awrapped(request, *args, **kwargs):
+            auth = await aget_auth_context(request)
+            if not replica_alias() or (auth.user is not None and await cache.aget(_pin_key(auth.user.pk), False)):
+                return await view(request, *args, **kwargs)
+
+            # Async ORM queries run in threads that inherit this context
+            token = _replica_reads.set(True)
+            try:
+                response = await view(request, *args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+            if getattr(response, "streaming", False):
+                response.streaming_content = _astream_from_replica(response.streaming_content)
+            return response
+        return awrapped
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        # Resolved on the primary before routing starts
+        auth = get_auth_context(request)
+        if not replica_alias() or (auth.user is not None and is_pinned(auth.user.pk)):
+            return view(request, *args, **kwargs)
+
+        token = _replica_reads.set(True)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+        if getattr(response, "streaming", False):
+            response.streaming_content = _stream_from_replica(response.streaming_content)
+        return response
+    return wrapped
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """Pin users to the primary after a successful write"""
+
+    def process_response(self, request, response):
+        if replica_alias() and request.method in UNSAFE_METHODS and response.status_code < 400:
+            auth = get_auth_context(request)
+            if auth.user is not None:
+                pin_to_primary(auth.user.pk)
+        return response
+
+
+def sync_sqlite_replica(alias=None):
+    """Copy the primary SQLite database over the replica's file with the backup API"""
+    alias = alias or replica_alias()
+    if not alias:
+        raise ImproperlyConfigured("No read replica is configured (set DB_REPLICA).")
+    primary = connections[DEFAULT_DB_ALIAS]
+    replica = connections[alias]
+    if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+        raise ImproperlyConfigured("Only SQLite replicas are kept in sync by this project; "
+                                   "PostgreSQL replicas use streaming replication.")
+
+    primary.ensure_connection()
+    target = sqlite3.connect(replica.settings_dict["NAME"], timeout=30)
+    try:
+        # One step, so readers of the replica never see a half-copied database
+        primary.connection.backup(target)
+    finally:
+        target.close()
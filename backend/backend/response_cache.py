@@ -0,0 +1,124 @@
+"""
+Shared cache of read endpoint responses.
+
+Entries are stored in the RESPONSE_CACHE_ALIAS cache under a key built from
+the endpoint, the versions of the resources it reads (see
+backend.conditional), the caller's permission codes and the query string.
+A committed change to any source model bumps its resource version, so every
+entry built from the old rows stops being addressable at once and ages out
+of the cache. Because the versions live in the database, any Django cache
+backend works: local memory per worker by default, or a filesystem or Redis
+cache shared between workers.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from user_sessions.utils import aget_auth_context, get_auth_context
+
+from .async_views import json_response
+from .conditional import (
+    aconditional_response, aresource_versions, conditional_response, resource_versions, version_tag,
+)
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "uncacheable": 0}
+_endpoint_stats = {}
+
+
+def _cache():
+    return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300)
+
+
+def _count(endpoint, key):
+    with _lock:
+        _stats[key] += 1
+        counts = _endpoint_stats.setdefault(endpoint, {"hits": 0, "misses": 0})
+        if key in counts:
+            counts[key] += 1
+
+
+def _key(request, endpoint, auth, versions):
+    permissions = ",".join(sorted(auth.permissions))
+    query = "&".join(f"{name}={value}" for name, values in sorted(request.GET.lists()) for value in values)
+    digest = hashlib.sha256(f"{permissions}|{query}".encode()).hexdigest()[:32]
+    return f"response:{endpoint}:{version_tag(versions)}:{digest}"
+
+
+def cache_key(request, endpoint, resources):
+    return _key(request, endpoint, get_auth_context(request), resource_versions(request, resources))
+
+
+def cached_response(request, endpoint, resources, respond, timeout=None, conditional=True):
+    """
+    Return respond()'s data from the response cache, building and storing it
+    on a miss. Only plain 200 responses are stored; streams and errors pass
+    through. With `conditional`, If-None-Match is answered first (see
+    backend.conditional.conditional_response).
+    """
+    def build():
+        key = cache_key(request, endpoint, resources)
+        data = _cache().get(key)
+        if data is not None:
+            _count(endpoint, "hits")
+            return Response(data, status=status.HTTP_200_OK)
+
+        _count(endpoint, "misses")
+        response = respond()
+        if isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+            _cache().set(key, response.data, timeout if timeout is not None else _timeout())
+            _count(endpoint, "stores")
+        else:
+            _count(endpoint, "uncacheable")
+        return response
+
+    return conditional_response(request, resources, build) if conditional else build()
+
+
+async def acached_response(request, endpoint, resources, respond, timeout=None, conditional=True):
+    """
+    cached_response() for async views; `respond` is a coroutine function. The
+    entries are shared with the sync views.
+    """
+    async def build():
+        key = _key(request, endpoint, await aget_auth_context(request), await aresource_versions(request, resources))
+        data = await _cache().aget(key)
+        if data is not None:
+            _count(endpoint, "hits")
+            return json_response(data)
+
+        _count(endpoint, "misses")
+        response = await respond()
+        if response.status_code == status.HTTP_200_OK and getattr(response, "data", None) is not None:
+            await _cache().aset(key, response.data, timeout if timeout is not None else _timeout())
+            _count(endpoint, "stores")
+        else:
+            _count(endpoint, "uncacheable")
+        return response
+
+    return await aconditional_response(request, resources, build) if conditional else await build()
+
+
+def get_cache_stats():
+    """Hit and miss counts of this worker, overall and per endpoint"""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+            "endpoints": {
+                endpoint: {
+                    **counts,
+                    "hit_rate": round(counts["hits"] / (counts["hits"] + counts["misses"]), 4),
+                }
+                for endpoint, counts in _endpoint_stats.items()
+            },
+        }
@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from corsheaders.defaults import default_headers
 
+from .db import database_profile, replica_profile
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,6 +46,9 @@ INSTALLED_APPS = [
     'corsheaders',
     'rest_framework',
 
+    # Project-wide management commands (backend/management), e.g. import_records
+    'backend',
+
     # Custom apps
     'users',
     'roles',
@@ -54,6 +60,7 @@ INSTALLED_APPS = [
     'niches',
     'user_sessions',
     'analytics',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
@@ -67,6 +74,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'audit.middleware.AuditMiddleware',
+    'backend.replicas.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -88,17 +96,33 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Route the hot read endpoints to their async views (see backend/async_views.py).
+# asgi.py turns this on; the WSGI deployment keeps the sync views.
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Engine profile from DB_PROFILE: sqlite (default, tuned), sqlite-basic,
+# postgres or postgres-pool. See backend/db.py.
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_profile(DB_PROFILE, BASE_DIR / 'db.sqlite3'),
 }
 
+# Optional read replica for analytics, list, export and audit reads (see
+# backend/replicas.py). DB_REPLICA is the replica's SQLite file, refreshed by
+# `manage.py sync_replica`, or the standby's host with PostgreSQL. Users who
+# wrote in the last REPLICA_STICKY_SECONDS read from the primary; keep it above
+# the replica's lag.
+if os.environ.get('DB_REPLICA'):
+    DATABASES['replica'] = replica_profile(DB_PROFILE, os.environ['DB_REPLICA'])
+REPLICA_DATABASE = 'replica' if 'replica' in DATABASES else None
+REPLICA_STICKY_SECONDS = 15
+REPLICA_SYNC_INTERVAL = 5
+DATABASE_ROUTERS = ['backend.replicas.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -178,4 +202,67 @@ SESSION_COOKIE_SAMESITE = 'None'
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_HTTPONLY = False
 
-AUTH_USER_MODEL = "users.User"
\ No newline at end of file
+AUTH_USER_MODEL = "users.User"
+
+# Read endpoint responses are cached per permission set in RESPONSE_CACHE_ALIAS
+# (see backend/response_cache.py). Keys include the data version, so entries
+# never go stale; the timeout only bounds how long unreachable ones stay.
+# Local memory is per worker: use FileBasedCache or RedisCache to share it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Seconds a worker may serve cached role permissions before reloading them.
+# Changes made in the same process are picked up immediately via signals.
+ROLE_PERMISSION_CACHE_TTL = 300
+
+# Session tokens resolved recently are served from a per-process LRU cache for
+# up to this many seconds (never past the session's own expiry). Logins and
+# logouts in the same process evict them at once; other workers notice within
+# the TTL. Expired rows are removed by `manage.py purge_expired_sessions`.
+SESSION_TOKEN_CACHE_TTL = 60
+SESSION_TOKEN_CACHE_SIZE = 1024
+
+# Issue HMAC-signed tokens (see user_sessions/tokens.py) that workers verify
+# without a database query. Opaque session tokens keep working either way.
+# Revocations from logouts in other workers apply within
+# SESSION_REVOCATION_REFRESH seconds.
+SESSION_SIGNED_TOKENS = False
+SESSION_REVOCATION_REFRESH = 30
+
+# Mutating views and audit inserts take the SQLite write lock up front (BEGIN
+# IMMEDIATE, see backend/writes.py) and retry lock conflicts this many times,
+# backing off from WRITE_RETRY_BASE_DELAY up to WRITE_RETRY_MAX_DELAY seconds.
+# After that the view answers 503 with Retry-After: WRITE_RETRY_AFTER.
+WRITE_RETRY_ATTEMPTS = 5
+WRITE_RETRY_BASE_DELAY = 0.05
+WRITE_RETRY_MAX_DELAY = 1.0
+WRITE_RETRY_AFTER = 2
+
+# Audit log writer: entries are queued in-process and written in batches by a
+# background thread. Overflow policy is one of drop_newest, drop_oldest, block
+# (wait briefly, then drop) or sync (write inline when the queue is full).
+AUDIT_ASYNC = True
+AUDIT_QUEUE_SIZE = 10000
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL = 1.0
+AUDIT_OVERFLOW_POLICY = "drop_oldest"
+
+# Audit retention: rows older than AUDIT_RETENTION_DAYS are moved to gzipped
+# JSONL files under AUDIT_ARCHIVE_DIR by `manage.py archive_audit_logs`.
+AUDIT_RETENTION_DAYS = 90
+AUDIT_ARCHIVE_DIR = BASE_DIR / 'audit_archive'
+
+# Dashboard KPIs are kept in a snapshot row updated by signals. It is rebuilt
+# on read once older than this many seconds (None to rely only on
+# `manage.py recompute_dashboard_snapshot`, e.g. from cron) and at month change.
+DASHBOARD_SNAPSHOT_MAX_AGE = 900
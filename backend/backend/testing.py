@@ -0,0 +1,34 @@
+"""Helpers shared by the apps' test modules"""
+from roles.models import Permission, Role
+from user_sessions.models import Session
+from users.models import User
+
+
+def create_user(*permissions, username="staff", **fields):
+    """A user with a role of their own, granted the given permission codes"""
+    role = Role.objects.create(name=username.title())
+    role.permissions.set(Permission.objects.get_or_create(code=code)[0] for code in permissions)
+    return User.objects.create(username=username, role=role, **fields)
+
+
+def sign_in(*permissions, username="staff"):
+    """create_user, and a session token for them; returns (user, token)"""
+    user = create_user(*permissions, username=username)
+    return user, Session.create_session(user).session_token
+
+
+def auth_headers(token):
+    return {"Authorization": f"Session {token}"}
+
+
+class SignedInMixin:
+    """
+    Signs in self.user, granted the `permissions` codes, before each test;
+    self.token is their session token and self.auth the matching headers.
+    """
+    permissions = ()
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.token = sign_in(*self.permissions)
+        self.auth = auth_headers(self.token)
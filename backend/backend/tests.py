@@ -0,0 +1,304 @@
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection, transaction
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from customers.models import Customer
+from customers.views import acustomer_list
+from niches.models import Niche
+from niches.views import alist_niches
+from payments.models import Payment, PaymentDetail
+from payments.views import aget_payment_details, alist_payments
+
+from .db import SQLITE_PRAGMAS, database_profile, replica_profile
+from .response_cache import cached_response
+from .testing import SignedInMixin, auth_headers, sign_in
+from .writes import WriteContention, get_write_stats, run_write
+
+
+class ConditionalResponseTests(SignedInMixin, TestCase):
+    permissions = ("view_dashboard",)
+
+    def get(self, etag=None):
+        headers = {**self.auth, **({"If-None-Match": etag} if etag else {})}
+        return self.client.get("/api/customers/list-names/", headers=headers)
+
+    def test_matching_etag_is_answered_with_304(self):
+        etag = self.get()["ETag"]
+
+        response = self.get(etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+    def test_weak_and_listed_etags_match(self):
+        etag = self.get()["ETag"]
+
+        for header in (f"W/{etag}", f'"other", {etag}', "*"):
+            with self.subTest(header=header):
+                self.assertEqual(self.get(header).status_code, 304)
+
+    def test_committed_change_gives_a_new_etag(self):
+        etag = self.get()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(name="Ana")
+
+        response = self.get(etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual([customer["name"] for customer in response.json()], ["Ana"])
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        caches["responses"].clear()
+
+    def fetch(self, token, body, path="/api/customers/list-all/"):
+        """cached_response() for `token`'s caller; returns (data, whether respond() ran)"""
+        request = RequestFactory().get(path, headers=auth_headers(token))
+        respond = mock.Mock(return_value=Response(body))
+        response = cached_response(request, "customers.list", ["customers"], respond)
+        return response.data, respond.called
+
+    def test_roles_with_different_permissions_do_not_share_a_body(self):
+        _, staff = sign_in("view_dashboard", username="staff")
+        _, admin = sign_in("view_dashboard", "delete_record", username="admin")
+
+        self.assertEqual(self.fetch(staff, {"for": "staff"}), ({"for": "staff"}, True))
+        self.assertEqual(self.fetch(admin, {"for": "admin"}), ({"for": "admin"}, True))
+        self.assertEqual(self.fetch(staff, {"for": "anyone"}), ({"for": "staff"}, False))
+        self.assertEqual(self.fetch(admin, {"for": "anyone"}), ({"for": "admin"}, False))
+
+    def test_same_permissions_share_a_body(self):
+        _, staff = sign_in("view_dashboard", username="staff")
+        _, clerk = sign_in("view_dashboard", username="clerk")
+
+        self.fetch(staff, {"for": "staff"})
+
+        self.assertEqual(self.fetch(clerk, {"for": "clerk"}), ({"for": "staff"}, False))
+
+    def test_query_string_and_committed_changes_miss(self):
+        _, staff = sign_in("view_dashboard")
+        self.fetch(staff, {"page": 1})
+
+        self.assertEqual(self.fetch(staff, {"page": 2}, "/api/customers/list-all/?limit=2"), ({"page": 2}, True))
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(name="Ana")
+        self.assertEqual(self.fetch(staff, {"page": 1, "changed": True}), ({"page": 1, "changed": True}, True))
+
+    def test_errors_are_not_stored(self):
+        _, staff = sign_in("view_dashboard")
+        request = RequestFactory().get("/api/customers/list-all/", headers=auth_headers(staff))
+        cached_response(request, "customers.list", ["customers"],
+                        lambda: Response({"error": "x"}, status=status.HTTP_400_BAD_REQUEST))
+
+        self.assertEqual(self.fetch(staff, {"ok": True}), ({"ok": True}, True))
+
+
+
+def lock_error():
+    return OperationalError("database is locked")
+
+
+@override_settings(WRITE_RETRY_ATTEMPTS=3, WRITE_RETRY_BASE_DELAY=0.001)
+class RunWriteTests(TransactionTestCase):
+    """Outside a test transaction, where run_write() owns the transaction and its retries"""
+
+    def stats(self, endpoint):
+        return get_write_stats().get(endpoint, {"transactions": 0, "retries": 0, "rejected": 0})
+
+    def test_lock_conflicts_are_retried(self):
+        before = self.stats("tests.retried")
+        fn = mock.Mock(side_effect=[lock_error(), lock_error(), "done"])
+
+        self.assertEqual(run_write("tests.retried", fn), "done")
+
+        after = self.stats("tests.retried")
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual((after["retries"] - before["retries"], after["rejected"] - before["rejected"]), (2, 0))
+
+    def test_gives_up_after_the_last_attempt(self):
+        before = self.stats("tests.rejected")
+        fn = mock.Mock(side_effect=lock_error())
+
+        with self.assertRaises(WriteContention):
+            run_write("tests.rejected", fn)
+
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual(self.stats("tests.rejected")["rejected"] - before["rejected"], 1)
+
+    def test_other_errors_are_not_retried(self):
+        fn = mock.Mock(side_effect=OperationalError("no such table: x"))
+
+        with self.assertRaisesMessage(OperationalError, "no such table"):
+            run_write("tests.failed", fn)
+        fn.assert_called_once()
+
+    def test_failed_attempts_are_rolled_back(self):
+        def create():
+            Customer.objects.create(name=f"Attempt {Customer.objects.count()}")
+            if fn.call_count < 2:
+                raise lock_error()
+
+        fn = mock.Mock(side_effect=create)
+        run_write("tests.rolled_back", fn)
+
+        self.assertEqual(list(Customer.objects.values_list("name", flat=True)), ["Attempt 0"])
+
+
+@override_settings(WRITE_RETRY_ATTEMPTS=3, WRITE_RETRY_BASE_DELAY=0.001)
+class LockedDatabaseTests(SignedInMixin, TransactionTestCase):
+    permissions = ("view_dashboard", "add_record")
+
+    def setUp(self):
+        super().setUp()
+        # The audit entry would meet the same lock; only the view is under test here
+        patcher = mock.patch("audit.middleware.record_audit_entry")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_locked_database_answers_503_with_retry_after(self):
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_write_lock():
+            try:
+                with transaction.atomic():
+                    Customer.objects.create(name="Writer")
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_write_lock)
+        holder.start()
+        locked.wait(5)
+        try:
+            response = self.client.post("/api/customers/create-new/", {"name": "Ana"}, headers=self.auth)
+        finally:
+            release.set()
+            holder.join()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertEqual(response.json()["type"], "write_contention")
+        self.assertEqual(list(Customer.objects.values_list("name", flat=True)), ["Writer"])
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_sqlite_profiles(self):
+        self.assertEqual(database_profile("sqlite", "db.sqlite3")["PRAGMAS"], SQLITE_PRAGMAS)
+        self.assertEqual(database_profile("sqlite-basic", "db.sqlite3")["PRAGMAS"], {})
+
+    def test_postgres_profiles(self):
+        persistent, pooled = database_profile("postgres", "db.sqlite3"), database_profile("postgres-pool", "db.sqlite3")
+
+        self.assertEqual(persistent["ENGINE"], "django.db.backends.postgresql")
+        self.assertGreater(persistent["CONN_MAX_AGE"], 0)
+        # The pool reuses connections, so Django must not also keep them
+        self.assertEqual(pooled["CONN_MAX_AGE"], 0)
+        self.assertIn("pool", pooled["OPTIONS"])
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_profile("mysql", "db.sqlite3")
+
+    def test_replicas_are_read_only_and_mirror_the_primary_in_tests(self):
+        sqlite, postgres = replica_profile("sqlite", "replica.sqlite3"), replica_profile("postgres", "standby")
+
+        self.assertEqual(sqlite["PRAGMAS"]["query_only"], "ON")
+        self.assertEqual(postgres["HOST"], "standby")
+        for replica in (sqlite, postgres):
+            self.assertEqual(replica["TEST"], {"MIRROR": "default"})
+
+
+class SqlitePragmaTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_new_connections_are_tuned(self):
+        if connection.vendor != "sqlite" or not connection.settings_dict.get("PRAGMAS"):
+            self.skipTest("runs against the tuned sqlite profile")
+
+        self.assertEqual(self.pragma("busy_timeout"), SQLITE_PRAGMAS["busy_timeout"])
+        self.assertEqual(self.pragma("cache_size"), SQLITE_PRAGMAS["cache_size"])
+        self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma("temp_store"), 2)  # MEMORY
+
+
+class AsyncReadViewTests(SignedInMixin, TestCase):
+    """The async twins served under ASGI answer exactly as the sync views do"""
+
+    permissions = ("view_dashboard", "view_records")
+
+    def setUp(self):
+        super().setUp()
+        caches["responses"].clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(5):
+                Niche.objects.create(amount=500 + index % 2 * 250, location=f"B1-F1-{index:03}")
+                Customer.objects.create(name=f"Customer {index}")
+            self.payment = Payment.objects.create(payer="Ana", amount_due=Decimal("100.00"))
+            PaymentDetail.post(self.payment.pk, Decimal("40.00"))
+
+    def both(self, path, view, params=None, headers=None, **kwargs):
+        headers = {**self.auth, **(headers or {})}
+        sync = self.client.get(path, params or {}, headers=headers)
+        caches["responses"].clear()
+        request = AsyncRequestFactory().get(path, params or {}, headers=headers)
+        return sync, async_to_sync(view)(request, **kwargs)
+
+    def content(self, response):
+        if not response.streaming:
+            return response.content
+        if response.is_async:
+            async def read():
+                return b"".join([chunk async for chunk in response.streaming_content])
+            return async_to_sync(read)()
+        return b"".join(response.streaming_content)
+
+    def assertSameResponse(self, sync, twin):
+        self.assertEqual(twin.status_code, sync.status_code)
+        self.assertEqual(self.content(twin), self.content(sync))
+        self.assertEqual(twin.get("ETag"), sync.get("ETag"))
+
+    def test_lists(self):
+        cases = [
+            ("/api/niches/list-all/", alist_niches, {"ordering": "-amount", "limit": 2}),
+            ("/api/niches/list-all/", alist_niches, {"stream": 1}),
+            ("/api/customers/list-all/", acustomer_list, {"name": "Customer"}),
+            ("/api/payments/list-all/", alist_payments, None),
+        ]
+        for path, view, params in cases:
+            with self.subTest(path=path, params=params):
+                sync, twin = self.both(path, view, params)
+                self.assertEqual(sync.status_code, 200)
+                self.assertSameResponse(sync, twin)
+
+    def test_payment_details(self):
+        path = f"/api/payments/{self.payment.pk}/details/"
+        self.assertSameResponse(*self.both(path, aget_payment_details, payment_id=self.payment.pk))
+
+    def test_errors_and_not_modified(self):
+        etag = self.client.get("/api/customers/list-all/", headers=self.auth)["ETag"]
+        cases = [
+            ({"ordering": "password"}, {}, 400),
+            (None, {"If-None-Match": etag}, 304),
+            (None, {"Authorization": "Session unknown"}, 401),
+        ]
+        for params, headers, status_code in cases:
+            with self.subTest(status_code=status_code):
+                sync, twin = self.both("/api/customers/list-all/", acustomer_list, params, headers)
+                self.assertEqual(sync.status_code, status_code)
+                self.assertSameResponse(sync, twin)
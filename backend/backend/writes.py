@@ -0,0 +1,188 @@
+"""
+Write-path coordination for mutating views and the audit insert.
+
+SQLite allows one writer at a time. Django opens transactions with a
+deferred BEGIN, which starts as a reader and asks for the write lock at the
+first write; if another connection wrote in between, SQLite fails the
+upgrade with "database is locked" straight away, without waiting on
+busy_timeout. run_write() instead opens the transaction with BEGIN
+IMMEDIATE, so the write lock is taken (and waited for) up front, and retries
+lock conflicts with jittered exponential backoff. When the retries run out
+it raises WriteContention, which @coordinated_write turns into a 503 with
+Retry-After instead of a 500.
+
+Time spent waiting for the lock, including backoff, is recorded per
+endpoint (get_write_stats()). On PostgreSQL the transaction starts normally
+and serialization failures and deadlocks are retried the same way.
+"""
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .async_views import json_response
+from .batching import post_commit_batch
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERRORS = ("database is locked", "database table is locked", "database is busy")
+# PostgreSQL serialization failure, deadlock detected, lock not available
+LOCK_SQLSTATES = ("40001", "40P01", "55P03")
+
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {
+    "transactions": 0, "retries": 0, "rejected": 0, "lock_wait_ms": 0.0, "max_lock_wait_ms": 0.0,
+})
+
+
+class WriteContention(OperationalError):
+    """A write still met lock conflicts after every retry"""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def is_lock_conflict(error):
+    if not isinstance(error, OperationalError):
+        return False
+    cause = error.__cause__
+    sqlstate = getattr(cause, "sqlstate", None) or getattr(cause, "pgcode", None)
+    return sqlstate in LOCK_SQLSTATES or any(message in str(error).lower() for message in LOCK_ERRORS)
+
+
+def _backoff(attempt):
+    delay = min(_setting("WRITE_RETRY_MAX_DELAY", 1.0), _setting("WRITE_RETRY_BASE_DELAY", 0.05) * 2 ** attempt)
+    # Half fixed, half random, so writers that collided do not collide again
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+@contextmanager
+def _begin_immediate(connection):
+    """Make transactions started in this block open with BEGIN IMMEDIATE on SQLite"""
+    if connection.vendor != "sqlite":
+        yield
+        return
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = "IMMEDIATE"
+    try:
+        # Also covers the on_commit callbacks, which run before the block exits
+        yield
+    finally:
+        connection.transaction_mode = mode
+
+
+def _record(endpoint, waited, retries, rejected=False):
+    waited_ms = waited * 1000
+    with _lock:
+        stats = _stats[endpoint]
+        stats["transactions"] += 1
+        stats["retries"] += retries
+        stats["rejected"] += rejected
+        stats["lock_wait_ms"] += waited_ms
+        stats["max_lock_wait_ms"] = max(stats["max_lock_wait_ms"], waited_ms)
+
+
+def run_write(endpoint, fn, using=DEFAULT_DB_ALIAS):
+    """
+    Call `fn` in a transaction that holds the write lock from the start,
+    retrying lock conflicts. Returns what `fn` returns; raises
+    WriteContention once WRITE_RETRY_ATTEMPTS attempts have failed.
+    """
+    connection = connections[using]
+    if connection.in_atomic_block:
+        # Part of the caller's transaction, which owns the locking and any retry
+        with transaction.atomic(using=using):
+            return fn()
+
+    attempts = max(1, _setting("WRITE_RETRY_ATTEMPTS", 5))
+    waited = 0.0
+    for attempt in range(attempts):
+        started = time.perf_counter()
+        locked, committed, result = False, [], None
+        try:
+            # The post-commit updates are applied on leaving post_commit_batch(), after the
+            # commit, still opening their transaction with BEGIN IMMEDIATE
+            with _begin_immediate(connection), post_commit_batch(using), transaction.atomic(using=using):
+                waited += time.perf_counter() - started
+                locked = True
+                # Registered first, so it runs first after the commit
+                transaction.on_commit(lambda: committed.append(True), using=using)
+                result = fn()
+        except OperationalError as e:
+            if not is_lock_conflict(e):
+                raise
+            if not locked:
+                waited += time.perf_counter() - started
+            if committed:
+                # A post-commit update failed after the write committed, so the write must not be
+                # repeated; the recount and reconcile commands repair the derived state
+                logger.exception("Post-commit update of %s hit a lock conflict", endpoint)
+            elif attempt + 1 == attempts:
+                _record(endpoint, waited, attempt, rejected=True)
+                raise WriteContention(f"Database still locked after {attempts} attempts at {endpoint}.") from e
+            else:
+                pause = _backoff(attempt)
+                time.sleep(pause)
+                waited += pause
+                continue
+        _record(endpoint, waited, attempt)
+        return result
+
+
+def coordinated_write(endpoint):
+    """
+    Run a mutating view through run_write(), answering 503 with Retry-After
+    when the database stays locked. Goes below @api_view, so retries reuse
+    the parsed request data.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            try:
+                return run_write(endpoint, lambda: view(request, *args, **kwargs))
+            except WriteContention:
+                return contention_response()
+        return wrapped
+    return decorator
+
+
+CONTENTION_ERROR = {
+    "error": "The server is busy saving other changes. Please try again shortly.",
+    "type": "write_contention",
+}
+
+
+def contention_response():
+    """The 503 answered when a write gives up on the lock"""
+    return Response(CONTENTION_ERROR, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={"Retry-After": str(_setting("WRITE_RETRY_AFTER", 2))})
+
+
+def acontention_response():
+    """contention_response() for the async views"""
+    response = json_response(CONTENTION_ERROR, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response["Retry-After"] = str(_setting("WRITE_RETRY_AFTER", 2))
+    return response
+
+
+def get_write_stats():
+    with _lock:
+        return {
+            endpoint: {
+                **stats,
+                "lock_wait_ms": round(stats["lock_wait_ms"], 2),
+                "max_lock_wait_ms": round(stats["max_lock_wait_ms"], 2),
+                "avg_lock_wait_ms": round(stats["lock_wait_ms"] / stats["transactions"], 2),
+            }
+            for endpoint, stats in _stats.items()
+        }
@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+
+from backend.db import database_profile
+from customers.models import Customer
+from niches.models import Niche
+from occupants.models import Occupant
+from payments.models import Payment, PaymentDetail
+from roles.models import Permission, Role
+from user_sessions.models import Session
+from users.models import User
+
+READ_PATHS = [
+    "/api/niches/list-all/?limit=50",
+    "/api/occupants/list-all/?limit=50",
+    "/api/customers/list-all/?limit=50",
+    "/api/payments/list-all/?limit=50",
+    "/api/payments/{payment}/details/",
+    "/api/analytics/data/",
+    "/api/verify-token/",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the read endpoints served through the WSGI handler (sync views, a fixed pool of worker "
+        "threads) with the ASGI handler (async views, see backend/async_views.py) under concurrent load. "
+        "Each server runs in its own process against a seeded scratch SQLite database; --latency-ms adds "
+        "a delay to every query, standing in for a database across the network."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Requests sent to each server.")
+        parser.add_argument("--concurrency", type=int, default=32, help="Clients with a request in flight.")
+        parser.add_argument("--threads", type=int, default=8,
+                            help="WSGI worker threads, as in `gunicorn --threads`.")
+        parser.add_argument("--latency-ms", type=float, default=20.0, help="Delay added to every SQL query.")
+        parser.add_argument("--rows", type=int, default=200, help="Niches, customers and payment details to seed.")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+        # Used by the command to start each server process
+        parser.add_argument("--serve", choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+        parser.add_argument("--database-file", help=argparse.SUPPRESS)
+        parser.add_argument("--token", help=argparse.SUPPRESS)
+        parser.add_argument("--payment", type=int, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["serve"]:
+            result = self.serve(options)
+            self.stdout.write(json.dumps(result))
+            return
+
+        scratch = Path(tempfile.mkdtemp(prefix="benchmark_asgi_"))
+        settings_dict = connection.settings_dict
+        original = dict(settings_dict)
+        connection.close()
+        settings_dict.clear()
+        settings_dict.update(
+            connections.configure_settings({"default": database_profile("sqlite", scratch / "db.sqlite3")})["default"]
+        )
+        settings_dict["TEST"]["NAME"] = str(scratch / "db.sqlite3")
+        try:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                token, payment = self.seed(options["rows"])
+                connection.close()
+                results = [self.run_server(server, settings_dict["NAME"], token, payment, options)
+                           for server in ("wsgi", "asgi")]
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            connection.close()
+            settings_dict.clear()
+            settings_dict.update(original)
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{'server':<8}{'requests':>10}{'req/s':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'threads':>9}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['server']:<8}{result['requests']:>10}{result['requests_per_second']:>9.1f}"
+                f"{result['errors']:>8}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['max_threads']:>9}"
+            )
+
+    def seed(self, rows):
+        role = Role.objects.create(name="Benchmark")
+        role.permissions.set(
+            Permission.objects.create(code=code) for code in ("view_records", "view_dashboard")
+        )
+        user = User.objects.create(username="benchmark", password="benchmark", role=role)
+
+        Niche.objects.bulk_create(
+            Niche(amount=1000, location=f"BENCH-{i}", max_occupants=4) for i in range(rows)
+        )
+        Occupant.objects.bulk_create(
+            Occupant(name=f"Benchmark occupant {i}", niche=niche, interment_date=date(2020, 1, 1))
+            for i, niche in enumerate(Niche.objects.all())
+        )
+        Customer.objects.bulk_create(Customer(name=f"Benchmark customer {i}") for i in range(rows))
+        payment = Payment.objects.create(payer="Benchmark payer", amount_due=Decimal("1000000.00"))
+        for _ in range(rows):
+            PaymentDetail.post(payment.pk, Decimal("1.00"))
+        return Session.create_session(user).session_token, payment.pk
+
+    def run_server(self, server, database_file, token, payment, options):
+        env = {**os.environ, "ASYNC_READ_VIEWS": "1" if server == "asgi" else "0"}
+        env.pop("DB_REPLICA", None)
+        command = [
+            sys.executable, str(Path(settings.BASE_DIR) / "manage.py"), "benchmark_asgi", "--serve", server,
+            "--database-file", database_file, "--token", token, "--payment", str(payment),
+        ]
+        for option in ("requests", "concurrency", "threads", "latency_ms"):
+            command += [f"--{option.replace('_', '-')}", str(options[option])]
+        finished = subprocess.run(command, env=env, capture_output=True, text=True)
+        if finished.returncode:
+            raise CommandError(f"The {server} run failed:\n{finished.stderr}")
+        return json.loads(finished.stdout.strip().splitlines()[-1])
+
+    def serve(self, options):
+        connection.settings_dict["NAME"] = options["database_file"]
+        latency = options["latency_ms"] / 1000
+
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            # Sent again each time a worker thread's connection reconnects
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+
+        if latency:
+            connection_created.connect(add_latency, weak=False)
+
+        paths = [path.format(payment=options["payment"]) for path in READ_PATHS]
+        if options["serve"] == "asgi":
+            application = get_asgi_application()
+
+            def call(path):
+                return self.asgi_get(application, path, options["token"])
+        else:
+            application = get_wsgi_application()
+            pool = ThreadPoolExecutor(max_workers=options["threads"])
+
+            def call(path):
+                return asyncio.get_running_loop().run_in_executor(
+                    pool, self.wsgi_get, application, path, options["token"])
+
+        result = asyncio.run(self.drive(call, paths, options["requests"], options["concurrency"]))
+        return {
+            "server": options["serve"],
+            "concurrency": options["concurrency"],
+            "threads": options["threads"] if options["serve"] == "wsgi" else None,
+            "latency_ms": options["latency_ms"],
+            **result,
+        }
+
+    async def drive(self, call, paths, requests, concurrency):
+        # One round of every path first, so imports and connections are not timed
+        for path in paths:
+            await call(path)
+
+        latencies, errors, max_threads = [], 0, threading.active_count()
+        counter = itertools.count()
+
+        async def client():
+            nonlocal errors, max_threads
+            while (n := next(counter)) < requests:
+                started = time.perf_counter()
+                status = await call(paths[n % len(paths)])
+                latencies.append(time.perf_counter() - started)
+                errors += status != 200
+                max_threads = max(max_threads, threading.active_count())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000 if latencies else 0.0
+
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "seconds": round(elapsed, 2),
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(0.5), 2),
+            "p95_ms": round(percentile(0.95), 2),
+            "max_threads": max_threads,
+        }
+
+    def wsgi_get(self, application, path, token):
+        path, _, query = path.partition("?")
+        environ = {
+            "REQUEST_METHOD": "GET", "SCRIPT_NAME": "", "PATH_INFO": path, "QUERY_STRING": query,
+            "SERVER_NAME": "localhost", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": "localhost", "HTTP_AUTHORIZATION": f"Session {token}",
+            "HTTP_SESSION_TOKEN": token,
+            "wsgi.version": (1, 0), "wsgi.url_scheme": "http", "wsgi.input": io.BytesIO(),
+            "wsgi.errors": sys.stderr, "wsgi.multithread": True, "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        status = []
+        body = application(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+        try:
+            for _ in body:
+                pass
+        finally:
+            body.close()
+        return int(status[0].split()[0])
+
+    async def asgi_get(self, application, path, token):
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+            "root_path": "", "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+            "headers": [(b"host", b"localhost"), (b"authorization", f"Session {token}".encode()),
+                        (b"session-token", token.encode())],
+        }
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # The client stays connected until the response is sent
+            await asyncio.Future()
+
+        status = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        await application(scope, receive, send)
+        return status[0]
+
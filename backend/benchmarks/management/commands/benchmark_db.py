@@ -0,0 +1,191 @@
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from backend.db import database_profile
+from backend.writes import WriteContention, run_write
+from customers.models import Customer
+from niches.models import Niche
+from occupants.models import Occupant
+from payments.models import Payment, PaymentDetail, PaymentRejected
+
+
+def post_payment(rng, ids):
+    try:
+        PaymentDetail.post(rng.choice(ids["payments"]), Decimal("1.00"))
+    except PaymentRejected:
+        pass
+
+
+def add_occupant(rng, ids):
+    Occupant.objects.create(name="Benchmark", niche_id=rng.choice(ids["niches"]), interment_date=date.today())
+
+
+def remove_occupant(rng, ids):
+    occupant = Occupant.objects.filter(niche_id=rng.choice(ids["niches"])).first()
+    if occupant is not None:
+        occupant.delete()
+
+
+def edit_customer(rng, ids):
+    customer = Customer.objects.get(pk=rng.choice(ids["customers"]))
+    customer.address = f"Benchmark address {rng.randint(1, 10000)}"
+    customer.save()
+
+
+# (operation, weight): roughly the write traffic of a working day
+WRITE_MIX = [
+    (post_payment, 40),
+    (add_occupant, 30),
+    (remove_occupant, 10),
+    (edit_customer, 20),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure write throughput of database profiles (see backend/db.py) on a mix of payment postings, "
+        "occupant changes and customer edits from concurrent workers. Each profile runs against a "
+        "scratch database, created like a test database and dropped afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", action="append", dest="profiles",
+                            help="Profile to measure; repeat to compare. Defaults to sqlite-basic and sqlite.")
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent writers.")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run each profile.")
+        parser.add_argument("--rows", type=int, default=200, help="Niches, customers and payments to seed.")
+        parser.add_argument("--coordinated", action="store_true",
+                            help="Run each operation through the write coordinator (backend/writes.py), "
+                                 "as the mutating views do.")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        profiles = options["profiles"] or ["sqlite-basic", "sqlite"]
+        results = [self.run_profile(profile, options) for profile in profiles]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{'profile':<16}{'ops':>8}{'ops/s':>10}{'errors':>8}{'503s':>8}{'p50 ms':>9}{'p95 ms':>9}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['profile']:<16}{result['operations']:>8}{result['ops_per_second']:>10.1f}"
+                f"{result['errors']:>8}{result['rejected']:>8}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+            )
+
+    def run_profile(self, profile, options):
+        settings_dict = connection.settings_dict
+        original = dict(settings_dict)
+        scratch = Path(tempfile.mkdtemp(prefix="benchmark_db_"))
+        connection.close()
+
+        database = connections.configure_settings({"default": database_profile(profile, scratch / "db.sqlite3")})
+        settings_dict.clear()
+        settings_dict.update(database["default"])
+        if settings_dict["ENGINE"].endswith("sqlite3"):
+            # A file, not the in-memory default, so workers contend for the same lock as in production
+            settings_dict["TEST"]["NAME"] = str(scratch / "db.sqlite3")
+
+        try:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                ids = self.seed(options["rows"])
+                result = self.run_workers(ids, options["workers"], options["duration"], options["coordinated"])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        except OperationalError as e:
+            raise CommandError(f"Could not use profile '{profile}': {e}")
+        finally:
+            connection.close()
+            settings_dict.clear()
+            settings_dict.update(original)
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        return {"profile": profile, "workers": options["workers"], "coordinated": options["coordinated"], **result}
+
+    def seed(self, rows):
+        Niche.objects.bulk_create(
+            Niche(amount=1000, location=f"BENCH-{i}", max_occupants=1000000) for i in range(rows)
+        )
+        Customer.objects.bulk_create(Customer(name=f"Benchmark customer {i}") for i in range(rows))
+        Payment.objects.bulk_create(
+            Payment(payer=f"Benchmark payer {i}", amount_due=Decimal("1000000.00"), status="Inactive")
+            for i in range(rows)
+        )
+        return {
+            "niches": list(Niche.objects.values_list("pk", flat=True)),
+            "customers": list(Customer.objects.values_list("pk", flat=True)),
+            "payments": list(Payment.objects.values_list("pk", flat=True)),
+        }
+
+    def run_workers(self, ids, workers, duration, coordinated=False):
+        operations, weights = zip(*WRITE_MIX)
+        latencies, errors, rejected = [], [], []
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(workers + 1)
+
+        def work(index):
+            rng = random.Random(index)
+            own_latencies, own_errors, own_rejected = [], 0, 0
+            start_barrier.wait()
+            deadline = time.monotonic() + duration
+            try:
+                while time.monotonic() < deadline:
+                    operation = rng.choices(operations, weights)[0]
+                    started = time.perf_counter()
+                    try:
+                        if coordinated:
+                            run_write(f"benchmark.{operation.__name__}", lambda: operation(rng, ids))
+                        else:
+                            operation(rng, ids)
+                    except WriteContention:
+                        # The view would have answered 503 with Retry-After
+                        own_rejected += 1
+                        continue
+                    except OperationalError:
+                        # e.g. "database is locked": the request would have failed
+                        own_errors += 1
+                        continue
+                    own_latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(own_latencies)
+                    errors.append(own_errors)
+                    rejected.append(own_rejected)
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        start_barrier.wait()
+        started = time.monotonic()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000 if latencies else 0.0
+
+        return {
+            "operations": len(latencies),
+            "errors": sum(errors),
+            "rejected": sum(rejected),
+            "seconds": round(elapsed, 2),
+            "ops_per_second": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(0.5), 2),
+            "p95_ms": round(percentile(0.95), 2),
+        }
@@ -0,0 +1,273 @@
+import io
+import json
+import logging
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+
+from audit.writer import get_audit_writer
+from backend.db import database_profile
+from benchmarks.scenarios import SCENARIOS, Context
+from contacts.models import Contact
+from customers.models import Customer
+from niches.models import Niche
+from occupants.models import Occupant
+from payments.models import Payment, PaymentDetail
+from user_sessions.models import Session
+from users.models import User
+
+
+def url_routes(patterns=None, prefix="/"):
+    """(name, route) of every named URL, in URLconf order; Django's admin is left out"""
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace != "admin":
+                yield from url_routes(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif pattern.name:
+            yield pattern.name, prefix + str(pattern.pattern)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every endpoint in backend/urls.py through the test client against a scratch database "
+        "filled by generate_dataset. Records latency percentiles over --iterations requests, plus the SQL "
+        "query count and peak Python memory of one further request (measured separately, as tracing slows "
+        "the request down), as a JSON report that --compare can check against a report from another commit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", default=settings.DB_PROFILE, help="Database profile (see backend/db.py).")
+        parser.add_argument("--seed", type=int, default=1, help="Seed for the dataset and the requests.")
+        parser.add_argument("--niches", type=int, default=1000, help="Dataset size, see generate_dataset.")
+        parser.add_argument("--iterations", type=int, default=20, help="Timed requests per endpoint.")
+        parser.add_argument("--warmup", type=int, default=2, help="Untimed requests per endpoint first.")
+        parser.add_argument("--endpoint", action="append", dest="endpoints",
+                            help="URL name to run; repeat for several. Defaults to all.")
+        parser.add_argument("--cold-cache", action="store_true",
+                            help="Clear the response cache before every request.")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--compare", help="Earlier JSON report to compare the results with.")
+        parser.add_argument("--json", action="store_true", help="Print the JSON report.")
+
+    def handle(self, *args, **options):
+        routes = dict(url_routes())
+        uncovered = sorted(set(routes) - set(SCENARIOS))
+        selected = options["endpoints"] or [name for name in routes if name in SCENARIOS]
+        unknown = [name for name in selected if name not in routes or name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"No benchmark scenario for: {', '.join(unknown)}.")
+        if uncovered:
+            self.stderr.write(f"Endpoints without a scenario in benchmarks/scenarios.py: {', '.join(uncovered)}")
+
+        baseline = None
+        if options["compare"]:
+            try:
+                baseline = json.loads(Path(options["compare"]).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['compare']}: {e}")
+
+        report = {
+            "commit": self.git_commit(),
+            "created_at": timezone.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "profile": options["profile"],
+            "seed": options["seed"],
+            "iterations": options["iterations"],
+            "warmup": options["warmup"],
+            "cold_cache": options["cold_cache"],
+            **self.run_suite(selected, routes, options),
+            "not_covered": uncovered,
+        }
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2) + "\n")
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        elif baseline is not None:
+            self.print_comparison(baseline, report)
+        else:
+            self.print_results(report)
+
+    def run_suite(self, selected, routes, options):
+        settings_dict = connection.settings_dict
+        original = dict(settings_dict)
+        scratch = Path(tempfile.mkdtemp(prefix="benchmark_endpoints_"))
+        connection.close()
+
+        database = connections.configure_settings(
+            {"default": database_profile(options["profile"], scratch / "db.sqlite3")}
+        )
+        settings_dict.clear()
+        settings_dict.update(database["default"])
+        if settings_dict["ENGINE"].endswith("sqlite3"):
+            settings_dict["TEST"]["NAME"] = str(scratch / "db.sqlite3")
+
+        try:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            # Reads stay on the scratch database
+            with override_settings(REPLICA_DATABASE=None):
+                try:
+                    return self.run_endpoints(selected, routes, options)
+                finally:
+                    # Audit entries queued by the requests must be written before the database goes
+                    get_audit_writer().flush()
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        except OperationalError as e:
+            raise CommandError(f"Could not use profile '{options['profile']}': {e}")
+        finally:
+            connection.close()
+            settings_dict.clear()
+            settings_dict.update(original)
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def run_endpoints(self, selected, routes, options):
+        call_command("generate_dataset", seed=options["seed"], niches=options["niches"], stdout=io.StringIO())
+        dataset = {
+            model._meta.label: model.objects.count()
+            for model in (Niche, Occupant, Customer, Contact, Payment, PaymentDetail, User)
+        }
+
+        admin = User.objects.filter(role__name="Admin").order_by("pk").first()
+        token = Session.create_session(admin).session_token
+        ctx = Context(random.Random(options["seed"]), {
+            "niches": list(Niche.objects.order_by("pk").values_list("pk", flat=True)),
+            "occupants": list(Occupant.objects.order_by("pk").values_list("pk", flat=True)),
+            "customers": list(Customer.objects.order_by("pk").values_list("pk", flat=True)),
+            "contacts": list(Contact.objects.order_by("pk").values_list("pk", flat=True)),
+            "payments": list(Payment.objects.order_by("pk").values_list("pk", flat=True)),
+        }, admin, token)
+        client = Client(raise_request_exception=False, HTTP_HOST="localhost")
+
+        endpoints = {}
+        # Server errors are counted in each endpoint's statuses instead of logged
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            for name in selected:
+                if options["verbosity"] > 1:
+                    self.stderr.write(f"Running {name}...")
+                # Keep the views' debugging prints out of the report
+                with redirect_stdout(io.StringIO()):
+                    result = self.run_endpoint(client, SCENARIOS[name], ctx, options)
+                endpoints[name] = {"route": routes[name], **result}
+        finally:
+            request_logger.setLevel(level)
+        return {"dataset": dataset, "endpoints": endpoints}
+
+    def run_endpoint(self, client, build, ctx, options):
+        latencies, statuses = [], Counter()
+        for iteration in range(options["warmup"] + options["iterations"]):
+            call = build(ctx)
+            self.prepare(options)
+            started = time.perf_counter()
+            response, size = self.send(client, call, ctx)
+            elapsed = time.perf_counter() - started
+            if iteration >= options["warmup"]:
+                latencies.append(elapsed)
+                statuses[response.status_code] += 1
+
+        call = build(ctx)
+        self.prepare(options)
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                self.send(client, call, ctx)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        latencies.sort()
+
+        def percentile(fraction):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 2)
+
+        return {
+            "method": call.method,
+            "statuses": {str(code): count for code, count in sorted(statuses.items())},
+            "p50_ms": percentile(0.5),
+            "p90_ms": percentile(0.9),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(latencies[-1] * 1000, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "queries": len(queries),
+            "peak_memory_kb": round(peak / 1024, 1),
+            "response_bytes": size,
+        } if latencies else {"method": call.method, "statuses": {}}
+
+    def prepare(self, options):
+        if options["cold_cache"]:
+            caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")].clear()
+
+    def send(self, client, call, ctx):
+        headers = call.headers or {"HTTP_AUTHORIZATION": f"Session {ctx.token}"}
+        if call.upload is not None:
+            response = client.post(call.path, {"file": call.upload}, **headers)
+        elif call.data is not None:
+            response = client.generic(call.method, call.path, json.dumps(call.data, cls=DjangoJSONEncoder),
+                                      "application/json", **headers)
+        else:
+            response = client.generic(call.method, call.path, **headers)
+        # Streamed bodies are produced while they are read
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, len(body)
+
+    def git_commit(self):
+        try:
+            result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR,
+                                    capture_output=True, text=True)
+        except OSError:
+            return None
+        return result.stdout.strip() or None
+
+    def print_results(self, report):
+        self.stdout.write(
+            f"{'endpoint':<30}{'method':>7}{'status':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}"
+            f"{'queries':>9}{'peak KiB':>10}"
+        )
+        for name, result in report["endpoints"].items():
+            if "p50_ms" not in result:
+                continue
+            status = ",".join(result["statuses"])
+            self.stdout.write(
+                f"{name:<30}{result['method']:>7}{status:>8}{result['p50_ms']:>9.1f}{result['p90_ms']:>9.1f}"
+                f"{result['p99_ms']:>9.1f}{result['queries']:>9}{result['peak_memory_kb']:>10.0f}"
+            )
+
+    def print_comparison(self, baseline, report):
+        old_commit, new_commit = (baseline.get("commit") or "?")[:10], (report["commit"] or "?")[:10]
+        self.stdout.write(f"Comparing {old_commit} (before) with {new_commit} (after)")
+        self.stdout.write(
+            f"{'endpoint':<30}{'p50 before':>11}{'p50 after':>11}{'change':>9}{'queries':>12}{'peak KiB':>16}"
+        )
+        for name, result in report["endpoints"].items():
+            before = baseline.get("endpoints", {}).get(name)
+            if "p50_ms" not in result or not before or "p50_ms" not in before:
+                continue
+            change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+            self.stdout.write(
+                f"{name:<30}{before['p50_ms']:>11.1f}{result['p50_ms']:>11.1f}{change:>+8.0f}%"
+                f"{before['queries']:>6} -> {result['queries']:<3}"
+                f"{before['peak_memory_kb']:>8.0f} -> {result['peak_memory_kb']:<5.0f}"
+            )
@@ -0,0 +1,271 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from analytics.models import RESOURCE_MODELS, DashboardSnapshot, ResourceVersion
+from audit.models import AuditLog, AuditLogTarget
+from contacts.models import Contact
+from customers.models import Customer
+from niches.models import Niche
+from occupants.models import Occupant
+from payments.models import Payment, PaymentDetail
+from roles.models import Permission, Role
+from users.models import User
+
+BATCH_SIZE = 1000
+# Dates are spread back from a fixed day, so a seed gives the same rows whenever it is run
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+USER_PASSWORD = "benchmark"
+NICHES_PER_FLOOR = 200
+
+PERMISSIONS = [
+    "view_dashboard", "view_records", "add_record", "edit_record", "delete_record",
+    "manage_dashboard", "manage_users", "view_audit",
+]
+ROLES = {
+    "Admin": PERMISSIONS,
+    "Staff": ["view_dashboard", "view_records", "add_record", "edit_record"],
+    "Viewer": ["view_dashboard", "view_records"],
+}
+
+NICHE_TYPES = ["Granite", "Glass", "Marble", "Wood"]
+NICHE_PRICES = [25000, 35000, 50000, 80000, 120000]
+FIRST_NAMES = [
+    "Maria", "Jose", "Juan", "Ana", "Pedro", "Rosa", "Antonio", "Carmen", "Luis", "Elena",
+    "Ramon", "Teresa", "Miguel", "Lourdes", "Andres", "Cristina", "Manuel", "Josefina", "Carlos", "Isabel",
+]
+FAMILY_NAMES = [
+    "Santos", "Reyes", "Cruz", "Bautista", "Garcia", "Mendoza", "Torres", "Flores", "Villanueva", "Ramos",
+    "Aquino", "Castillo", "Rivera", "Gonzales", "Navarro", "Domingo", "Salazar", "Mercado", "Aguilar", "Dela Cruz",
+]
+STREETS = ["Rizal St.", "Mabini Ave.", "Bonifacio St.", "Luna St.", "Del Pilar St.", "Burgos Ave."]
+RELATIONSHIPS = ["Spouse", "Son", "Daughter", "Sibling", "Parent", "Grandchild", "Relative"]
+AUDITED_RESOURCES = {
+    "niches": "niche", "occupants": "occupant", "customers": "customer", "contacts": "contact", "payments": "payment",
+}
+AUDITED_ACTIONS = [("create", "POST", "create-new", 201), ("update", "PUT", "edit", 200), ("delete", "DELETE", "delete", 200)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with a reproducible synthetic columbarium: niches across buildings, "
+        "occupants, customers, contacts, payments with their payment details, users for each role and "
+        "audit history. The same --seed and sizes always produce the same rows. Generated users log in "
+        f"with the password '{USER_PASSWORD}'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1, help="Random seed.")
+        parser.add_argument("--niches", type=int, default=2000, help="Niches to create.")
+        parser.add_argument("--buildings", type=int, default=4, help="Buildings the niches are spread across.")
+        parser.add_argument("--customers", type=int, help="Customers to create (default: one per niche).")
+        parser.add_argument("--contacts", type=int, help="Contacts to create (default: one per two niches).")
+        parser.add_argument("--payments", type=int, help="Payments to create (default: one per customer).")
+        parser.add_argument("--details-per-payment", type=int, default=12,
+                            help="Average payment details per payment.")
+        parser.add_argument("--users-per-role", type=int, default=3, help="Users created for each role.")
+        parser.add_argument("--audit-entries", type=int, help="Audit log entries (default: five per niche).")
+        parser.add_argument("--flush", action="store_true",
+                            help="Delete everything in the database first, instead of refusing a non-empty one.")
+
+    def handle(self, *args, **options):
+        if options["flush"]:
+            call_command("flush", interactive=False, verbosity=0)
+        elif Niche.objects.exists() or User.objects.exists():
+            raise CommandError("The database already has data; use --flush to replace it.")
+
+        niches = options["niches"]
+        customers = options["customers"] if options["customers"] is not None else niches
+        sizes = {
+            "customers": customers,
+            "contacts": options["contacts"] if options["contacts"] is not None else niches // 2,
+            "payments": options["payments"] if options["payments"] is not None else customers,
+            "audit_entries": options["audit_entries"] if options["audit_entries"] is not None else niches * 5,
+        }
+        rng = random.Random(options["seed"])
+
+        with transaction.atomic():
+            users = self.create_users(options["users_per_role"])
+            niche_ids = self.create_niches(rng, niches, options["buildings"])
+            occupant_ids = self.create_occupants(rng, niche_ids)
+            customer_ids = self.create_customers(rng, sizes["customers"])
+            contact_ids = self.create_contacts(rng, sizes["contacts"])
+            payment_ids = self.create_payments(rng, sizes["payments"], options["details_per_payment"], users)
+            self.create_audit_history(rng, sizes["audit_entries"], users, {
+                "niche": niche_ids, "occupant": occupant_ids, "customer": customer_ids,
+                "contact": contact_ids, "payment": payment_ids,
+            })
+
+            # Rows were bulk inserted without signals; derive the stored totals in one pass each
+            Niche.objects.recount_occupants()
+            Payment.objects.recalculate_totals()
+            DashboardSnapshot.recompute()
+            ResourceVersion.bump(*RESOURCE_MODELS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(niche_ids)} niches in {options['buildings']} buildings, {len(occupant_ids)} occupants, "
+            f"{len(customer_ids)} customers, {len(contact_ids)} contacts, {len(payment_ids)} payments with "
+            f"{PaymentDetail.objects.count()} payment details, {len(users)} users and "
+            f"{sizes['audit_entries']} audit entries (seed {options['seed']})."
+        ))
+
+    def create_users(self, per_role):
+        permissions = {code: Permission.objects.create(code=code) for code in PERMISSIONS}
+        users = []
+        for name, codes in ROLES.items():
+            role = Role.objects.create(name=name)
+            role.permissions.set(permissions[code] for code in codes)
+            # login_view compares the stored password as is
+            users += User.objects.bulk_create(
+                User(username=f"{name.lower()}{i + 1}", password=USER_PASSWORD, role=role, date_joined=EPOCH)
+                for i in range(per_role)
+            )
+        return users
+
+    def create_niches(self, rng, count, buildings):
+        per_building = -(-count // max(1, buildings))
+        Niche.objects.bulk_create(
+            (
+                Niche(
+                    amount=rng.choice(NICHE_PRICES),
+                    location=self.location(i // per_building, i % per_building),
+                    max_occupants=rng.choice([1, 2, 2, 4]),
+                    type=rng.choice(NICHE_TYPES),
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return list(Niche.objects.order_by("pk").values_list("pk", flat=True))
+
+    def create_occupants(self, rng, niche_ids):
+        capacities = dict(Niche.objects.values_list("pk", "max_occupants"))
+        Occupant.objects.bulk_create(
+            (
+                Occupant(name=self.person(rng), niche_id=niche_id, interment_date=self.past_date(rng, 30 * 365))
+                for niche_id in niche_ids
+                for _ in range(rng.randint(0, capacities[niche_id]))
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return list(Occupant.objects.order_by("pk").values_list("pk", flat=True))
+
+    def create_customers(self, rng, count):
+        Customer.objects.bulk_create(
+            (
+                Customer(
+                    name=self.person(rng),
+                    contact_number=self.phone(rng),
+                    email=f"customer{i + 1}@example.com",
+                    address=self.address(rng),
+                    deceased_name=self.person(rng),
+                    deceased_date=self.past_date(rng, 20 * 365),
+                    relationship_to_deceased=rng.choice(RELATIONSHIPS),
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return list(Customer.objects.order_by("pk").values_list("pk", flat=True))
+
+    def create_contacts(self, rng, count):
+        Contact.objects.bulk_create(
+            (
+                Contact(
+                    family_name=rng.choice(FAMILY_NAMES),
+                    deceased_name=self.person(rng),
+                    deceased_date=self.past_date(rng, 20 * 365),
+                    address=self.address(rng),
+                    contact_number=self.phone(rng),
+                )
+                for _ in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return list(Contact.objects.order_by("pk").values_list("pk", flat=True))
+
+    def create_payments(self, rng, count, details_per_payment, users):
+        Payment.objects.bulk_create(
+            (
+                Payment(
+                    payer=self.person(rng),
+                    amount_due=Decimal(rng.choice(NICHE_PRICES)),
+                    maintenance_fee=Decimal(rng.choice([0, 500, 1000])),
+                    status="Inactive",
+                )
+                for _ in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        payments = Payment.objects.order_by("pk").values_list("pk", "amount_due")
+        cashiers = [user.username for user in users if user.role.name != "Viewer"]
+
+        def details():
+            for payment_id, amount_due in payments:
+                # Monthly installments that never exceed the amount due
+                installments = rng.randint(0, 2 * details_per_payment)
+                amount = (amount_due / max(installments, 24)).quantize(Decimal("0.01"))
+                started = EPOCH - timedelta(days=rng.randint(30 * installments, 30 * installments + 365))
+                for month in range(installments):
+                    yield PaymentDetail(
+                        payment_id=payment_id,
+                        amount=amount,
+                        payment_date=started + timedelta(days=30 * month, minutes=rng.randint(480, 1020)),
+                        created_by=rng.choice(cashiers),
+                        notes=f"Installment {month + 1}" if rng.random() < 0.3 else None,
+                    )
+
+        PaymentDetail.objects.bulk_create(details(), batch_size=BATCH_SIZE)
+        return [payment_id for payment_id, _ in payments]
+
+    def create_audit_history(self, rng, count, users, ids):
+        resources = [resource for resource in AUDITED_RESOURCES if ids[AUDITED_RESOURCES[resource]]]
+        if not resources:
+            return
+        logs, targets = [], []
+        for _ in range(count):
+            resource = rng.choice(resources)
+            object_type = AUDITED_RESOURCES[resource]
+            object_id = rng.choice(ids[object_type])
+            action, method, segment, status_code = rng.choice(AUDITED_ACTIONS)
+            logs.append(AuditLog(
+                user=rng.choice(users),
+                app=resource.capitalize(),
+                action=action,
+                path=f"/api/{resource}/{segment}/",
+                method=method,
+                request_data={"element_ids": [object_id]} if action == "delete" else {"id": object_id},
+                response_data={"ids": [object_id]},
+                status_code=status_code,
+                ip_address=f"10.0.{rng.randint(0, 3)}.{rng.randint(2, 254)}",
+                timestamp=EPOCH - timedelta(seconds=rng.randint(0, 2 * 365 * 24 * 3600)),
+            ))
+            targets.append((object_type, object_id))
+
+        # SQLite and PostgreSQL hand back the new ids from bulk_create
+        AuditLog.objects.bulk_create(logs, batch_size=BATCH_SIZE)
+        AuditLogTarget.objects.bulk_create(
+            (AuditLogTarget(log=log, object_type=object_type, object_id=object_id)
+             for log, (object_type, object_id) in zip(logs, targets)),
+            batch_size=BATCH_SIZE,
+        )
+
+    def location(self, building, slot):
+        # Building, floor (200 niches each) and niche number, e.g. B2-F1-037
+        return f"B{building + 1}-F{slot // NICHES_PER_FLOOR + 1}-{slot % NICHES_PER_FLOOR + 1:03d}"
+
+    def person(self, rng):
+        return f"{rng.choice(FIRST_NAMES)} {rng.choice(FAMILY_NAMES)}"
+
+    def phone(self, rng):
+        return f"09{rng.randint(100000000, 999999999)}"
+
+    def address(self, rng):
+        return f"{rng.randint(1, 999)} {rng.choice(STREETS)}"
+
+    def past_date(self, rng, days):
+        return (EPOCH - timedelta(days=rng.randint(0, days))).date()
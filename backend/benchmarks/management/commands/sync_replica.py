@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from backend.replicas import sync_sqlite_replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database to the read replica's file (DB_REPLICA) with SQLite's backup "
+        "API, once or every --interval seconds. A stand-in for replication when trying the replica routing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, nargs="?", const=settings.REPLICA_SYNC_INTERVAL,
+                            help="Keep syncing every N seconds (default REPLICA_SYNC_INTERVAL) until interrupted.")
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            started = time.perf_counter()
+            try:
+                sync_sqlite_replica()
+            except ImproperlyConfigured as e:
+                raise CommandError(e)
+            finally:
+                # Do not hold a read snapshot of the primary between copies
+                connection.close()
+            self.stdout.write(f"Replica synced in {(time.perf_counter() - started) * 1000:.1f} ms.")
+            if not interval:
+                return
+            time.sleep(interval)
@@ -0,0 +1,337 @@
+"""
+Requests sent by `manage.py benchmark_endpoints`, one scenario per URL name
+in backend/urls.py.
+
+A scenario takes the run's Context and returns the Call to time. Scenarios
+that delete, and those whose target must be in a known state, first create
+the row they act on through the ORM, so no iteration depends on an earlier
+one; that set-up runs before the timer starts. Requests are sent as a user with
+every permission, so each endpoint does its full work.
+"""
+import csv
+import io
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from contacts.models import Contact
+from customers.models import Customer
+from niches.models import Niche
+from occupants.models import Occupant
+from payments.models import Payment, PaymentDetail
+from user_sessions.models import Session
+from users.models import User
+
+IMPORT_ROWS = 50
+
+# `headers` replace the default Authorization header; `upload` is a CSV sent as the "file" field
+Call = namedtuple("Call", ["method", "path", "data", "headers", "upload"], defaults=[None, None, None])
+
+SCENARIOS = {}
+
+
+class Context:
+    def __init__(self, rng, ids, admin, token):
+        self.rng = rng
+        self.ids = ids
+        self.admin = admin
+        self.token = token
+        self.counter = 0
+
+    def pick(self, kind):
+        return self.rng.choice(self.ids[kind])
+
+    def unique(self, prefix):
+        self.counter += 1
+        return f"{prefix}-{self.counter}"
+
+
+def scenario(name):
+    def register(build):
+        SCENARIOS[name] = build
+        return build
+    return register
+
+
+def csv_upload(header, rows):
+    content = io.StringIO()
+    writer = csv.writer(content)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return SimpleUploadedFile("benchmark.csv", content.getvalue().encode(), content_type="text/csv")
+
+
+def new_niche(ctx, max_occupants=2):
+    return Niche.objects.create(amount=50000, location=ctx.unique("BENCH"), max_occupants=max_occupants)
+
+
+def new_payment(ctx, amount_due="100000.00"):
+    return Payment.objects.create(payer=ctx.unique("Benchmark payer"), amount_due=Decimal(amount_due))
+
+
+# Users and sessions
+
+@scenario("login_api")
+def login(ctx):
+    user = User.objects.create(username=ctx.unique("login"), password="benchmark", role=ctx.admin.role)
+    return Call("POST", "/api/users/login-api/", {"username": user.username, "password": "benchmark"})
+
+
+@scenario("logout_api")
+def logout(ctx):
+    token = Session.create_session(User.objects.create(username=ctx.unique("logout"), role=ctx.admin.role)).session_token
+    return Call("DELETE", "/api/users/logout-api/", headers={"HTTP_AUTHORIZATION": f"Session {token}"})
+
+
+@scenario("create_user")
+def create_user(ctx):
+    return Call("POST", "/api/users/create-new/", {"username": ctx.unique("user"), "password": "benchmark", "role": "staff"})
+
+
+@scenario("list_users")
+def list_users(ctx):
+    return Call("GET", "/api/users/list-all/")
+
+
+@scenario("edit_user")
+def edit_user(ctx):
+    user = User.objects.create(username=ctx.unique("edit"), password="benchmark", role=ctx.admin.role)
+    return Call("PUT", "/api/users/edit/", {"id": user.pk, "role": "viewer"})
+
+
+@scenario("delete_user")
+def delete_user(ctx):
+    user = User.objects.create(username=ctx.unique("delete"), password="benchmark")
+    return Call("DELETE", "/api/users/delete/", {"element_ids": [user.pk]})
+
+
+@scenario("verify_token")
+def verify_token(ctx):
+    return Call("GET", "/api/verify-token/", headers={"HTTP_SESSION_TOKEN": ctx.token})
+
+
+# Niches and occupants
+
+@scenario("list_niches")
+def list_niches(ctx):
+    return Call("GET", "/api/niches/list-all/")
+
+
+@scenario("create_niche")
+def create_niche(ctx):
+    return Call("POST", "/api/niches/create-new/", {"amount": 50000, "location": ctx.unique("BENCH"), "type": "Granite"})
+
+
+@scenario("edit_niche")
+def edit_niche(ctx):
+    return Call("PUT", f"/api/niches/edit/?niche_id={ctx.pick('niches')}", {"amount": ctx.rng.choice([35000, 50000])})
+
+
+@scenario("delete_niche")
+def delete_niche(ctx):
+    return Call("DELETE", "/api/niches/delete/", {"element_ids": [new_niche(ctx).pk]})
+
+
+@scenario("import_niches")
+def import_niches(ctx):
+    rows = [(50000, ctx.unique("IMPORT"), 2, "Glass") for _ in range(IMPORT_ROWS)]
+    return Call("POST", "/api/niches/import/", upload=csv_upload(["amount", "location", "max_occupants", "type"], rows))
+
+
+@scenario("list_occupants")
+def list_occupants(ctx):
+    return Call("GET", "/api/occupants/list-all/")
+
+
+@scenario("create_occupant")
+def create_occupant(ctx):
+    return Call("POST", "/api/occupants/create-new/",
+                {"niche_id": new_niche(ctx).pk, "name": ctx.unique("Occupant"), "interment_date": "2024-05-01"})
+
+
+@scenario("edit_occupant")
+def edit_occupant(ctx):
+    return Call("PUT", "/api/occupants/edit/", {"element_id": ctx.pick("occupants"), "name": ctx.unique("Occupant")})
+
+
+@scenario("delete_occupant")
+def delete_occupant(ctx):
+    occupant = Occupant.objects.create(name=ctx.unique("Occupant"), niche=new_niche(ctx), interment_date=date(2024, 5, 1))
+    return Call("DELETE", "/api/occupants/delete/", {"element_ids": [occupant.pk]})
+
+
+@scenario("import_occupants")
+def import_occupants(ctx):
+    niche = new_niche(ctx, max_occupants=IMPORT_ROWS)
+    rows = [(ctx.unique("Occupant"), niche.pk, "2024-05-01") for _ in range(IMPORT_ROWS)]
+    return Call("POST", "/api/occupants/import/", upload=csv_upload(["name", "niche_id", "interment_date"], rows))
+
+
+@scenario("export_occupants")
+def export_occupants(ctx):
+    return Call("GET", "/api/occupants/export/")
+
+
+# Customers and contacts
+
+@scenario("customer-list")
+def customer_list(ctx):
+    return Call("GET", "/api/customers/list-all/")
+
+
+@scenario("customer-list-names")
+def customer_list_names(ctx):
+    return Call("GET", "/api/customers/list-names/")
+
+
+@scenario("create-customer")
+def create_customer(ctx):
+    return Call("POST", "/api/customers/create-new/", {"name": ctx.unique("Customer"), "contact_number": "09171234567"})
+
+
+@scenario("update-customer")
+def update_customer(ctx):
+    return Call("PUT", f"/api/customers/edit/?customer_id={ctx.pick('customers')}", {"address": ctx.unique("Street")})
+
+
+@scenario("delete-customers")
+def delete_customers(ctx):
+    customer = Customer.objects.create(name=ctx.unique("Customer"))
+    return Call("DELETE", "/api/customers/delete/", {"element_ids": [customer.pk]})
+
+
+@scenario("import-customers")
+def import_customers(ctx):
+    rows = [(ctx.unique("Customer"), "09171234567") for _ in range(IMPORT_ROWS)]
+    return Call("POST", "/api/customers/import/", upload=csv_upload(["name", "contact_number"], rows))
+
+
+@scenario("export-customers")
+def export_customers(ctx):
+    return Call("GET", "/api/customers/export/")
+
+
+@scenario("list_contacts")
+def list_contacts(ctx):
+    return Call("GET", "/api/contacts/list-all/")
+
+
+@scenario("create_contact")
+def create_contact(ctx):
+    return Call("POST", "/api/contacts/create-new/", {
+        "family_name": ctx.unique("Family"), "deceased_name": "Benchmark", "deceased_date": "2020-01-01",
+        "contact_number": "09171234567",
+    })
+
+
+@scenario("edit_contact")
+def edit_contact(ctx):
+    return Call("PUT", f"/api/contacts/edit/?contact_id={ctx.pick('contacts')}", {"address": ctx.unique("Street")})
+
+
+@scenario("delete_contact")
+def delete_contact(ctx):
+    contact = Contact.objects.create(family_name=ctx.unique("Family"), deceased_name="Benchmark",
+                                     contact_number="09171234567")
+    return Call("DELETE", "/api/contacts/delete/", {"element_ids": [contact.pk]})
+
+
+# Payments
+
+@scenario("list_payments")
+def list_payments(ctx):
+    return Call("GET", "/api/payments/list-all/")
+
+
+@scenario("create_payment")
+def create_payment(ctx):
+    return Call("POST", "/api/payments/create-new/",
+                {"payer": ctx.unique("Payer"), "amount_due": "50000.00", "maintenance_fee": "500.00"})
+
+
+@scenario("edit_payment")
+def edit_payment(ctx):
+    return Call("PUT", f"/api/payments/edit/?payment_id={ctx.pick('payments')}",
+                {"maintenance_fee": ctx.rng.choice(["500.00", "1000.00"])})
+
+
+@scenario("delete_payment")
+def delete_payment(ctx):
+    return Call("DELETE", "/api/payments/delete/", {"element_ids": [new_payment(ctx).pk]})
+
+
+@scenario("import_payments")
+def import_payments(ctx):
+    rows = [(ctx.unique("Payer"), "50000.00", "500.00") for _ in range(IMPORT_ROWS)]
+    return Call("POST", "/api/payments/import/", upload=csv_upload(["payer", "amount_due", "maintenance_fee"], rows))
+
+
+@scenario("export_payments")
+def export_payments(ctx):
+    return Call("GET", "/api/payments/export/")
+
+
+@scenario("export_payment_ledger")
+def export_payment_ledger(ctx):
+    return Call("GET", "/api/payments/details/export/")
+
+
+@scenario("get_payment_details")
+def get_payment_details(ctx):
+    return Call("GET", f"/api/payments/{ctx.pick('payments')}/details/")
+
+
+@scenario("add_payment_detail")
+def add_payment_detail(ctx):
+    return Call("POST", f"/api/payments/{new_payment(ctx).pk}/add-payment/", {"amount": "1000.00"})
+
+
+@scenario("edit_payment_detail")
+def edit_payment_detail(ctx):
+    detail, _ = PaymentDetail.post(new_payment(ctx).pk, Decimal("1000.00"))
+    return Call("PUT", f"/api/payments/detail/{detail.pk}/edit/", {"amount": "1500.00"})
+
+
+@scenario("delete_payment_detail")
+def delete_payment_detail(ctx):
+    detail, _ = PaymentDetail.post(new_payment(ctx).pk, Decimal("1000.00"))
+    return Call("DELETE", f"/api/payments/detail/{detail.pk}/delete/")
+
+
+# Audit and analytics
+
+@scenario("list_audit_logs")
+def list_audit_logs(ctx):
+    return Call("GET", "/api/audit/list-all/?limit=100")
+
+
+@scenario("audit_entity_history")
+def audit_entity_history(ctx):
+    return Call("GET", f"/api/audit/history/payment/{ctx.pick('payments')}/")
+
+
+@scenario("list_audit_archives")
+def list_audit_archives(ctx):
+    return Call("GET", "/api/audit/archives/")
+
+
+@scenario("search_archived_audit_logs")
+def search_archived_audit_logs(ctx):
+    return Call("GET", "/api/audit/archives/logs/?from=2024-01-01&to=2024-12-31")
+
+
+@scenario("get_analytics_data")
+def get_analytics_data(ctx):
+    return Call("GET", "/api/analytics/data/")
+
+
+@scenario("get_earnings_series")
+def get_earnings_series(ctx):
+    return Call("GET", "/api/analytics/earnings/?interval=month&from=2023-01-01&to=2024-12-31")
+
+
+@scenario("get_cache_stats")
+def get_cache_stats(ctx):
+    return Call("GET", "/api/analytics/cache-stats/")
@@ -3,149 +3,144 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from django.views.decorators.csrf import csrf_exempt, requires_csrf_token, ensure_csrf_cookie
+from django.views.decorators.http import require_GET
 
 # Create your views here.
 from .models import Contact
-from users.models import User
-from user_sessions.models import Session
+from user_sessions.utils import aget_auth_context, get_auth_context
+from backend.listing import alist_response, list_response
+from backend.bulk import bulk_delete_response
+from backend.writes import coordinated_write
+from backend.replicas import replica_reads
+from backend.async_views import json_response
 from .serializers import ContactSerializer
-from django.utils import timezone
+
+CONTACT_FILTERS = {'deceased_from': 'deceased_date__gte', 'deceased_to': 'deceased_date__lte'}
+CONTACT_ORDERINGS = {'family_name': 'family_name', 'deceased_date': 'deceased_date'}
 
 @api_view(['GET'])
 @ensure_csrf_cookie
+@replica_reads
 def list_contacts(request):
     if request.method == 'GET':
-        SESSION_TOKEN = request.headers.get("Session-Token")
+        auth = get_auth_context(request)
 
-        if not SESSION_TOKEN:
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
-        try:
-            user_session = Session.objects.get(session_token=SESSION_TOKEN)
+        if not auth.session:
+            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
 
-            session_expiry = user_session.expiry
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # If session is valid, check user for permissions
+        user = auth.user
+        if user.has_permission("view_records") and user.has_permission("view_dashboard"):
+            contacts = Contact.objects.all()
 
-            if timezone.now() > session_expiry:
-                return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            # If session is valid, check user for permissions
-            user = user_session.user
-            if user.has_permission("view_records") and user.has_permission("view_dashboard"):
-                contacts = Contact.objects.all().order_by('-deceased_date')
+            return list_response(request, contacts, ContactSerializer, filters=CONTACT_FILTERS,
+                                 orderings=CONTACT_ORDERINGS, default_ordering='-deceased_date')
 
-                serializer = ContactSerializer(contacts, many=True)
-                
-                return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response({"error": "You do not have permission to view these records."}, status=status.HTTP_403_FORBIDDEN)
 
-            return Response({"error": "You do not have permission to view these records."}, status=status.HTTP_403_FORBIDDEN)
-        except Session.DoesNotExist:
-            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
+@require_GET
+@ensure_csrf_cookie
+@replica_reads
+async def alist_contacts(request):
+    """list_contacts for the ASGI deployment (see backend/async_views.py)"""
+    auth = await aget_auth_context(request)
+    if not auth.token:
+        return json_response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.session:
+        return json_response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
+    if auth.is_expired:
+        return json_response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_records", "view_dashboard"):
+        return json_response({"error": "You do not have permission to view these records."}, status=status.HTTP_403_FORBIDDEN)
+
+    return await alist_response(request, Contact.objects.all(), ContactSerializer, filters=CONTACT_FILTERS,
+                                orderings=CONTACT_ORDERINGS, default_ordering='-deceased_date')
 
 @api_view(['POST'])
 @requires_csrf_token
+@coordinated_write('contacts.create_contact')
 def create_contact(request):
     if request.method == 'POST':
-        SESSION_TOKEN = request.headers.get("Session-Token")
+        auth = get_auth_context(request)
 
-        if not SESSION_TOKEN:
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
-        try:
-            user_session = Session.objects.get(session_token=SESSION_TOKEN)
-
-            session_expiry = user_session.expiry
-
-            if timezone.now() > session_expiry:
-                return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            # If session is valid, check user for permissions
-            user = user_session.user
-            if user.has_permission("add_record") and user.has_permission("view_dashboard"):
-                serializer = ContactSerializer(data=request.data)
-                if serializer.is_valid():
-                    serializer.save()
-                    return Response({"ids": [serializer.data["id"]]}, status=status.HTTP_201_CREATED)
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-            return Response({"error": "You do not have permission to add records."}, status=status.HTTP_403_FORBIDDEN)
-        except Session.DoesNotExist:
+        if not auth.session:
             return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # If session is valid, check user for permissions
+        user = auth.user
+        if user.has_permission("add_record") and user.has_permission("view_dashboard"):
+            serializer = ContactSerializer(data=request.data)
+            if serializer.is_valid():
+                serializer.save()
+                return Response({"ids": [serializer.data["id"]]}, status=status.HTTP_201_CREATED)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"error": "You do not have permission to add records."}, status=status.HTTP_403_FORBIDDEN)
 
 @api_view(['PUT'])
 @requires_csrf_token
+@coordinated_write('contacts.edit_contact')
 def edit_contact(request):
     if request.method == 'PUT':
-        SESSION_TOKEN = request.headers.get("Session-Token")
+        auth = get_auth_context(request)
         contact_id = request.GET.get("contact_id")
 
-        if not SESSION_TOKEN:
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
-        try:
-            user_session = Session.objects.get(session_token=SESSION_TOKEN)
-
-            session_expiry = user_session.expiry
-
-            if timezone.now() > session_expiry:
-                return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            # If session is valid, check user for permissions
-            user = user_session.user
-            if user.has_permission("edit_record") and user.has_permission("view_dashboard"):
-                try:
-                    contact = Contact.objects.get(id=contact_id)
-                except Contact.DoesNotExist:
-                    return Response({"error": "Contact not found."}, status=status.HTTP_404_NOT_FOUND)
-
-                serializer = ContactSerializer(contact, data=request.data, partial=True)
-                if serializer.is_valid():
-                    serializer.save()
-                    return Response({"ids": [serializer.data.id]}, status=status.HTTP_200_OK)
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-            return Response({"error": "You do not have permission to edit records."}, status=status.HTTP_403_FORBIDDEN)
-        except Session.DoesNotExist:
+        if not auth.session:
             return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # If session is valid, check user for permissions
+        user = auth.user
+        if user.has_permission("edit_record") and user.has_permission("view_dashboard"):
+            try:
+                contact = Contact.objects.get(id=contact_id)
+            except Contact.DoesNotExist:
+                return Response({"error": "Contact not found."}, status=status.HTTP_404_NOT_FOUND)
+
+            serializer = ContactSerializer(contact, data=request.data, partial=True)
+            if serializer.is_valid():
+                serializer.save()
+                return Response({"ids": [serializer.data.id]}, status=status.HTTP_200_OK)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"error": "You do not have permission to edit records."}, status=status.HTTP_403_FORBIDDEN)
 
 @api_view(['DELETE'])
 @requires_csrf_token
+@coordinated_write('contacts.delete_contact')
 def delete_contact(request):
     if request.method == 'DELETE':
-        contacts = request.data.get("element_ids")
-        SESSION_TOKEN = request.headers.get("Session-Token")
+        auth = get_auth_context(request)
 
-        if not SESSION_TOKEN:
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
-        try:
-            user_session = Session.objects.get(session_token=SESSION_TOKEN)
-
-            session_expiry = user_session.expiry
-
-            if timezone.now() > session_expiry:
-                return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            # If session is valid, check user for permissions
-            user = user_session.user
-            if user.has_permission("delete_record") and user.has_permission("view_dashboard"):
-
-                for id in contacts:
-                    try:
-                        contact = Contact.objects.get(id=id)
-                        contact.delete()
-                    except Contact.DoesNotExist:
-                        return Response({"error": f"Contact record with id {id} not found."}, status=status.HTTP_404_NOT_FOUND)
+        if not auth.session:
+            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
 
-                return Response({"ids": contacts}, status=status.HTTP_200_OK)
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # If session is valid, check user for permissions
+        user = auth.user
+        if user.has_permission("delete_record") and user.has_permission("view_dashboard"):
+            return bulk_delete_response(request, Contact.objects.all(), "Contact record with id {id} not found.")
 
-            return Response({"error": "You do not have permission to delete records."}, status=status.HTTP_403_FORBIDDEN)
-        except Session.DoesNotExist:
-            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({"error": "You do not have permission to delete records."}, status=status.HTTP_403_FORBIDDEN)
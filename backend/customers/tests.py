@@ -1,3 +1,129 @@
-from django.test import TestCase
+import csv
+import io
+from datetime import date
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from analytics.models import DashboardSnapshot
+from backend.testing import SignedInMixin
+
+from .models import Customer
+
+VALID = "name,contact_number,email\nAna Santos,09170000001,ana@example.com\nJose Cruz,09170000002,\n"
+ONE_INVALID = VALID + "Luis Reyes,09170000003,not-an-email\n"
+
+
+@override_settings(AUDIT_ASYNC=False)
+class ImportCustomersTests(SignedInMixin, TestCase):
+    permissions = ("view_dashboard", "add_record")
+
+    def setUp(self):
+        super().setUp()
+        DashboardSnapshot.recompute()
+
+    def upload(self, content, query=""):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                f"/api/customers/import/{query}",
+                {"file": SimpleUploadedFile("customers.csv", content.encode(), content_type="text/csv")},
+                headers=self.auth,
+            )
+
+    def test_import_creates_rows(self):
+        response = self.upload(VALID)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 2)
+        self.assertEqual(set(Customer.objects.values_list("name", flat=True)), {"Ana Santos", "Jose Cruz"})
+        self.assertEqual(DashboardSnapshot.objects.get().total_customers, 2)
+
+    def test_dry_run_reports_and_keeps_nothing(self):
+        response = self.upload(VALID, "?dry_run=1")
+
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report["total_rows"], report["created"], report["dry_run"]), (2, 2, True))
+        self.assertFalse(Customer.objects.exists())
+        # The snapshot deltas queued by the inserts were rolled back with them
+        self.assertEqual(DashboardSnapshot.objects.get().total_customers, 0)
+
+    def test_invalid_row_rolls_back_the_whole_file(self):
+        response = self.upload(ONE_INVALID)
+
+        self.assertEqual(response.status_code, 400)
+        report = response.json()
+        self.assertEqual((report["created"], report["error_count"]), (0, 1))
+        self.assertEqual(report["errors"][0]["row"], 4)
+        self.assertFalse(Customer.objects.exists())
+        self.assertEqual(DashboardSnapshot.objects.get().total_customers, 0)
+
+    def test_skip_invalid_keeps_the_valid_rows(self):
+        response = self.upload(ONE_INVALID, "?skip_invalid=1")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 2)
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_unreadable_file_is_rejected(self):
+        response = self.client.post(
+            "/api/customers/import/",
+            {"file": SimpleUploadedFile("customers.txt", b"name\nAna\n")},
+            headers=self.auth,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Customer.objects.exists())
+
+
+class CustomerListPagingTests(SignedInMixin, TestCase):
+    permissions = ("view_dashboard",)
+
+    def setUp(self):
+        super().setUp()
+        caches["responses"].clear()
+        dates = [None, date(2023, 5, 1), None, date(2023, 5, 1), None, date(2021, 1, 9), None]
+        self.customers = [Customer.objects.create(name=f"C{index}", deceased_date=day) for index, day in enumerate(dates)]
+
+    def paginate(self, ordering):
+        ids, cursor = [], None
+        while True:
+            params = {"ordering": ordering, "limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = self.client.get("/api/customers/list-all/", params, headers=self.auth)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids += [row["id"] for row in response.json()["results"]]
+            cursor = response.json()["next_cursor"]
+            if not cursor:
+                return ids
+
+    def test_pages_across_null_sort_keys(self):
+        nulls = [c.pk for c in self.customers if c.deceased_date is None]
+        dated = [c.pk for c in sorted((c for c in self.customers if c.deceased_date), key=lambda c: (c.deceased_date, c.pk))]
+
+        # NULLs come first ascending and last descending, so both directions are exact reverses
+        self.assertEqual(self.paginate("deceased_date"), nulls + dated)
+        self.assertEqual(self.paginate("-deceased_date"), list(reversed(nulls + dated)))
+
+
+class ExportCustomersTests(SignedInMixin, TestCase):
+    permissions = ("view_dashboard",)
+
+    def export(self):
+        response = self.client.get("/api/customers/export/", headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        return list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+    def test_phone_numbers_and_amounts_are_exported_unchanged(self):
+        Customer.objects.create(name="Ana", contact_number="+63 917 000 0001", address="-12.50")
+
+        [row] = self.export()
+
+        self.assertEqual((row["contact_number"], row["address"]), ("+63 917 000 0001", "-12.50"))
+
+    def test_formulas_are_not_left_for_spreadsheets_to_evaluate(self):
+        for value in ('=HYPERLINK("http://example.com")', "+SUM(A1:A9)", "-2+3", "@cmd"):
+            Customer.objects.create(name=value)
+
+        names = [row["name"] for row in self.export()]
+
+        self.assertEqual(names, ['\'=HYPERLINK("http://example.com")', "'+SUM(A1:A9)", "'-2+3", "'@cmd"])
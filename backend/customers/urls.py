@@ -1,10 +1,13 @@
 from django.urls import path
+from backend.async_views import read_view
 from .views import *
 
 urlpatterns = [
-    path("list-all/", customer_list, name="customer-list"),
+    path("list-all/", read_view(customer_list, acustomer_list), name="customer-list"),
     path("create-new/", create_customer, name="create-customer"),
     path("edit/", update_customer, name="update-customer"),
     path("delete/", delete_customers, name="delete-customers"),
-    path("list-names/", customer_list_names, name="customer-list-names"), 
+    path("import/", import_customers, name="import-customers"),
+    path("export/", export_customers, name="export-customers"),
+    path("list-names/", read_view(customer_list_names, acustomer_list_names), name="customer-list-names"), 
 ]
\ No newline at end of file
@@ -3,71 +3,132 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from django.views.decorators.csrf import csrf_exempt, requires_csrf_token, ensure_csrf_cookie
+from django.utils import timezone
+from django.views.decorators.http import require_GET
 
 from .serializers import CustomerSerializer, CustomerSerializerNames
 
-from user_sessions.utils import verify_session, get_user_from_session
+from user_sessions.utils import aget_auth_context, get_auth_context
+from backend.listing import alist_response, csv_response, list_response
+from backend.bulk import Importer, bulk_delete_response, import_response
+from backend.conditional import aconditional_response, conditional_response
+from backend.response_cache import acached_response, cached_response
+from backend.writes import coordinated_write
+from backend.replicas import replica_reads
+from backend.async_views import json_response
+
+CUSTOMER_FILTERS = {'name': 'name__istartswith'}
+CUSTOMER_ORDERINGS = {'name': 'name', 'deceased_date': 'deceased_date'}
+CUSTOMER_IMPORTER = Importer(CustomerSerializer)
+CUSTOMER_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('name', 'name'),
+    ('contact_number', 'contact_number'),
+    ('email', 'email'),
+    ('address', 'address'),
+    ('deceased_name', 'deceased_name'),
+    ('deceased_date', 'deceased_date'),
+    ('relationship_to_deceased', 'relationship_to_deceased'),
+    ('memorandum_of_agreement', 'memorandum_of_agreement'),
+]
 
 # Create your views here.
 @api_view(['GET'])
 @ensure_csrf_cookie
+@replica_reads
 def customer_list(request):
-    authorization_header = request.headers.get("Authorization")
+    auth = get_auth_context(request)
 
-    if not authorization_header:
+    if not auth.token:
         return Response({"error":"Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    is_session_valid = verify_session(authorization_header)
+    is_session_valid = auth.is_valid
 
     if not is_session_valid:
         return Response({"error":"Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    user = get_user_from_session(authorization_header)
+    user = auth.user
 
     if not user.has_permission("view_dashboard"):
         return Response({"error":"You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
     
     customers = Customer.objects.all()
-    serializer = CustomerSerializer(customers, many=True)
 
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return cached_response(request, 'customers.list', ['customers'], lambda: list_response(
+        request, customers, CustomerSerializer, filters=CUSTOMER_FILTERS, orderings=CUSTOMER_ORDERINGS))
+
+@require_GET
+@ensure_csrf_cookie
+@replica_reads
+async def acustomer_list(request):
+    """customer_list for the ASGI deployment (see backend/async_views.py)"""
+    auth = await aget_auth_context(request)
+    if not auth.token:
+        return json_response({"error":"Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.is_valid:
+        return json_response({"error":"Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_dashboard"):
+        return json_response({"error":"You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
+
+    return await acached_response(request, 'customers.list', ['customers'], lambda: alist_response(
+        request, Customer.objects.all(), CustomerSerializer, filters=CUSTOMER_FILTERS, orderings=CUSTOMER_ORDERINGS))
 
 @api_view(['GET'])
+@replica_reads
 def customer_list_names(request):
-    authorization_header = request.headers.get("Authorization")
+    auth = get_auth_context(request)
 
-    if not authorization_header:
+    if not auth.token:
         return Response({"error":"Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    is_session_valid = verify_session(authorization_header)
+    is_session_valid = auth.is_valid
 
     if not is_session_valid:
         return Response({"error":"Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    user = get_user_from_session(authorization_header)
+    user = auth.user
 
     if not user.has_permission("view_dashboard"):
         return Response({"error":"You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
     
     customers = Customer.objects.all()
-    serializer = CustomerSerializerNames(customers, many=True)
 
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return conditional_response(request, ['customers'], lambda: Response(
+        CustomerSerializerNames(customers, many=True).data, status=status.HTTP_200_OK))
+
+@require_GET
+@replica_reads
+async def acustomer_list_names(request):
+    """customer_list_names for the ASGI deployment (see backend/async_views.py)"""
+    auth = await aget_auth_context(request)
+    if not auth.token:
+        return json_response({"error":"Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.is_valid:
+        return json_response({"error":"Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_dashboard"):
+        return json_response({"error":"You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
+
+    async def respond():
+        customers = [customer async for customer in Customer.objects.all()]
+        return json_response(CustomerSerializerNames(customers, many=True).data)
+
+    return await aconditional_response(request, ['customers'], respond)
 
 @api_view(['POST'])
 @requires_csrf_token
+@coordinated_write('customers.create_customer')
 def create_customer(request):
-    authorization_header = request.headers.get("Authorization")
+    auth = get_auth_context(request)
 
-    if not authorization_header:
+    if not auth.token:
         return Response({"error":"Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    is_session_valid = verify_session(authorization_header)
+    is_session_valid = auth.is_valid
 
     if not is_session_valid:
         return Response({"error":"Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    user = get_user_from_session(authorization_header)
+    user = auth.user
 
     if not user.has_permission("add_record") or not user.has_permission("view_dashboard"):
         return Response({"error":"You do not have permission to perform this action."}, status=status.HTTP_403_FORBIDDEN)
@@ -81,17 +142,18 @@ def create_customer(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['PUT'])
+@coordinated_write('customers.update_customer')
 def update_customer(request):
-    authorization_header = request.headers.get("Authorization")
-    if not authorization_header:
+    auth = get_auth_context(request)
+    if not auth.token:
         return Response({"error":"Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    is_session_valid = verify_session(authorization_header)
+    is_session_valid = auth.is_valid
 
     if not is_session_valid:
         return Response({"error":"Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    user = get_user_from_session(authorization_header)
+    user = auth.user
 
     if not user.has_permission("edit_record") or not user.has_permission("view_dashboard"):
         return Response({"error":"You do not have permission to perform this action."}, status=status.HTTP_403_FORBIDDEN)
@@ -116,36 +178,61 @@ def update_customer(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['DELETE'])
+@coordinated_write('customers.delete_customers')
 def delete_customers(request):
-    authorization_header = request.headers.get("Authorization")
+    auth = get_auth_context(request)
 
-    if not authorization_header:
+    if not auth.token:
         return Response({"error":"Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
 
-    is_session_valid = verify_session(authorization_header)
+    is_session_valid = auth.is_valid
 
     if not is_session_valid:
         return Response({"error":"Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
 
-    user = get_user_from_session(authorization_header)
+    user = auth.user
 
     if not user.has_permission("delete_record") or not user.has_permission("view_dashboard"):
         return Response({"error":"You do not have permission to perform this action."}, status=status.HTTP_403_FORBIDDEN)
 
-    customer_id = request.data.get("element_ids")
-
-    if not customer_id:
+    if not request.data.get("element_ids"):
         return Response({"error":"Customer ID is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-    deleted_ids = []
+    return bulk_delete_response(request, Customer.objects.all(), "Customer with ID {id} not found.",
+                                success_status=status.HTTP_204_NO_CONTENT)
+
+@api_view(['POST'])
+@requires_csrf_token
+def import_customers(request):
+    auth = get_auth_context(request)
+
+    if not auth.token:
+        return Response({"error":"Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    if not auth.is_valid:
+        return Response({"error":"Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    user = auth.user
 
-    for cid in customer_id:
-        try:
-            customer = Customer.objects.get(id=cid)
-        except Customer.DoesNotExist:
-            return Response({"error":f"Customer with ID {cid} not found."}, status=status.HTTP_404_NOT_FOUND)
-        
-        customer.delete()
-        deleted_ids.append(cid)
+    if not user.has_permission("add_record") or not user.has_permission("view_dashboard"):
+        return Response({"error":"You do not have permission to perform this action."}, status=status.HTTP_403_FORBIDDEN)
+
+    return import_response(request, CUSTOMER_IMPORTER, 'customers.import_customers')
+
+@api_view(['GET'])
+@replica_reads
+def export_customers(request):
+    auth = get_auth_context(request)
+
+    if not auth.token:
+        return Response({"error":"Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    if not auth.is_valid:
+        return Response({"error":"Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    if not auth.has_permission("view_dashboard"):
+        return Response({"error":"You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
 
-    return Response({"ids": deleted_ids}, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+    filename = f"customers-{timezone.localdate():%Y-%m-%d}.csv"
+    return csv_response(request, Customer.objects.all(), CUSTOMER_EXPORT_COLUMNS, filename,
+                        filters=CUSTOMER_FILTERS, orderings=CUSTOMER_ORDERINGS)
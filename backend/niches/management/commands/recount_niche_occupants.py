@@ -0,0 +1,55 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from analytics.models import ResourceVersion
+from backend.writes import WriteContention, run_write
+from niches.models import Niche, derive_status, niche_status_changed
+
+
+class Command(BaseCommand):
+    help = "Compare stored niche occupant counts with the occupants table and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report drifted niches without updating them.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Niches fixed per UPDATE statement.")
+
+    def handle(self, *args, **options):
+        niches = Niche.objects.annotate(actual_count=Count("occupants")).order_by()
+
+        drifted = [
+            niche.pk
+            for niche in niches.iterator(chunk_size=options["batch_size"])
+            if niche.occupant_count != niche.actual_count
+            or niche.status != derive_status(niche.actual_count, niche.max_occupants)
+        ]
+
+        self.stdout.write(f"{len(drifted)} niche(s) with drifted occupant counts.")
+        if options["dry_run"] or not drifted:
+            return
+
+        batch_size = options["batch_size"]
+        updated = 0
+        try:
+            for start in range(0, len(drifted), batch_size):
+                batch = drifted[start:start + batch_size]
+                updated += run_write("niches.recount_niche_occupants", lambda: self.recount(batch))
+        except WriteContention as e:
+            raise CommandError(f"{e} Recounted {updated} niche(s) before giving up.")
+
+        self.stdout.write(self.style.SUCCESS(f"Recounted {updated} niche(s)."))
+
+    def recount(self, pks):
+        niches = Niche.objects.filter(pk__in=pks)
+        before = dict(niches.values_list("pk", "status"))
+        updated = niches.recount_occupants()
+
+        # The UPDATE sends no signals; report the status changes so the dashboard counters follow
+        transitions = Counter(
+            (before[pk], status) for pk, status in niches.values_list("pk", "status") if before.get(pk, status) != status
+        )
+        for (previous_status, status), count in transitions.items():
+            niche_status_changed.send(sender=Niche, previous_status=previous_status, status=status, count=count)
+        ResourceVersion.bump("niches", "occupants")
+        return updated
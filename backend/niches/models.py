@@ -1,29 +1,144 @@
+from collections import Counter, defaultdict
+
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual, LessThanOrEqual
+from django.dispatch import Signal
+
+from backend.batching import after_commit, defer
+
+# Sent with previous_status, status and count when that many niches move from one status to another
+niche_status_changed = Signal()
+
+def derive_status(occupant_count, max_occupants):
+    if occupant_count <= 0:
+        return 'Available'
+    elif occupant_count >= max_occupants:
+        return 'Full'
+    return 'Occupied'
+
+
+def _status_expression(occupant_count):
+    """Database-side equivalent of derive_status for an occupant count expression"""
+    return Case(
+        When(LessThanOrEqual(occupant_count, Value(0)), then=Value('Available')),
+        When(GreaterThanOrEqual(occupant_count, F('max_occupants')), then=Value('Full')),
+        default=Value('Occupied'),
+    )
+
+
+def schedule_status_refresh(*niche_ids):
+    """Re-derive the status of these niches once, when the current transaction commits"""
+    after_commit('niche_statuses', refresh_statuses, set(niche_ids))
+
+
+def refresh_statuses(niche_ids):
+    """Bring the status of these niches in line with their occupant counts"""
+    transitions = defaultdict(list)
+    rows = Niche.objects.filter(pk__in=niche_ids).values_list('pk', 'status', 'occupant_count', 'max_occupants')
+    for pk, status, occupant_count, max_occupants in rows:
+        derived = derive_status(occupant_count, max_occupants)
+        if derived != status:
+            transitions[(status, derived)].append(pk)
+
+    for (previous_status, status), pks in transitions.items():
+        # Conditional on the old status so concurrent refreshes report each change once
+        updated = Niche.objects.filter(pk__in=pks, status=previous_status).update(status=status)
+        if updated:
+            niche_status_changed.send(sender=Niche, previous_status=previous_status, status=status, count=updated)
+
+
+class NicheQuerySet(models.QuerySet):
+    def adjust_occupant_count(self, delta):
+        """Add `delta` to occupant_count in one UPDATE"""
+        return self.update(occupant_count=F('occupant_count') + delta)
+
+    def recount_occupants(self):
+        """
+        Recompute occupant_count and status from the occupants table in one
+        UPDATE. Sends no niche_status_changed; callers reconcile the dashboard.
+        """
+        from occupants.models import Occupant
+
+        counted = Occupant.objects.filter(niche=OuterRef('pk')).order_by().values('niche')
+        occupant_count = Coalesce(Subquery(counted.annotate(total=Count('id')).values('total')), Value(0))
+        return self.update(occupant_count=occupant_count, status=_status_expression(occupant_count))
+
 
 # Create your models here.
 class Niche(models.Model):
+    # Written only by F() updates and refresh_statuses(), never by save()
+    DERIVED_FIELDS = ('occupant_count', 'status')
+
     amount = models.PositiveIntegerField()
     location = models.CharField(max_length=255)
     status = models.CharField(max_length=50, default='Available') # available, occupied, maintenance, reserved
     max_occupants = models.PositiveIntegerField(default=2)
     type = models.CharField(max_length=50, default='Granite') # Granite, Glass, etc.
+    # Maintained by the occupant receivers with F() updates, see NicheQuerySet
+    occupant_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = NicheQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['type', 'id']),
+            models.Index(fields=['location', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.amount} - {self.location} ({self.status})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so a delete uncounts the right dashboard bucket
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def update_status(self):
-        """Update status based on occupant count"""
-        occupant_count = self.occupants.count()
-        if occupant_count == 0:
-            self.status = 'Available'
-        elif occupant_count >= self.max_occupants:
-            self.status = 'Full'
-        else:
-            self.status = 'Occupied'
-    
+        """Update status based on the stored occupant count"""
+        self.status = derive_status(self.occupant_count, self.max_occupants)
+
+    @classmethod
+    def adjust_occupancy(cls, niche_id, delta, instance=None):
+        """
+        Apply an occupant count change to a niche and keep `instance` (the
+        caller's copy of that niche, if any) in sync. Inside
+        backend.batching.batched() changes are applied once per niche; the
+        status follows once per niche at commit.
+        """
+        defer(('niche_occupancy', niche_id),
+              lambda change: cls._apply_occupancy(niche_id, change['delta'], instance),
+              Counter(delta=delta))
+
+    @classmethod
+    def _apply_occupancy(cls, niche_id, delta, instance=None):
+        if not delta:
+            return
+        cls.objects.filter(pk=niche_id).adjust_occupant_count(delta)
+        if instance is not None:
+            instance.occupant_count += delta
+            instance.update_status()
+        schedule_status_refresh(niche_id)
+
     def save(self, *args, **kwargs):
         # Don't auto-update status on initial creation (when pk is None)
         # because occupants relationship won't exist yet
+        updating = self.pk is not None and not self._state.adding
         if self.pk is not None:
             self.update_status()
-        super().save(*args, **kwargs)
\ No newline at end of file
+
+            # Derived fields are not written from here, so a save from a stale
+            # instance cannot undo a concurrent occupant change; a changed
+            # max_occupants reaches the status through the refresh below
+            if updating and kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.DERIVED_FIELDS
+                ]
+        super().save(*args, **kwargs)
+        if updating:
+            schedule_status_refresh(self.pk)
@@ -1,3 +1,93 @@
+import json
+from unittest import mock
+
+from django.core.cache import caches
 from django.test import TestCase
 
-# Create your tests here.
+from backend.testing import SignedInMixin
+
+from .models import Niche
+
+
+class ListNichesTests(SignedInMixin, TestCase):
+    permissions = ("view_dashboard", "view_records")
+
+    def setUp(self):
+        super().setUp()
+        caches["responses"].clear()
+        # Repeated amounts, so pages break inside runs of equal sort keys
+        self.niches = self.create(*[(amount, f"B{floor}-F1-{index:03}") for index, (amount, floor)
+                                    in enumerate([(500, 1), (500, 1), (500, 2), (750, 2), (750, 1), (900, 3), (500, 3)])])
+
+    def create(self, *rows):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [Niche.objects.create(amount=amount, location=location) for amount, location in rows]
+
+    def get(self, **params):
+        response = self.client.get("/api/niches/list-all/", params, headers=self.auth)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def page_ids(self, page):
+        return [row["id"] for row in page["results"]]
+
+    def expected_ids(self, ordering):
+        pk = "-pk" if ordering.startswith("-") else "pk"
+        return list(Niche.objects.order_by(ordering, pk).values_list("pk", flat=True))
+
+    def paginate(self, cursor=None, **params):
+        ids = []
+        while True:
+            page = self.get(limit=2, **params, **({"cursor": cursor} if cursor else {}))
+            ids += self.page_ids(page)
+            cursor = page["next_cursor"]
+            if not cursor:
+                return ids
+
+    def test_pages_cover_every_row_once(self):
+        for ordering in ("amount", "-amount", "location", "id"):
+            with self.subTest(ordering=ordering):
+                self.assertEqual(self.paginate(ordering=ordering), self.expected_ids(ordering))
+
+    def test_changes_between_pages_neither_repeat_nor_skip_rows(self):
+        first = self.get(ordering="amount", limit=3)
+        seen = self.page_ids(first)
+        # Rows around the cursor (amount 500, third id) change before the next page is read
+        before, after = self.create((100, "A-1"), (500, "A-2"))
+        upcoming = Niche.objects.filter(amount=750).order_by("pk").first()
+        with self.captureOnCommitCallbacks(execute=True):
+            upcoming.delete()
+
+        rest = self.paginate(ordering="amount", cursor=first["next_cursor"])
+
+        self.assertFalse(set(seen) & set(rest))
+        self.assertNotIn(before.pk, rest)
+        self.assertNotIn(upcoming.pk, rest)
+        self.assertEqual(seen + rest, [pk for pk in self.expected_ids("amount") if pk != before.pk])
+        self.assertIn(after.pk, rest)
+
+    def test_stream_matches_the_plain_list(self):
+        # Smaller chunks than rows, so the array is stitched across chunk boundaries
+        with mock.patch("backend.listing.STREAM_CHUNK_SIZE", 3):
+            response = self.client.get("/api/niches/list-all/", {"stream": 1, "ordering": "-amount"},
+                                       headers=self.auth)
+            self.assertTrue(response.streaming)
+            streamed = json.loads(b"".join(response.streaming_content))
+
+        self.assertEqual(streamed, self.get(ordering="-amount"))
+        self.assertEqual([row["id"] for row in streamed], self.expected_ids("-amount"))
+
+    def test_invalid_paging_parameters(self):
+        for params in ({"cursor": "not-a-cursor"}, {"limit": 0}, {"limit": "x"}, {"ordering": "password"}):
+            with self.subTest(params=params):
+                response = self.client.get("/api/niches/list-all/", params, headers=self.auth)
+                self.assertEqual(response.status_code, 400)
+
+    def test_location_filter_matches_prefixes(self):
+        self.create((500, "A-B1-F1"))
+
+        rows = self.get(location="B1")
+
+        self.assertEqual(sorted(row["location"] for row in rows), ["B1-F1-000", "B1-F1-001", "B1-F1-004"])
+        self.assertEqual(self.get(location="B1-F1-004")[0]["id"], self.niches[4].pk)
+        self.assertEqual(self.get(location="C"), [])
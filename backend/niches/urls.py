@@ -1,10 +1,13 @@
 from django.urls import path
 
+from backend.async_views import read_view
+
 from .views import *
 
 urlpatterns = [
-    path('list-all/', list_niches, name='list_niches'),
+    path('list-all/', read_view(list_niches, alist_niches), name='list_niches'),
     path('create-new/', create_niche, name='create_niche'),
     path('delete/', delete_niche, name='delete_niche'),
     path('edit/', edit_niche, name='edit_niche'),
+    path('import/', import_niches, name='import_niches'),
 ]
\ No newline at end of file
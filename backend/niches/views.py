@@ -4,29 +4,42 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from .models import Niche
 from django.views.decorators.csrf import csrf_exempt, requires_csrf_token, ensure_csrf_cookie
+from django.views.decorators.http import require_GET
 from .serializers import NicheSerializer
 
 from user_sessions.models import Session
-from user_sessions.utils import verify_session, get_user_from_session   
+from user_sessions.utils import aget_auth_context, get_auth_context
+from backend.listing import alist_response, list_response, prefix_range
+from backend.response_cache import acached_response, cached_response
+from backend.bulk import Importer, bulk_delete_response, import_response   
+from backend.writes import coordinated_write
+from backend.replicas import replica_reads
+from backend.async_views import json_response
+
+NICHE_FILTERS = {'status': 'status', 'type': 'type', 'location': prefix_range('location')}
+NICHE_ORDERINGS = {'location': 'location', 'amount': 'amount', 'status': 'status', 'type': 'type',
+                   'occupant_count': 'occupant_count'}
+NICHE_IMPORTER = Importer(NicheSerializer)
 
 # Create your views here.
 @api_view(['GET'])
 @csrf_exempt
 @ensure_csrf_cookie
+@replica_reads
 def list_niches(request):
     if request.method == 'GET':
 
-        authorization_header = request.headers.get('Authorization')
+        auth = get_auth_context(request)
 
-        if not authorization_header:
+        if not auth.token:
             return Response({'error': 'Authorization header missing'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        is_session_valid = verify_session(authorization_header)
+        is_session_valid = auth.is_valid
 
         if not is_session_valid:
             return Response({'error': 'Invalid or expired session'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        user = get_user_from_session(authorization_header)
+        user = auth.user
 
         if not user:
             return Response({'error': 'Invalid or expired session: User not found'}, status=status.HTTP_401_UNAUTHORIZED)
@@ -34,29 +47,46 @@ def list_niches(request):
         # If we reach this point, the user is authenticated
 
         if user.has_permission("view_records") and user.has_permission("view_dashboard"):
-            niches = Niche.objects.prefetch_related('occupants').all()
-            serializer = NicheSerializer(niches, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            niches = Niche.objects.all()
+            return cached_response(request, 'niches.list', ['niches'], lambda: list_response(
+                request, niches, NicheSerializer, filters=NICHE_FILTERS, orderings=NICHE_ORDERINGS))
         else:
             return Response({'error': 'You do not have permission to view niches.'}, status=status.HTTP_403_FORBIDDEN)
     return Response({'error': 'Invalid request method'}, status=status.HTTP_400_BAD_REQUEST)
 
+@require_GET
+@ensure_csrf_cookie
+@replica_reads
+async def alist_niches(request):
+    """list_niches for the ASGI deployment (see backend/async_views.py)"""
+    auth = await aget_auth_context(request)
+    if not auth.token:
+        return json_response({'error': 'Authorization header missing'}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.is_valid:
+        return json_response({'error': 'Invalid or expired session'}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_records", "view_dashboard"):
+        return json_response({'error': 'You do not have permission to view niches.'}, status=status.HTTP_403_FORBIDDEN)
+
+    return await acached_response(request, 'niches.list', ['niches'], lambda: alist_response(
+        request, Niche.objects.all(), NicheSerializer, filters=NICHE_FILTERS, orderings=NICHE_ORDERINGS))
+
 @api_view(['POST'])
 @requires_csrf_token
+@coordinated_write('niches.create_niche')
 def create_niche(request):
     if request.method == 'POST':
 
-        authorization_header = request.headers.get('Authorization')
+        auth = get_auth_context(request)
 
-        if not authorization_header:
+        if not auth.token:
             return Response({'error': 'Authorization header missing'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        is_session_valid = verify_session(authorization_header)
+        is_session_valid = auth.is_valid
 
         if not is_session_valid:
             return Response({'error': 'Invalid or expired session'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        user = get_user_from_session(authorization_header)
+        user = auth.user
 
         if not user:
             return Response({'error': 'Invalid or expired session: User not found'}, status=status.HTTP_401_UNAUTHORIZED)
@@ -75,20 +105,21 @@ def create_niche(request):
 
 @api_view(['PUT'])
 @requires_csrf_token
+@coordinated_write('niches.edit_niche')
 def edit_niche(request):
     if request.method == 'PUT':
 
-        authorization_header = request.headers.get('Authorization')
+        auth = get_auth_context(request)
 
-        if not authorization_header:
+        if not auth.token:
             return Response({'error': 'Authorization header missing'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        is_session_valid = verify_session(authorization_header)
+        is_session_valid = auth.is_valid
 
         if not is_session_valid:
             return Response({'error': 'Invalid or expired session'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        user = get_user_from_session(authorization_header)
+        user = auth.user
 
         if not user:
             return Response({'error': 'Invalid or expired session: User not found'}, status=status.HTTP_401_UNAUTHORIZED)
@@ -113,19 +144,20 @@ def edit_niche(request):
 
 @api_view(['DELETE'])
 @requires_csrf_token
+@coordinated_write('niches.delete_niche')
 def delete_niche(request):
     if request.method == 'DELETE':
-        authorization_header = request.headers.get('Authorization')
+        auth = get_auth_context(request)
 
-        if not authorization_header:
+        if not auth.token:
             return Response({'error': 'Authorization header missing'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        is_session_valid = verify_session(authorization_header)
+        is_session_valid = auth.is_valid
 
         if not is_session_valid:
             return Response({'error': 'Invalid or expired session'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        user = get_user_from_session(authorization_header)
+        user = auth.user
 
         if not user:
             return Response({'error': 'Invalid or expired session: User not found'}, status=status.HTTP_401_UNAUTHORIZED)
@@ -133,16 +165,28 @@ def delete_niche(request):
         # If we reach this point, the user is authenticated
 
         if user.has_permission("delete_record") and user.has_permission("view_dashboard"):
-            try:
-                niche_ids = request.data.get('element_ids')
-                
-                for id in niche_ids:
-                    niche = Niche.objects.get(id=id)
-                    niche.delete()
-            except Niche.DoesNotExist:
-                return Response({'error': 'Niche not found'}, status=status.HTTP_404_NOT_FOUND)
-
-            return Response({'ids': niche_ids}, status=status.HTTP_200_OK)
+            return bulk_delete_response(request, Niche.objects.all(), 'Niche with id {id} not found')
         else:
             return Response({'error': 'You do not have permission to delete niches.'}, status=status.HTTP_403_FORBIDDEN)
-    return Response({'error': 'Invalid request method'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    return Response({'error': 'Invalid request method'}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST'])
+@requires_csrf_token
+def import_niches(request):
+    if request.method == 'POST':
+
+        auth = get_auth_context(request)
+
+        if not auth.token:
+            return Response({'error': 'Authorization header missing'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not auth.is_valid:
+            return Response({'error': 'Invalid or expired session'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        user = auth.user
+
+        if user.has_permission("add_record") and user.has_permission("view_dashboard"):
+            return import_response(request, NICHE_IMPORTER, 'niches.import_niches')
+        else:
+            return Response({'error': 'You do not have permission to create niches.'}, status=status.HTTP_403_FORBIDDEN)
+    return Response({'error': 'Invalid request method'}, status=status.HTTP_400_BAD_REQUEST)
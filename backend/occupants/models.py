@@ -9,19 +9,48 @@ class Occupant(models.Model):
     interment_date = models.DateField(default=models.functions.Now)
     niche = models.ForeignKey(Niche, on_delete=models.CASCADE, related_name='occupants')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['interment_date', 'id']),
+        ]
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded niche so moving an occupant also updates the old niche
+        instance._loaded_niche_id = instance.__dict__.get('niche_id')
+        return instance
+
+
+def _cached_niche(instance, niche_id):
+    niche_field = Occupant._meta.get_field('niche')
+    if niche_field.is_cached(instance) and instance.niche is not None and instance.niche.pk == niche_id:
+        return instance.niche
+    return None
+
+
 @receiver(post_save, sender=Occupant)
-def update_niche_status_on_save(sender, instance, **kwargs):
-    """Update niche status when an occupant is created or updated"""
-    if instance.niche:
-        instance.niche.update_status()
-        instance.niche.save()
+def update_niche_occupancy_on_save(sender, instance, created, raw=False, **kwargs):
+    """Update niche occupancy when an occupant is created or moved"""
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_loaded_niche_id', instance.niche_id)
+    instance._loaded_niche_id = instance.niche_id
+    if previous == instance.niche_id:
+        return
+
+    if previous is not None:
+        Niche.adjust_occupancy(previous, -1)
+    Niche.adjust_occupancy(instance.niche_id, 1, _cached_niche(instance, instance.niche_id))
 
 @receiver(post_delete, sender=Occupant)
-def update_niche_status_on_delete(sender, instance, **kwargs):
-    """Update niche status when an occupant is deleted"""
-    if instance.niche:
-        instance.niche.update_status()
-        instance.niche.save()
+def update_niche_occupancy_on_delete(sender, instance, origin=None, **kwargs):
+    """Update niche occupancy when an occupant is deleted"""
+    # Skip occupants removed by a cascade from their own niche
+    if isinstance(origin, Niche) or getattr(origin, 'model', None) is Niche:
+        return
+    niche_id = getattr(instance, '_loaded_niche_id', instance.niche_id)
+    Niche.adjust_occupancy(niche_id, -1, _cached_niche(instance, niche_id))
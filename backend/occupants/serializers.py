@@ -1,4 +1,7 @@
+from django.db.models import Q
 from rest_framework import serializers
+
+from backend.bulk import Importer
 from niches.models import Niche
 from .models import Occupant
 
@@ -18,4 +21,37 @@ class OccupantSerializer(serializers.ModelSerializer):
 
         if not niche:
             raise serializers.ValidationError({"niche": "Niche must be provided."})
-        return Occupant.objects.create(niche=niche, **validated_data)
\ No newline at end of file
+        return Occupant.objects.create(niche=niche, **validated_data)
+
+
+class OccupantImporter(Importer):
+    """Import rows name, interment_date and either niche_id or niche (the niche location)"""
+
+    def __init__(self):
+        super().__init__(OccupantSerializer)
+
+    def prepare(self, rows):
+        ids = {str(row["niche_id"]) for row in rows if "niche_id" in row}
+        locations = {str(row["niche"]) for row in rows if "niche" in row}
+        niches = Niche.objects.filter(Q(id__in=[i for i in ids if i.isdigit()]) | Q(location__in=locations))
+
+        context = {"by_id": {}, "by_location": {}}
+        for niche in niches:
+            context["by_id"][str(niche.id)] = niche
+            context["by_location"].setdefault(niche.location, []).append(niche)
+        return context
+
+    def build(self, validated_data, row, context):
+        if "niche_id" in row:
+            niche = context["by_id"].get(str(row["niche_id"]))
+        elif "niche" in row:
+            matches = context["by_location"].get(str(row["niche"]), [])
+            if len(matches) > 1:
+                raise serializers.ValidationError({"niche": ["Several niches share this location; use niche_id."]})
+            niche = matches[0] if matches else None
+        else:
+            raise serializers.ValidationError({"niche_id": ["Either niche_id or niche (location) is required."]})
+
+        if niche is None:
+            raise serializers.ValidationError({"niche": ["Niche does not exist."]})
+        return Occupant(niche=niche, **validated_data)
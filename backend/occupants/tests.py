@@ -1,3 +1,73 @@
-from django.test import TestCase
+import json
+from datetime import date
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from analytics.models import DashboardSnapshot
+from backend.testing import SignedInMixin
+from niches.models import Niche
+
+from .models import Occupant
+
+
+@override_settings(AUDIT_ASYNC=False)
+class BulkDeleteOccupantsTests(SignedInMixin, TestCase):
+    permissions = ("view_dashboard", "delete_record")
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.full = Niche.objects.create(amount=1000, location="A-1", max_occupants=2)
+            self.occupied = Niche.objects.create(amount=1000, location="A-2", max_occupants=2)
+            self.occupants = [
+                Occupant.objects.create(name=name, niche=niche, interment_date=date(2024, 1, 1))
+                for name, niche in (("A", self.full), ("B", self.full), ("C", self.occupied))
+            ]
+        DashboardSnapshot.recompute()
+
+    def delete(self, ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.delete("/api/occupants/delete/", json.dumps({"element_ids": ids}),
+                                      content_type="application/json", headers=self.auth)
+
+    def assertSnapshotMatchesTables(self):
+        snapshot = DashboardSnapshot.objects.get()
+        fields = ("total_niches", "available_niches", "occupied_niches", "full_niches", "total_occupants")
+        kept = {field: getattr(snapshot, field) for field in fields}
+        rebuilt = DashboardSnapshot.recompute()
+        self.assertEqual(kept, {field: getattr(rebuilt, field) for field in fields})
+
+    def test_deletes_all_and_updates_counts_status_and_snapshot(self):
+        response = self.delete([occupant.pk for occupant in self.occupants])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Occupant.objects.exists())
+        for niche in (self.full, self.occupied):
+            niche.refresh_from_db()
+            self.assertEqual((niche.occupant_count, niche.status), (0, "Available"))
+        snapshot = DashboardSnapshot.objects.get()
+        self.assertEqual((snapshot.total_occupants, snapshot.available_niches, snapshot.full_niches), (0, 2, 0))
+        self.assertSnapshotMatchesTables()
+
+    def test_deletes_part_of_a_niche(self):
+        response = self.delete([self.occupants[0].pk])
+
+        self.assertEqual(response.status_code, 200)
+        self.full.refresh_from_db()
+        self.assertEqual((self.full.occupant_count, self.full.status), (1, "Occupied"))
+        self.assertSnapshotMatchesTables()
+
+    def test_missing_id_deletes_nothing(self):
+        response = self.delete([self.occupants[0].pk, 999999])
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["missing_ids"], [999999])
+        self.assertEqual(Occupant.objects.count(), 3)
+        self.full.refresh_from_db()
+        self.assertEqual((self.full.occupant_count, self.full.status), (2, "Full"))
+        self.assertSnapshotMatchesTables()
+
+    def test_malformed_ids_are_rejected(self):
+        for ids in ([], ["x"], "1"):
+            self.assertEqual(self.delete(ids).status_code, 400)
+        self.assertEqual(Occupant.objects.count(), 3)
@@ -1,10 +1,13 @@
 from django.urls import path
+from backend.async_views import read_view
 from .views import *
 
 
 urlpatterns = [
-    path('list-all/', list_occupants, name='list_occupants'),
+    path('list-all/', read_view(list_occupants, alist_occupants), name='list_occupants'),
     path('create-new/', create_occupant, name='create_occupant'),
     path('edit/', edit_occupant, name='edit_occupant'),
     path('delete/', delete_occupant, name='delete_occupant'),
+    path('import/', import_occupants, name='import_occupants'),
+    path('export/', export_occupants, name='export_occupants'),
 ]
\ No newline at end of file
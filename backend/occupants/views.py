@@ -5,141 +5,186 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt, requires_csrf_token, ensure_csrf_cookie
+from django.views.decorators.http import require_GET
+
+from user_sessions.utils import aget_auth_context, get_auth_context
+from backend.listing import alist_response, csv_response, list_response
+from backend.bulk import bulk_delete_response, import_response
+from backend.conditional import aconditional_response, conditional_response
+from backend.writes import coordinated_write
+from backend.replicas import replica_reads
+from backend.async_views import json_response
+from niches.models import Niche
 from django.utils import timezone
 
-from user_sessions.models import Session
-from users.models import User
-from niches.models import Niche
+OCCUPANT_FILTERS = {'interment_from': 'interment_date__gte', 'interment_to': 'interment_date__lte', 'niche': 'niche_id'}
+OCCUPANT_ORDERINGS = {'name': 'name', 'interment_date': 'interment_date'}
+OCCUPANT_IMPORTER = OccupantImporter()
+OCCUPANT_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('name', 'name'),
+    ('interment_date', 'interment_date'),
+    ('niche_id', 'niche_id'),
+    ('niche_location', 'niche__location'),
+    ('niche_type', 'niche__type'),
+]
+
+def _list_access_error(auth):
+    """(body, status) refusing a list request, or None; shared by the sync and async list views"""
+    if not auth.token:
+        return {"error": "Session token is missing."}, status.HTTP_401_UNAUTHORIZED
+    if not auth.is_valid:
+        return {"error": "Invalid session token."}, status.HTTP_401_UNAUTHORIZED
+    if not auth.has_permission("view_records", "view_dashboard"):
+        return {"error": "You do not have permission to view records."}, status.HTTP_403_FORBIDDEN
+    return None
 
 # Create your views here.
 @api_view(['GET'])
 @ensure_csrf_cookie
+@replica_reads
 def list_occupants(request):
     if request.method == 'GET':
-        session_token = request.headers.get("Session-Token")
-        
-        if not session_token:
-            return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        try:
-            session = Session.objects.get(session_token=session_token)
-
-            user = session.user
+        error = _list_access_error(get_auth_context(request))
+        if error:
+            return Response(*error)
 
-            if user.has_permission("view_records") and user.has_permission("view_dashboard"):
-                occupants = Occupant.objects.all().order_by('-interment_date')
-                serializer = OccupantSerializer(occupants, many=True)
-                return Response(serializer.data, status=status.HTTP_200_OK)
+        occupants = Occupant.objects.select_related('niche')
+        return conditional_response(request, ['occupants'], lambda: list_response(
+            request, occupants, OccupantSerializer, filters=OCCUPANT_FILTERS,
+            orderings=OCCUPANT_ORDERINGS, default_ordering='-interment_date'))
 
-        except Session.DoesNotExist:
-            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
+@require_GET
+@ensure_csrf_cookie
+@replica_reads
+async def alist_occupants(request):
+    """list_occupants for the ASGI deployment (see backend/async_views.py)"""
+    error = _list_access_error(await aget_auth_context(request))
+    if error:
+        return json_response(*error)
+
+    # The serializer shows the niche's location, so it must come with the row
+    occupants = Occupant.objects.select_related('niche')
+    return await aconditional_response(request, ['occupants'], lambda: alist_response(
+        request, occupants, OccupantSerializer, filters=OCCUPANT_FILTERS,
+        orderings=OCCUPANT_ORDERINGS, default_ordering='-interment_date'))
     
 @api_view(['POST'])
 @requires_csrf_token
+@coordinated_write('occupants.create_occupant')
 def create_occupant(request):
     if request.method == 'POST':
-        session_token = request.headers.get("Session-Token")
-        if not session_token:
+        auth = get_auth_context(request)
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
+        if not auth.session:
+            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
+
         try:
-            session = Session.objects.get(session_token=session_token)
             niche = Niche.objects.get(id=request.data.get("niche_id"))
-
-
-            user = session.user
-
-            if user.has_permission("add_record"):
-                new_data = request.data.copy()
-                new_data.pop("niche_id", None)
-                serializer = OccupantSerializer(data=new_data, context={'niche': niche})
-                if serializer.is_valid():
-                    serializer.save()
-
-                    niche.save()
-                    return Response({"ids": [serializer.data["id"]]}, status=status.HTTP_201_CREATED)
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            return Response({"error": "You do not have permission to add records."}, status=status.HTTP_403_FORBIDDEN)
-        except Session.DoesNotExist:    
-            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
         except Niche.DoesNotExist:
             print("niche does not exist.")
             return Response({"error": "Niche with the provided ID does not exist."}, status=status.HTTP_404_NOT_FOUND)
+
+        user = auth.session.user
+
+        if user.has_permission("add_record"):
+            new_data = request.data.copy()
+            new_data.pop("niche_id", None)
+            serializer = OccupantSerializer(data=new_data, context={'niche': niche})
+            if serializer.is_valid():
+                serializer.save()
+                return Response({"ids": [serializer.data["id"]]}, status=status.HTTP_201_CREATED)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"error": "You do not have permission to add records."}, status=status.HTTP_403_FORBIDDEN)
         
 @api_view(['PUT'])
 @requires_csrf_token
+@coordinated_write('occupants.edit_occupant')
 def edit_occupant(request):
     if request.method == "PUT":
-        session_token = request.headers.get("Session-Token")
-        if not session_token:
+        auth = get_auth_context(request)
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
         element_id = request.data.get("element_id")
         if not element_id:
             return Response({"error": "Element ID is missing."}, status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            session = Session.objects.get(session_token=session_token)
-
-            user = session.user
-
-            if user.has_permission("edit_record") and user.has_permission("view_dashboard"):
-                try:
-                    occupant = Occupant.objects.get(id=element_id)
-                except Occupant.DoesNotExist:
-                    return Response({"error": "Occupant with the provided ID does not exist."}, status=status.HTTP_404_NOT_FOUND)
-                
-                serializer = OccupantSerializer(occupant, data=request.data, partial=True)
-                if serializer.is_valid():
-                    serializer.save()
-                    return Response({"ids": [serializer.data["id"]]}, status=status.HTTP_200_OK)
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            return Response({"error": "You do not have permission to edit records."}, status=status.HTTP_403_FORBIDDEN)
-        except Session.DoesNotExist:
+        if not auth.session:
             return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        user = auth.session.user
+
+        if user.has_permission("edit_record") and user.has_permission("view_dashboard"):
+            try:
+                occupant = Occupant.objects.get(id=element_id)
+            except Occupant.DoesNotExist:
+                return Response({"error": "Occupant with the provided ID does not exist."}, status=status.HTTP_404_NOT_FOUND)
+            
+            serializer = OccupantSerializer(occupant, data=request.data, partial=True)
+            if serializer.is_valid():
+                serializer.save()
+                return Response({"ids": [serializer.data["id"]]}, status=status.HTTP_200_OK)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"error": "You do not have permission to edit records."}, status=status.HTTP_403_FORBIDDEN)
 
 @api_view(['DELETE'])
+@coordinated_write('occupants.delete_occupant')
 def delete_occupant(request):
     if request.method == 'DELETE':
-        element_ids = request.data.get("element_ids")
-        SESSION_TOKEN = request.headers.get("Session-Token")
+        auth = get_auth_context(request)
 
-        if not SESSION_TOKEN:
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
-        try:
-            user_session = Session.objects.get(session_token=SESSION_TOKEN)
+        if not auth.session:
+            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
 
-            session_expiry = user_session.expiry
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # If session is valid, check user for permissions
+        user = auth.user
+        if user.has_permission("delete_record") and user.has_permission("view_dashboard"):
+            return bulk_delete_response(request, Occupant.objects.all(), "Occupant record with id {id} not found.")
 
-            if timezone.now() > session_expiry:
-                return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            # If session is valid, check user for permissions
-            user = user_session.user
-            if user.has_permission("delete_record") and user.has_permission("view_dashboard"):
-
-                for id in element_ids:
-                    print("Deleting id:", id)
-                    try:
-                        occupant = Occupant.objects.get(id=id)
-                        niche = occupant.niche
-                        niche.status = "Available"
-                        niche.save()
-                        occupant.delete()
-                    except Occupant.DoesNotExist:
-                        return Response({"error": f"Occupant record with id {id} not found."}, status=status.HTTP_404_NOT_FOUND)
-
-                return Response({"ids": element_ids}, status=status.HTTP_200_OK)
-
-            return Response({"error": "You do not have permission to delete records."}, status=status.HTTP_403_FORBIDDEN)
-        except Session.DoesNotExist:
+        return Response({"error": "You do not have permission to delete records."}, status=status.HTTP_403_FORBIDDEN)
+
+@api_view(['POST'])
+@requires_csrf_token
+def import_occupants(request):
+    if request.method == 'POST':
+        auth = get_auth_context(request)
+        if not auth.token:
+            return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not auth.session:
             return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        user = auth.user
+        if user.has_permission("add_record") and user.has_permission("view_dashboard"):
+            return import_response(request, OCCUPANT_IMPORTER, 'occupants.import_occupants')
+        return Response({"error": "You do not have permission to add records."}, status=status.HTTP_403_FORBIDDEN)
+
+@api_view(['GET'])
+@replica_reads
+def export_occupants(request):
+    if request.method == 'GET':
+        auth = get_auth_context(request)
+        if not auth.token:
+            return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not auth.is_valid:
+            return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if auth.has_permission("view_records", "view_dashboard"):
+            filename = f"occupants-{timezone.localdate():%Y-%m-%d}.csv"
+            return csv_response(request, Occupant.objects.all(), OCCUPANT_EXPORT_COLUMNS, filename,
+                                filters=OCCUPANT_FILTERS, orderings=OCCUPANT_ORDERINGS,
+                                default_ordering='-interment_date')
+        return Response({"error": "You do not have permission to view records."}, status=status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from analytics.models import ResourceVersion
+from payments.models import Payment, PaymentDetail
+
+
+class Command(BaseCommand):
+    help = "Compare stored payment ledger totals with their payment details and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report drifted payments without updating them.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Payments fixed per UPDATE statement.")
+
+    def handle(self, *args, **options):
+        details = PaymentDetail.objects.filter(payment=OuterRef("pk")).order_by().values("payment")
+        payments = Payment.objects.annotate(
+            actual_paid=Coalesce(
+                Subquery(details.annotate(total=Sum("amount")).values("total")),
+                Value(Decimal("0")),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            actual_last=Subquery(details.annotate(latest=Max("payment_date")).values("latest")),
+        ).order_by()
+
+        cent = Decimal("0.01")
+        drifted = []
+        for payment in payments.iterator(chunk_size=options["batch_size"]):
+            stored = (payment.amount_paid or Decimal("0")).quantize(cent)
+            if stored != payment.actual_paid.quantize(cent) or payment.last_payment_date != payment.actual_last:
+                drifted.append(payment.pk)
+            else:
+                payment.amount_paid = stored
+                if payment.status != payment.compute_status():
+                    drifted.append(payment.pk)
+
+        self.stdout.write(f"{len(drifted)} payment(s) with drifted totals.")
+        if options["dry_run"] or not drifted:
+            return
+
+        batch_size = options["batch_size"]
+        updated = 0
+        for start in range(0, len(drifted), batch_size):
+            with transaction.atomic():
+                updated += Payment.objects.filter(pk__in=drifted[start:start + batch_size]).recalculate_totals()
+                ResourceVersion.bump("payments")
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {updated} payment(s)."))
@@ -1,35 +1,112 @@
-from django.db import models
-from django.db.models import Sum
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Case, F, Max, OuterRef, Subquery, Sum, Value, When, sql
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan, LessThanOrEqual
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from datetime import datetime
 from decimal import Decimal
 
+
+class PaymentRejected(ValueError):
+    """A posting that would not be applied; `kind` is the error type reported to clients"""
+
+    def __init__(self, message, kind):
+        super().__init__(message)
+        self.kind = kind
+
+
+def _status_expression(amount_paid, amount_due=F('amount_due')):
+    """Database-side equivalent of Payment.compute_status for a paid-amount expression"""
+    return Case(
+        When(LessThanOrEqual(amount_due, amount_paid), then=Value("Completed")),
+        When(GreaterThan(amount_paid, Value(Decimal('0'))), then=Value("Pending")),
+        default=Value("Inactive"),
+    )
+
+
+class PaymentQuerySet(models.QuerySet):
+    def recalculate_totals(self):
+        """Recompute amount_paid, last_payment_date and status from payment_details in one UPDATE"""
+        details = PaymentDetail.objects.filter(payment=OuterRef('pk')).order_by().values('payment')
+        amount_paid = Coalesce(
+            Subquery(details.annotate(total=Sum('amount')).values('total')),
+            Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+        last_payment_date = Subquery(details.annotate(latest=Max('payment_date')).values('latest'))
+        return self.update(
+            amount_paid=amount_paid,
+            last_payment_date=last_payment_date,
+            status=_status_expression(amount_paid),
+        )
+
+    def apply_posting(self, amount, payment_date):
+        """
+        Add a posted amount to the ledger totals of one payment in one
+        conditional UPDATE, only where it does not exceed the remaining
+        balance. Returns the updated Payment, read back with RETURNING where
+        the database supports it, or None when the posting was refused.
+        """
+        amount_paid = F('amount_paid') + amount
+        postable = self.filter(amount_due__gte=amount_paid)
+        values = {
+            'amount_paid': amount_paid,
+            'last_payment_date': Case(
+                When(last_payment_date__gt=payment_date, then=F('last_payment_date')),
+                default=Value(payment_date),
+            ),
+            'status': _status_expression(amount_paid),
+        }
+        connection = connections[self.db]
+        if connection.vendor not in ('sqlite', 'postgresql') or not connection.features.can_return_columns_from_insert:
+            return self.first() if postable.update(**values) else None
+
+        query = postable.query.chain(sql.UpdateQuery)
+        query.add_update_values(values)
+        compiler = query.get_compiler(self.db)
+        update_sql, params = compiler.as_sql()
+        fields = self.model._meta.concrete_fields
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{update_sql} RETURNING {columns}', params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        # Converted as a SELECT of the same columns would be (decimals, dates)
+        cols = [field.get_col(self.model._meta.db_table) for field in fields]
+        [row] = compiler.apply_converters([row], compiler.get_converters(cols))
+        return self.model.from_db(self.db, [field.attname for field in fields], row)
+
+
 # Create your models here.
 class Payment(models.Model):
+    LEDGER_FIELDS = ('amount_paid', 'last_payment_date')
+
     payer = models.CharField(max_length=100)
     amount_due = models.DecimalField(max_digits=10, decimal_places=2)
     maintenance_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     status = models.CharField(max_length=50, editable=False) # status is either Completed, Pending or Inactive
+    # Ledger totals, maintained from payment_details by PaymentQuerySet.recalculate_totals
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), editable=False)
+    last_payment_date = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = PaymentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
 
     def __str__(self):
         return f"Payment record for {self.payer} - Due: {self.amount_due}"
     
-    @property
-    def amount_paid(self):
-        """Calculate total amount paid from all payment details"""
-        total = self.payment_details.aggregate(total=Sum('amount'))['total']
-        return Decimal(str(total or 0.00))
-    
     @property
     def remaining_balance(self):
         """Calculate remaining balance"""
         return max(Decimal('0'), self.amount_due - self.amount_paid)
     
-    @property
-    def last_payment_date(self):
-        """Get the most recent payment date"""
-        latest_payment = self.payment_details.order_by('-payment_date').first()
-        return latest_payment.payment_date if latest_payment else None
-    
     @property
     def months_paid(self):
         """Calculate how many months have been paid based on maintenance fee"""
@@ -41,19 +118,34 @@ class Payment(models.Model):
     def is_current_month_paid(self):
         """Check if current month is paid"""
         return self.months_paid > 0
+
+    def compute_status(self):
+        remaining = self.amount_due - self.amount_paid
+
+        if remaining <= Decimal('0'):
+            return "Completed"
+        elif self.amount_paid > Decimal('0'):
+            return "Pending"
+        return "Inactive"
     
     def save(self, *args, **kwargs):
-        # Update status based on payment amounts
-        amount_paid = self.amount_paid
-        remaining = self.amount_due - amount_paid
-        
-        if remaining <= Decimal('0'):
-            self.status = "Completed"
-        elif amount_paid > Decimal('0'):
-            self.status = "Pending"
-        else:
-            self.status = "Inactive"
+        # Ledger totals are written by recalculate_totals only, so an edit made
+        # from a stale instance cannot overwrite a concurrent payment posting
+        if self.pk is not None and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.LEDGER_FIELDS
+            ]
+            # Status follows the stored amount_paid, and the amount_due being saved
+            amount_due = self._meta.get_field('amount_due')
+            self.status = _status_expression(
+                F('amount_paid'), Value(amount_due.to_python(self.amount_due), output_field=amount_due))
+            super().save(*args, **kwargs)
+            self.refresh_from_db(fields=['status', *self.LEDGER_FIELDS])
+            return
 
+        # Update status based on the ledger totals being saved
+        self.status = self.compute_status()
         super().save(*args, **kwargs)
 
 
@@ -64,15 +156,108 @@ class PaymentDetail(models.Model):
     payment_date = models.DateTimeField(default=datetime.now)
     created_by = models.CharField(max_length=100, blank=True, null=True)  # Track who added the payment
     notes = models.TextField(blank=True, null=True)
+    # Client-supplied key identifying one posting, so a retried request is not applied twice
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True, unique=True, editable=False)
     
     class Meta:
         ordering = ['-payment_date']
+        indexes = [
+            models.Index(fields=['payment', 'payment_date']),
+            models.Index(fields=['payment_date']),
+        ]
     
     def __str__(self):
         return f"Payment of {self.amount} on {self.payment_date.strftime('%Y-%m-%d')}"
     
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update the parent payment status after saving payment detail
-        # Use update() to avoid recursion and directly trigger the parent's save logic
-        self.payment.save()
+    # Fields whose stored values are remembered, for stored_value()
+    TRACKED_FIELDS = ('payment_id', 'amount', 'payment_date')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_values = {field: instance.__dict__.get(field) for field in cls.TRACKED_FIELDS}
+        return instance
+
+    def stored_value(self, field):
+        """
+        The value of a TRACKED_FIELDS field as last loaded or saved, so
+        post_save and post_delete receivers can tell what changed. None for
+        an instance that was never loaded, or a field deferred when it was.
+        """
+        return getattr(self, '_stored_values', {}).get(field)
+
+    def save(self, *args, update_totals=True, **kwargs):
+        # No savepoint of its own: a failed save fails the caller's transaction anyway
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            # Keep the parent's ledger totals in the same transaction as the detail write;
+            # moving a detail also refreshes the old payment
+            if update_totals:
+                payment_ids = {self.payment_id, self.stored_value('payment_id')} - {None}
+                Payment.objects.filter(pk__in=payment_ids).recalculate_totals()
+            self._stored_values = {field: getattr(self, field) for field in self.TRACKED_FIELDS}
+
+    @classmethod
+    def post(cls, payment_id, amount, idempotency_key=None, payment_date=None, **fields):
+        """
+        Post `amount` (a Decimal) to a payment without ever exceeding its
+        remaining balance, even with concurrent postings. Returns
+        (detail, created), with detail.payment holding the updated ledger
+        totals; a repeated idempotency_key returns the detail it first
+        created with created=False. Raises PaymentRejected otherwise.
+        """
+        if amount <= 0:
+            raise PaymentRejected("Payment amount must be greater than 0.", "invalid_amount")
+        if idempotency_key:
+            existing = cls._replay(payment_id, amount, idempotency_key)
+            if existing is not None:
+                return existing, False
+
+        payment_date = payment_date or timezone.now()
+        detail = cls(payment_id=payment_id, amount=amount, payment_date=payment_date,
+                     idempotency_key=idempotency_key or None, **fields)
+        try:
+            with transaction.atomic():
+                payment = Payment.objects.filter(pk=payment_id).apply_posting(amount, payment_date)
+                if payment is None:
+                    raise cls._rejection(payment_id, amount)
+                # The ledger totals were already moved by apply_posting; detail.payment is the updated row
+                detail.payment = payment
+                detail.save(force_insert=True, update_totals=False)
+        except IntegrityError:
+            # A concurrent request with the same key won; its posting stands
+            existing = cls._replay(payment_id, amount, idempotency_key) if idempotency_key else None
+            if existing is None:
+                raise
+            return existing, False
+        return detail, True
+
+    @classmethod
+    def _replay(cls, payment_id, amount, idempotency_key):
+        existing = cls.objects.filter(idempotency_key=idempotency_key).first()
+        if existing is not None and (existing.payment_id != payment_id or existing.amount != amount):
+            raise PaymentRejected("This idempotency key was already used for a different payment.",
+                                  "idempotency_key_reused")
+        return existing
+
+    @staticmethod
+    def _rejection(payment_id, amount):
+        payment = Payment.objects.filter(pk=payment_id).first()
+        if payment is None:
+            return PaymentRejected("Payment record not found.", "not_found")
+        if payment.remaining_balance <= 0:
+            return PaymentRejected("Payment is already completed. No additional payments can be added.",
+                                   "payment_completed")
+        return PaymentRejected(
+            f"Payment amount ({amount}) cannot exceed remaining balance ({payment.remaining_balance}).",
+            "amount_exceeds_balance",
+        )
+
+
+@receiver(post_delete, sender=PaymentDetail)
+def update_payment_totals_on_delete(sender, instance, origin=None, **kwargs):
+    """Refresh ledger totals when a payment detail is deleted"""
+    # Skip details removed by a cascade from their own payment
+    if isinstance(origin, Payment) or getattr(origin, 'model', None) is Payment:
+        return
+    Payment.objects.filter(pk=instance.payment_id).recalculate_totals()
@@ -1,6 +1,10 @@
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from rest_framework.serializers import (
+    CharField, DateTimeField, DecimalField, ModelSerializer, Serializer, SerializerMethodField,
+)
 from .models import Payment, PaymentDetail
 
+from backend.bulk import Importer
+
 # Serializer for Payment model
 class PaymentSerializer(ModelSerializer):
     amount_paid = SerializerMethodField()
@@ -30,4 +34,25 @@ class PaymentSerializer(ModelSerializer):
 class PaymentDetailSerializer(ModelSerializer):
     class Meta:
         model = PaymentDetail
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class PaymentPostingSerializer(Serializer):
+    """Input for posting a payment; the amount is kept as a Decimal"""
+    amount = DecimalField(max_digits=10, decimal_places=2)
+    payment_date = DateTimeField(required=False)
+    notes = CharField(required=False, allow_blank=True, allow_null=True)
+    idempotency_key = CharField(required=False, max_length=64)
+
+
+class PaymentImporter(Importer):
+    """Import rows payer, amount_due and maintenance_fee"""
+
+    def __init__(self):
+        super().__init__(PaymentSerializer)
+
+    def build(self, validated_data, row, context):
+        payment = super().build(validated_data, row, context)
+        # bulk_create skips Payment.save(), which normally sets the status
+        payment.status = payment.compute_status()
+        return payment
@@ -1,3 +1,217 @@
-from django.test import TestCase
+import csv
+import io
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from analytics.models import DashboardSnapshot
+from backend.testing import SignedInMixin
+
+from .models import Payment, PaymentDetail, PaymentRejected
+
+
+class PaymentPostingTests(TestCase):
+    def setUp(self):
+        self.payment = Payment.objects.create(payer="Test", amount_due=Decimal("100.00"), maintenance_fee=Decimal("10.00"))
+
+    def test_posting_updates_ledger_totals(self):
+        detail, created = PaymentDetail.post(self.payment.pk, Decimal("33.33"))
+        PaymentDetail.post(self.payment.pk, Decimal("33.33"))
+        PaymentDetail.post(self.payment.pk, Decimal("33.34"))
+
+        self.payment.refresh_from_db()
+        self.assertTrue(created)
+        self.assertEqual(self.payment.amount_paid, Decimal("100.00"))
+        self.assertEqual(self.payment.status, "Completed")
+        self.assertEqual(self.payment.last_payment_date, PaymentDetail.objects.latest("payment_date").payment_date)
+
+    def test_overpayment_is_rejected(self):
+        PaymentDetail.post(self.payment.pk, Decimal("99.99"))
+        with self.assertRaises(PaymentRejected) as rejected:
+            PaymentDetail.post(self.payment.pk, Decimal("0.02"))
+        self.assertEqual(rejected.exception.kind, "amount_exceeds_balance")
+
+        PaymentDetail.post(self.payment.pk, Decimal("0.01"))
+        with self.assertRaises(PaymentRejected) as rejected:
+            PaymentDetail.post(self.payment.pk, Decimal("0.01"))
+        self.assertEqual(rejected.exception.kind, "payment_completed")
+
+    def test_idempotency_key_replays_the_first_posting(self):
+        first, created = PaymentDetail.post(self.payment.pk, Decimal("25.00"), idempotency_key="retry-1")
+        again, replayed = PaymentDetail.post(self.payment.pk, Decimal("25.00"), idempotency_key="retry-1")
+
+        self.payment.refresh_from_db()
+        self.assertTrue(created)
+        self.assertFalse(replayed)
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(self.payment.amount_paid, Decimal("25.00"))
+
+        with self.assertRaises(PaymentRejected) as rejected:
+            PaymentDetail.post(self.payment.pk, Decimal("30.00"), idempotency_key="retry-1")
+        self.assertEqual(rejected.exception.kind, "idempotency_key_reused")
+
+    def test_edit_from_stale_instance_keeps_posted_status(self):
+        stale = Payment.objects.get(pk=self.payment.pk)
+        PaymentDetail.post(self.payment.pk, Decimal("100.00"))
+
+        stale.maintenance_fee = Decimal("20.00")
+        stale.save()
+
+        self.assertEqual(stale.status, "Completed")
+        self.assertEqual(stale.amount_paid, Decimal("100.00"))
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "Completed")
+        self.assertEqual(self.payment.maintenance_fee, Decimal("20.00"))
+
+        stale.amount_due = Decimal("150.00")
+        stale.save()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "Pending")
+
+
+class ConcurrentPaymentPostingTests(TransactionTestCase):
+    """Post from many threads at once; the ledger must never exceed the amount due"""
+    THREADS = 12
+
+    def setUp(self):
+        self.payment = Payment.objects.create(payer="Test", amount_due=Decimal("100.00"), maintenance_fee=Decimal("10.00"))
+
+    def _post_concurrently(self, amount, key_for):
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+        lock = threading.Lock()
+
+        def worker(index):
+            barrier.wait()
+            try:
+                for _ in range(50):
+                    try:
+                        _, created = PaymentDetail.post(self.payment.pk, amount, idempotency_key=key_for(index))
+                        outcome = "created" if created else "replayed"
+                        break
+                    except PaymentRejected as e:
+                        outcome = e.kind
+                        break
+                    except OperationalError:
+                        # SQLite reports a locked table instead of waiting; retry like a client would.
+                        # The error may come after the posting committed, so outcomes are not
+                        # counted here; the ledger itself is checked below.
+                        time.sleep(0.01)
+                else:
+                    outcome = "gave_up"
+                with lock:
+                    outcomes.append(outcome)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_parallel_postings_never_overpay(self):
+        outcomes = self._post_concurrently(Decimal("30.00"), lambda index: None)
+
+        self.payment.refresh_from_db()
+        details = PaymentDetail.objects.filter(payment=self.payment)
+        self.assertNotIn("gave_up", outcomes)
+        self.assertEqual(details.count(), 3)
+        self.assertEqual(sum(detail.amount for detail in details), self.payment.amount_paid)
+        self.assertEqual(self.payment.amount_paid, Decimal("90.00"))
+        self.assertLessEqual(self.payment.amount_paid, self.payment.amount_due)
+
+    def test_parallel_retries_post_once(self):
+        outcomes = self._post_concurrently(Decimal("10.00"), lambda index: "same-key")
+
+        self.payment.refresh_from_db()
+        self.assertEqual(outcomes.count("created") + outcomes.count("replayed"), self.THREADS)
+        self.assertEqual(PaymentDetail.objects.filter(payment=self.payment).count(), 1)
+        self.assertEqual(self.payment.amount_paid, Decimal("10.00"))
+
+
+class PostingQueryCountTests(SignedInMixin, TransactionTestCase):
+    """Outside a test transaction, so the commit and the post-commit updates really happen"""
+
+    permissions = ("view_dashboard", "add_record")
+
+    def setUp(self):
+        super().setUp()
+        self.payment = Payment.objects.create(payer="Test", amount_due=Decimal("100.00"), maintenance_fee=Decimal("10.00"))
+        DashboardSnapshot.recompute()
+        # The audit entry is written by its own writer; only the posting is counted here
+        patcher = mock.patch("audit.middleware.record_audit_entry")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, amount):
+        return self.client.post(f"/api/payments/{self.payment.pk}/add-payment/", {"amount": amount},
+                                content_type="application/json", headers=self.auth)
+
+    def test_posting_runs_a_fixed_number_of_queries(self):
+        # Warms the session cache and creates the resource version rows
+        self.assertEqual(self.post("10.00").status_code, 201)
+
+        with self.assertNumQueries(11) as queries:
+            response = self.post("15.00")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["updated_payment"]["amount_paid"], 25.0)
+        statements = [query["sql"].split()[0] for query in queries.captured_queries]
+        self.assertEqual(statements, [
+            # The posting: ledger UPDATE ... RETURNING, then the detail INSERT
+            "BEGIN", "SAVEPOINT", "UPDATE", "INSERT", "RELEASE", "COMMIT",
+            # Dashboard delta, earnings buckets and resource versions, in one transaction
+            "BEGIN", "UPDATE", "DELETE", "UPDATE", "COMMIT",
+        ])
+        self.assertEqual(DashboardSnapshot.objects.get().total_earnings, Decimal("25.00"))
+
+
+class PaymentExportTests(SignedInMixin, TestCase):
+    permissions = ("view_dashboard", "view_records")
+
+    def setUp(self):
+        super().setUp()
+        self.payment = Payment.objects.create(payer="Ana", amount_due=Decimal("100.00"), maintenance_fee=Decimal("20.00"))
+        for day, amount in ((3, "30.00"), (20, "15.00")):
+            PaymentDetail.post(self.payment.pk, Decimal(amount), payment_date=datetime(2024, 5, day, tzinfo=dt_timezone.utc))
+        other = Payment.objects.create(payer="Jose", amount_due=Decimal("50.00"), maintenance_fee=Decimal("0.00"))
+        PaymentDetail.post(other.pk, Decimal("50.00"), payment_date=datetime(2024, 5, 9, tzinfo=dt_timezone.utc))
+
+    def export(self, path, params=None):
+        response = self.client.get(path, params or {}, headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Disposition"].startswith("attachment; filename="))
+        return list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+    def test_payments_export_reads_the_stored_totals(self):
+        rows = {row["payer"]: row for row in self.export("/api/payments/export/")}
+
+        self.assertEqual({field: rows["Ana"][field] for field in ("amount_paid", "months_paid", "status")},
+                         {"amount_paid": "45.00", "months_paid": "2", "status": "Pending"})
+        self.assertEqual(Decimal(rows["Ana"]["remaining_balance"]), Decimal("55.00"))
+        self.assertEqual((rows["Jose"]["months_paid"], rows["Jose"]["status"]), ("0", "Completed"))
+
+    def test_query_count_does_not_grow_with_the_rows(self):
+        self.export("/api/payments/export/")
+        with CaptureQueriesContext(connection) as few:
+            self.export("/api/payments/export/")
+        for index in range(10):
+            Payment.objects.create(payer=f"P{index}", amount_due=Decimal("10.00"))
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(len(self.export("/api/payments/export/")), 12)
+
+        self.assertEqual(len(many), len(few))
+
+    def test_ledger_export_filters_by_payment_and_date(self):
+        rows = self.export("/api/payments/details/export/", {"payment": self.payment.pk, "date_from": "2024-05-10"})
+
+        self.assertEqual([(row["payer"], row["amount"]) for row in rows], [("Ana", "15.00")])
+        self.assertEqual(len(self.export("/api/payments/details/export/")), 3)
@@ -1,12 +1,16 @@
 from django.urls import path
+from backend.async_views import read_view
 from .views import *
 
 urlpatterns = [
-    path('list-all/', list_payments, name='list_payments'),
+    path('list-all/', read_view(list_payments, alist_payments), name='list_payments'),
     path('create-new/', create_payment, name='create_payment'),
     path('delete/', delete_payment, name='delete_payment'),
     path('edit/', edit_payment, name='edit_payment'),
-    path('<int:payment_id>/details/', get_payment_details, name='get_payment_details'),
+    path('import/', import_payments, name='import_payments'),
+    path('export/', export_payments, name='export_payments'),
+    path('details/export/', export_payment_ledger, name='export_payment_ledger'),
+    path('<int:payment_id>/details/', read_view(get_payment_details, aget_payment_details), name='get_payment_details'),
     path('<int:payment_id>/add-payment/', add_payment_detail, name='add_payment_detail'),
     path('detail/<int:detail_id>/edit/', edit_payment_detail, name='edit_payment_detail'),
     path('detail/<int:detail_id>/delete/', delete_payment_detail, name='delete_payment_detail'),
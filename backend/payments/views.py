@@ -2,126 +2,177 @@ from django.shortcuts import render
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Payment, PaymentDetail
-from users.models import User
-from user_sessions.models import Session
-from .serializers import PaymentSerializer, PaymentDetailSerializer
+from .models import Payment, PaymentDetail, PaymentRejected
+from .serializers import PaymentSerializer, PaymentDetailSerializer, PaymentImporter, PaymentPostingSerializer
 from django.views.decorators.csrf import csrf_exempt, requires_csrf_token, ensure_csrf_cookie
+from django.core.exceptions import ValidationError
+from decimal import Decimal, InvalidOperation
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.db.models.functions import Floor, Greatest
 from django.utils import timezone
-from user_sessions.utils import verify_session, get_user_from_session
+from django.views.decorators.http import require_GET
+from user_sessions.utils import aget_auth_context, get_auth_context
+from backend.listing import alist_response, apply_filters, csv_response, list_response
+from backend.bulk import bulk_delete_response, import_response
+from backend.conditional import aconditional_response, conditional_response
+from backend.response_cache import acached_response, cached_response
+from backend.writes import coordinated_write
+from backend.replicas import replica_reads
+from backend.async_views import api_request, json_response
+
+PAYMENT_FILTERS = {'status': 'status'}
+PAYMENT_IMPORTER = PaymentImporter()
+REMAINING_BALANCE = Greatest(
+    F('amount_due') - F('amount_paid'), Value(Decimal('0')),
+    output_field=DecimalField(max_digits=10, decimal_places=2),
+)
+PAYMENT_ORDERINGS = {
+    'payer': 'payer',
+    'status': 'status',
+    'amount_due': 'amount_due',
+    'amount_paid': 'amount_paid',
+    'remaining_balance': REMAINING_BALANCE,
+}
+PAYMENT_DETAIL_FILTERS = {'date_from': 'payment_date__date__gte', 'date_to': 'payment_date__date__lte'}
+LEDGER_FILTERS = {**PAYMENT_DETAIL_FILTERS, 'payment': 'payment_id'}
+POSTING_ERROR_STATUS = {
+    'not_found': status.HTTP_404_NOT_FOUND,
+    'idempotency_key_reused': status.HTTP_409_CONFLICT,
+}
+
+# Export columns read straight from the stored ledger totals, so no row needs an aggregate
+PAYMENT_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('payer', 'payer'),
+    ('amount_due', 'amount_due'),
+    ('maintenance_fee', 'maintenance_fee'),
+    ('amount_paid', 'amount_paid'),
+    ('remaining_balance', REMAINING_BALANCE),
+    ('months_paid', Case(
+        When(maintenance_fee__gt=0, then=Floor(F('amount_paid') / F('maintenance_fee'))),
+        default=Value(0),
+        output_field=IntegerField(),
+    )),
+    ('last_payment_date', 'last_payment_date'),
+    ('status', 'status'),
+]
+LEDGER_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('payment_id', 'payment_id'),
+    ('payer', 'payment__payer'),
+    ('amount', 'amount'),
+    ('payment_date', 'payment_date'),
+    ('created_by', 'created_by'),
+    ('notes', 'notes'),
+]
 
 # Create your views here.
 @api_view(['GET'])
 @ensure_csrf_cookie
+@replica_reads
 def list_payments(request):
     if request.method == 'GET':
-        SESSION_TOKEN = request.headers.get("Session-Token")
+        auth = get_auth_context(request)
 
-        if not SESSION_TOKEN:
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
-        try:
-            user_session = Session.objects.get(session_token=SESSION_TOKEN)
+        if not auth.session:
+            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
 
-            session_expiry = user_session.expiry
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # If session is valid, check user for permissions
+        user = auth.user
+        if user.has_permission("view_records") and user.has_permission("view_dashboard"):
+            payments = Payment.objects.all()
 
-            if timezone.now() > session_expiry:
-                return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            # If session is valid, check user for permissions
-            user = user_session.user
-            if user.has_permission("view_records") and user.has_permission("view_dashboard"):
-                payments = Payment.objects.all().order_by('-id')
+            return cached_response(request, 'payments.list', ['payments'], lambda: list_response(
+                request, payments, PaymentSerializer, filters=PAYMENT_FILTERS,
+                orderings=PAYMENT_ORDERINGS, default_ordering='-id'))
 
-                serializer = PaymentSerializer(payments, many=True)
-            
-                return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response({"error": "You do not have permission to view these records."}, status=status.HTTP_403_FORBIDDEN)
 
-            return Response({"error": "You do not have permission to view these records."}, status=status.HTTP_403_FORBIDDEN)
-        except Session.DoesNotExist:
-            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
+@require_GET
+@ensure_csrf_cookie
+@replica_reads
+async def alist_payments(request):
+    """list_payments for the ASGI deployment (see backend/async_views.py)"""
+    auth = await aget_auth_context(request)
+    if not auth.token:
+        return json_response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.session:
+        return json_response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
+    if auth.is_expired:
+        return json_response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_records", "view_dashboard"):
+        return json_response({"error": "You do not have permission to view these records."}, status=status.HTTP_403_FORBIDDEN)
+
+    return await acached_response(request, 'payments.list', ['payments'], lambda: alist_response(
+        request, Payment.objects.all(), PaymentSerializer, filters=PAYMENT_FILTERS,
+        orderings=PAYMENT_ORDERINGS, default_ordering='-id'))
         
 @api_view(['POST'])
 @requires_csrf_token
+@coordinated_write('payments.create_payment')
 def create_payment(request):
     if request.method == 'POST':
-        SESSION_TOKEN = request.headers.get("Session-Token")
+        auth = get_auth_context(request)
 
-        if not SESSION_TOKEN:
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
-        try:
-            user_session = Session.objects.get(session_token=SESSION_TOKEN)
+        if not auth.session:
+            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
 
-            session_expiry = user_session.expiry
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # If session is valid, check user for permissions
+        user = auth.user
+        if user.has_permission("add_record") and user.has_permission("view_dashboard"):
+            data = request.data
+            data["status"] = "Pending"  # Default status when creating a new payment
+            print(data)
+            serializer = PaymentSerializer(data=data)
+            if serializer.is_valid():
+                serializer.save()
+                return Response({"ids": [serializer.data["id"]]}, status=status.HTTP_201_CREATED)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            if timezone.now() > session_expiry:
-                return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            # If session is valid, check user for permissions
-            user = user_session.user
-            if user.has_permission("add_record") and user.has_permission("view_dashboard"):
-                data = request.data
-                data["status"] = "Pending"  # Default status when creating a new payment
-                print(data)
-                serializer = PaymentSerializer(data=data)
-                if serializer.is_valid():
-                    serializer.save()
-                    return Response({"ids": [serializer.data["id"]]}, status=status.HTTP_201_CREATED)
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-            return Response({"error": "You do not have permission to add records."}, status=status.HTTP_403_FORBIDDEN)
-        except Session.DoesNotExist:
-            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({"error": "You do not have permission to add records."}, status=status.HTTP_403_FORBIDDEN)
         
 @api_view(['DELETE'])
+@coordinated_write('payments.delete_payment')
 def delete_payment(request):
     if request.method == 'DELETE':
-        payments = request.data.get("element_ids")
-        SESSION_TOKEN = request.headers.get("Session-Token")
+        auth = get_auth_context(request)
 
-        if not SESSION_TOKEN:
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
-        try:
-            user_session = Session.objects.get(session_token=SESSION_TOKEN)
+        if not auth.session:
+            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
 
-            session_expiry = user_session.expiry
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # If session is valid, check user for permissions
+        user = auth.user
+        if user.has_permission("delete_record") and user.has_permission("view_dashboard"):
+            return bulk_delete_response(request, Payment.objects.all(), "Payment record with id {id} not found.")
 
-            if timezone.now() > session_expiry:
-                return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            # If session is valid, check user for permissions
-            user = user_session.user
-            if user.has_permission("delete_record") and user.has_permission("view_dashboard"):
-
-                for id in payments:
-                    print("Deleting id:", id)
-                    try:
-                        payment = Payment.objects.get(id=id)
-                        payment.delete()
-                    except Payment.DoesNotExist:
-                        return Response({"error": f"Payment record with id {id} not found."}, status=status.HTTP_404_NOT_FOUND)
-
-                return Response({"ids": payments}, status=status.HTTP_200_OK)
-
-            return Response({"error": "You do not have permission to delete records."}, status=status.HTTP_403_FORBIDDEN)
-        except Session.DoesNotExist:
-            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({"error": "User associated with this session does not exist."}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({"error": "You do not have permission to delete records."}, status=status.HTTP_403_FORBIDDEN)
         
 @api_view(['PUT'])
 @requires_csrf_token
+@coordinated_write('payments.edit_payment')
 def edit_payment(request):
     if request.method == 'PUT':
-        SESSION_TOKEN = request.headers.get("Session-Token")
+        auth = get_auth_context(request)
 
-        if not SESSION_TOKEN:
+        if not auth.token:
             return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
         
         id = request.GET.get("payment_id")
@@ -132,131 +183,144 @@ def edit_payment(request):
 
         try:
             payment = Payment.objects.get(id=id)
-            user_session = Session.objects.get(session_token=SESSION_TOKEN)
-
-            session_expiry = user_session.expiry
-
-            if session_expiry < timezone.now():
-                return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            user = user_session.user
-            if user.has_permission("edit_record") and user.has_permission("view_dashboard"):
-                serializer = PaymentSerializer(payment, data=new_data, partial=True)
-                if serializer.is_valid():
-                    serializer.save()
-                    return Response({"ids": [serializer.data["id"]]}, status=status.HTTP_200_OK)
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
         except Payment.DoesNotExist:
             return Response({"error": "Payment record not found."}, status=status.HTTP_404_NOT_FOUND)
-        except Session.DoesNotExist:
+
+        if not auth.session:
             return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
 
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        user = auth.user
+        if user.has_permission("edit_record") and user.has_permission("view_dashboard"):
+            serializer = PaymentSerializer(payment, data=new_data, partial=True)
+            if serializer.is_valid():
+                serializer.save()
+                return Response({"ids": [serializer.data["id"]]}, status=status.HTTP_200_OK)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 
 @api_view(['GET'])
+@replica_reads
 def get_payment_details(request, payment_id):
     """Get all payment details for a specific payment"""
-    authorization_header = request.headers.get("Authorization")
-    if not authorization_header:
+    auth = get_auth_context(request)
+    if not auth.token:
         return Response({"error": "Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    if not verify_session(authorization_header):
+    if not auth.is_valid:
         return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    user = get_user_from_session(authorization_header)
+    user = auth.user
     if not user.has_permission("view_dashboard"):
         return Response({"error": "You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
     
-    try:
-        payment = Payment.objects.get(id=payment_id)
-        payment_details = payment.payment_details.all()
-        
-        # Return both payment info and details
-        payment_serializer = PaymentSerializer(payment)
-        details_serializer = PaymentDetailSerializer(payment_details, many=True)
-        
-        return Response({
-            "payment": payment_serializer.data,
-            "details": details_serializer.data,
-            "months_paid": payment.months_paid,
-            "can_add_payment": payment.remaining_balance > 0
-        }, status=status.HTTP_200_OK)
-        
-    except Payment.DoesNotExist:
-        return Response({"error": "Payment record not found."}, status=status.HTTP_404_NOT_FOUND)
+    def respond():
+        try:
+            payment = Payment.objects.get(id=payment_id)
+            try:
+                payment_details = apply_filters(request, payment.payment_details.all(), PAYMENT_DETAIL_FILTERS)
+            except ValidationError as e:
+                return Response({"error": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+            
+            return Response(payment_details_data(payment, payment_details), status=status.HTTP_200_OK)
+            
+        except Payment.DoesNotExist:
+            return Response({"error": "Payment record not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    return conditional_response(request, ['payments'], respond)
+
+
+@require_GET
+@replica_reads
+async def aget_payment_details(request, payment_id):
+    """get_payment_details for the ASGI deployment (see backend/async_views.py)"""
+    auth = await aget_auth_context(request)
+    if not auth.token:
+        return json_response({"error": "Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.is_valid:
+        return json_response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    if not auth.has_permission("view_dashboard"):
+        return json_response({"error": "You do not have permission to view this resource."}, status=status.HTTP_403_FORBIDDEN)
+
+    async def respond():
+        payment = await Payment.objects.filter(id=payment_id).afirst()
+        if payment is None:
+            return json_response({"error": "Payment record not found."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            details = apply_filters(api_request(request), payment.payment_details.all(), PAYMENT_DETAIL_FILTERS)
+            details = [detail async for detail in details]
+        except ValidationError as e:
+            return json_response({"error": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return json_response(payment_details_data(payment, details))
+
+    return await aconditional_response(request, ['payments'], respond)
+
+
+def payment_details_data(payment, details):
+    """Body of the payment details endpoint: the payment and its (already filtered) details"""
+    return {
+        "payment": PaymentSerializer(payment).data,
+        "details": PaymentDetailSerializer(details, many=True).data,
+        "months_paid": payment.months_paid,
+        "can_add_payment": payment.remaining_balance > 0
+    }
 
 
 @api_view(['POST'])
 @requires_csrf_token
+@coordinated_write('payments.add_payment_detail')
 def add_payment_detail(request, payment_id):
-    """Add a new payment detail to an existing payment"""
-    authorization_header = request.headers.get("Authorization")
-    if not authorization_header:
+    """
+    Add a new payment detail to an existing payment. Clients may send an
+    Idempotency-Key header (or idempotency_key field) so a retried request
+    returns the original posting instead of adding a second one.
+    """
+    auth = get_auth_context(request)
+    if not auth.token:
         return Response({"error": "Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    if not verify_session(authorization_header):
+    if not auth.is_valid:
         return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    user = get_user_from_session(authorization_header)
+    user = auth.user
     if not user.has_permission("add_record") or not user.has_permission("view_dashboard"):
         return Response({"error": "You do not have permission to perform this action."}, status=status.HTTP_403_FORBIDDEN)
     
-    try:
-        payment = Payment.objects.get(id=payment_id)
-        
-        # Check if payment is already completed
-        if payment.remaining_balance <= 0:
-            return Response({
-                "error": "Payment is already completed. No additional payments can be added.",
-                "type": "payment_completed"
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Validate payment amount
-        payment_amount = float(request.data.get('amount', 0))
-        if payment_amount <= 0:
-            return Response({"error": "Payment amount must be greater than 0."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if payment_amount > payment.remaining_balance:
-            return Response({
-                "error": f"Payment amount ({payment_amount}) cannot exceed remaining balance ({payment.remaining_balance}).",
-                "type": "amount_exceeds_balance"
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Create payment detail
-        data = request.data.copy()
-        data['payment'] = payment_id
-        data['created_by'] = user.username
-        
-        serializer = PaymentDetailSerializer(data=data)
-        if serializer.is_valid():
-            serializer.save()
-            
-            # Return updated payment info
-            updated_payment = PaymentSerializer(payment).data
-            return Response({
-                "payment_detail": serializer.data,
-                "updated_payment": updated_payment,
-                "message": "Payment added successfully"
-            }, status=status.HTTP_201_CREATED)
-        
+    data = request.data.copy()
+    if request.headers.get('Idempotency-Key'):
+        data['idempotency_key'] = request.headers['Idempotency-Key']
+    serializer = PaymentPostingSerializer(data=data)
+    if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        
-    except Payment.DoesNotExist:
-        return Response({"error": "Payment record not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        detail, created = PaymentDetail.post(payment_id, created_by=user.username, **serializer.validated_data)
+    except PaymentRejected as e:
+        return Response({"error": str(e), "type": e.kind}, status=POSTING_ERROR_STATUS.get(e.kind, status.HTTP_400_BAD_REQUEST))
+
+    # Return updated payment info
+    return Response({
+        "payment_detail": PaymentDetailSerializer(detail).data,
+        "updated_payment": PaymentSerializer(detail.payment).data,
+        "message": "Payment added successfully" if created else "Payment was already added with this idempotency key",
+    }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
 
 @api_view(['PUT'])
 @requires_csrf_token
+@coordinated_write('payments.edit_payment_detail')
 def edit_payment_detail(request, detail_id):
     """Edit a specific payment detail"""
-    authorization_header = request.headers.get("Authorization")
-    if not authorization_header:
+    auth = get_auth_context(request)
+    if not auth.token:
         return Response({"error": "Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    if not verify_session(authorization_header):
+    if not auth.is_valid:
         return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    user = get_user_from_session(authorization_header)
+    user = auth.user
     if not user.has_permission("edit_record") or not user.has_permission("view_dashboard"):
         return Response({"error": "You do not have permission to perform this action."}, status=status.HTTP_403_FORBIDDEN)
     
@@ -264,7 +328,12 @@ def edit_payment_detail(request, detail_id):
         payment_detail = PaymentDetail.objects.get(id=detail_id)
         
         # Validate payment amount
-        payment_amount = float(request.data.get('amount', 0))
+        try:
+            payment_amount = Decimal(str(request.data.get('amount', 0)))
+        except InvalidOperation:
+            payment_amount = None
+        if payment_amount is None or not payment_amount.is_finite():
+            return Response({"error": "Payment amount must be a number."}, status=status.HTTP_400_BAD_REQUEST)
         if payment_amount <= 0:
             return Response({"error": "Payment amount must be greater than 0."}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -285,16 +354,17 @@ def edit_payment_detail(request, detail_id):
 
 
 @api_view(['DELETE'])
+@coordinated_write('payments.delete_payment_detail')
 def delete_payment_detail(request, detail_id):
     """Delete a specific payment detail"""
-    authorization_header = request.headers.get("Authorization")
-    if not authorization_header:
+    auth = get_auth_context(request)
+    if not auth.token:
         return Response({"error": "Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    if not verify_session(authorization_header):
+    if not auth.is_valid:
         return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
     
-    user = get_user_from_session(authorization_header)
+    user = auth.user
     if not user.has_permission("delete_record") or not user.has_permission("view_dashboard"):
         return Response({"error": "You do not have permission to perform this action."}, status=status.HTTP_403_FORBIDDEN)
     
@@ -307,4 +377,63 @@ def delete_payment_detail(request, detail_id):
         }, status=status.HTTP_200_OK)
         
     except PaymentDetail.DoesNotExist:
-        return Response({"error": "Payment detail not found."}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        return Response({"error": "Payment detail not found."}, status=status.HTTP_404_NOT_FOUND)
+
+@api_view(['POST'])
+@requires_csrf_token
+def import_payments(request):
+    if request.method == 'POST':
+        auth = get_auth_context(request)
+
+        if not auth.token:
+            return Response({"error": "Session token is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not auth.session:
+            return Response({"error": "Invalid session token."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if auth.is_expired:
+            return Response({"error": "Session has expired. Please log in again."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        user = auth.user
+        if user.has_permission("add_record") and user.has_permission("view_dashboard"):
+            return import_response(request, PAYMENT_IMPORTER, 'payments.import_payments')
+
+        return Response({"error": "You do not have permission to add records."}, status=status.HTTP_403_FORBIDDEN)
+
+@api_view(['GET'])
+@replica_reads
+def export_payments(request):
+    """Stream all payments with their ledger totals as CSV"""
+    auth = get_auth_context(request)
+    if not auth.token:
+        return Response({"error": "Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    if not auth.is_valid:
+        return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    if not auth.has_permission("view_records", "view_dashboard"):
+        return Response({"error": "You do not have permission to view these records."}, status=status.HTTP_403_FORBIDDEN)
+
+    filename = f"payments-{timezone.localdate():%Y-%m-%d}.csv"
+    return csv_response(request, Payment.objects.all(), PAYMENT_EXPORT_COLUMNS, filename,
+                        filters=PAYMENT_FILTERS, orderings=PAYMENT_ORDERINGS)
+
+
+@api_view(['GET'])
+@replica_reads
+def export_payment_ledger(request):
+    """Stream every payment detail (optionally one payment's, or a date range) as CSV"""
+    auth = get_auth_context(request)
+    if not auth.token:
+        return Response({"error": "Authorization header is missing."}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    if not auth.is_valid:
+        return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    if not auth.has_permission("view_records", "view_dashboard"):
+        return Response({"error": "You do not have permission to view these records."}, status=status.HTTP_403_FORBIDDEN)
+
+    filename = f"payment-ledger-{timezone.localdate():%Y-%m-%d}.csv"
+    return csv_response(request, PaymentDetail.objects.all(), LEDGER_EXPORT_COLUMNS, filename,
+                        filters=LEDGER_FILTERS, orderings={'payment_date': 'payment_date'},
+                        default_ordering='payment_date')
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+# role id -> (frozenset of permission codes, loaded_at)
+_role_permissions = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_generation = 0
+
+
+def _ttl():
+    # Signals only reach the process that made the change, so other workers
+    # fall back to this TTL to pick up permission edits.
+    return getattr(settings, "ROLE_PERMISSION_CACHE_TTL", 300)
+
+
+def get_role_permissions(role_id):
+    """Return the permission codes of a role, loading them on a cache miss"""
+    if role_id is None:
+        return frozenset()
+
+    with _lock:
+        entry = _role_permissions.get(role_id)
+        if entry is not None and time.monotonic() - entry[1] < _ttl():
+            _stats["hits"] += 1
+            return entry[0]
+        _stats["misses"] += 1
+        generation = _generation
+
+    from .models import Permission
+    codes = frozenset(Permission.objects.filter(roles__id=role_id).values_list("code", flat=True))
+
+    with _lock:
+        # Skip the store if an invalidation ran while we were querying
+        if generation == _generation:
+            _role_permissions[role_id] = (codes, time.monotonic())
+    return codes
+
+
+def invalidate_role_permissions(role_ids=None):
+    """Drop cached permissions for the given role ids, or for every role"""
+    role_ids = list(role_ids) if role_ids is not None else None
+    with _lock:
+        _stats["invalidations"] += 1
+    _invalidate(role_ids)
+    # Again once committed, so a reader that loaded the old rows mid-transaction is evicted
+    transaction.on_commit(lambda: _invalidate(role_ids))
+
+
+def _invalidate(role_ids):
+    global _generation
+    with _lock:
+        _generation += 1
+        if role_ids is None:
+            _role_permissions.clear()
+        else:
+            for role_id in role_ids:
+                _role_permissions.pop(role_id, None)
+
+
+def get_cache_stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "size": len(_role_permissions),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
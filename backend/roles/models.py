@@ -1,4 +1,7 @@
 from django.db import models
+from django.dispatch import receiver
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from .cache import invalidate_role_permissions
 
 # Create your models here.
 class Permission(models.Model):
@@ -15,4 +18,24 @@ class Role(models.Model):
 
     def __str__(self):
         return self.name
-    
\ No newline at end of file
+    
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def invalidate_permissions_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached permissions when a role's permission set changes"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # instance is a Permission; pk_set holds role ids (None on clear)
+        invalidate_role_permissions(pk_set)
+    else:
+        invalidate_role_permissions([instance.pk])
+
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_permissions_on_role_change(sender, instance, **kwargs):
+    invalidate_role_permissions([instance.pk])
+
+@receiver([post_save, post_delete], sender=Permission)
+def invalidate_permissions_on_permission_change(sender, instance, **kwargs):
+    """A renamed or removed permission code can affect every role"""
+    invalidate_role_permissions()
@@ -1,3 +1,48 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from .cache import get_role_permissions, invalidate_role_permissions
+from .models import Permission, Role
+
+
+class RolePermissionCacheTests(TestCase):
+    def setUp(self):
+        invalidate_role_permissions()
+        self.view = Permission.objects.create(code="view_dashboard")
+        self.role = Role.objects.create(name="Staff")
+        self.role.permissions.set([self.view])
+
+    def test_repeated_lookups_are_served_from_memory(self):
+        self.assertEqual(get_role_permissions(self.role.pk), {"view_dashboard"})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_role_permissions(self.role.pk), {"view_dashboard"})
+
+    def test_role_permission_changes_invalidate(self):
+        get_role_permissions(self.role.pk)
+        delete = Permission.objects.create(code="delete_record")
+
+        self.role.permissions.add(delete)
+        self.assertEqual(get_role_permissions(self.role.pk), {"view_dashboard", "delete_record"})
+
+        # From the permission's side of the relation
+        self.view.roles.remove(self.role)
+        self.assertEqual(get_role_permissions(self.role.pk), {"delete_record"})
+
+    def test_renamed_permission_invalidates_every_role(self):
+        get_role_permissions(self.role.pk)
+
+        self.view.code = "view_reports"
+        self.view.save()
+
+        self.assertEqual(get_role_permissions(self.role.pk), {"view_reports"})
+
+    @override_settings(ROLE_PERMISSION_CACHE_TTL=0)
+    def test_entries_expire_after_the_ttl(self):
+        get_role_permissions(self.role.pk)
+
+        with self.assertNumQueries(1):
+            get_role_permissions(self.role.pk)
+
+    def test_users_without_a_role_have_no_permissions(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_role_permissions(None), frozenset())
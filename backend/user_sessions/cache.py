@@ -0,0 +1,98 @@
+import copy
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+# token -> (session with user and role loaded, cached_until)
+_sessions = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+_generation = 0
+
+
+def _ttl():
+    # Signals only reach the process that made the change, so a logout in
+    # another worker takes effect here once this TTL runs out.
+    return getattr(settings, "SESSION_TOKEN_CACHE_TTL", 60)
+
+
+def _max_size():
+    return getattr(settings, "SESSION_TOKEN_CACHE_SIZE", 1024)
+
+
+def _detached(session):
+    """Per-request copy, so no request sees another's attributes (e.g. loaded permission codes)"""
+    session = copy.copy(session)
+    user = copy.copy(session.user)
+    user.__dict__.pop("_permission_codes", None)
+    session.user = user
+    return session
+
+
+def get_session(token):
+    """Return the Session for a token with user and role loaded, or None; recently used tokens skip the query"""
+    now = timezone.now()
+    with _lock:
+        entry = _sessions.get(token)
+        if entry is not None and now < entry[1]:
+            _sessions.move_to_end(token)
+            _stats["hits"] += 1
+            return _detached(entry[0])
+        _stats["misses"] += 1
+        generation = _generation
+
+    from .models import Session
+    session = Session.objects.select_related("user__role").filter(session_token=token).first()
+    if session is None:
+        # Unknown tokens are not cached, so guessing cannot fill the cache
+        return None
+
+    # Never serve a session from the cache past its own expiry
+    cached_until = min(now + timedelta(seconds=_ttl()), session.expiry)
+    with _lock:
+        # Skip the store if an invalidation ran while we were querying
+        if generation == _generation and now < cached_until:
+            _sessions[token] = (session, cached_until)
+            _sessions.move_to_end(token)
+            while len(_sessions) > _max_size():
+                _sessions.popitem(last=False)
+                _stats["evictions"] += 1
+    return _detached(session)
+
+
+def invalidate_sessions(tokens=None, user_id=None):
+    """Drop cached sessions by token, by user, or all of them"""
+    tokens = list(tokens) if tokens is not None else None
+    with _lock:
+        _stats["invalidations"] += 1
+    _invalidate(tokens, user_id)
+    # Again once committed, so a reader that loaded the old row mid-transaction is evicted
+    transaction.on_commit(lambda: _invalidate(tokens, user_id))
+
+
+def _invalidate(tokens, user_id):
+    global _generation
+    with _lock:
+        _generation += 1
+        if tokens is None and user_id is None:
+            _sessions.clear()
+            return
+        for token in tokens or ():
+            _sessions.pop(token, None)
+        if user_id is not None:
+            for token in [token for token, (session, _) in _sessions.items() if session.user_id == user_id]:
+                del _sessions[token]
+
+
+def get_cache_stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "size": len(_sessions),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
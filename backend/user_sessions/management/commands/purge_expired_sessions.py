@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from user_sessions.models import SESSION_LIFETIME, RevokedToken, Session
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions in batches. Meant to run periodically, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report expired sessions without deleting them.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Sessions deleted per transaction.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now()
+        expired = Session.objects.filter(expiry__lte=cutoff)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{expired.count()} expired session(s).")
+            return
+
+        batch_size = options["batch_size"]
+        deleted = 0
+        while True:
+            ids = list(expired.order_by("expiry").values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                deleted += Session.objects.filter(pk__in=ids).delete()[0]
+
+        # Revocations older than a session lifetime cannot match an unexpired signed token
+        revocations, _ = RevokedToken.objects.filter(revoked_at__lt=cutoff - SESSION_LIFETIME).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} expired session(s) and {revocations} stale token revocation(s)."
+        ))
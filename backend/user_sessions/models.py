@@ -1,15 +1,28 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.timezone import timedelta, now
 from users.models import User
 
+from .cache import invalidate_sessions
+from .tokens import revoke_user_tokens, signed_tokens_enabled
+
 import secrets
 import string
 
+SESSION_LIFETIME = timedelta(hours=12)
+
+
+def default_expiry():
+    # Evaluated per session; a value computed at import would already be past in long-running workers
+    return now() + SESSION_LIFETIME
+
+
 # Create your models here.
 class Session(models.Model):
     session_token = models.CharField(max_length=67, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    expiry = models.DateTimeField(default=now() + timedelta(hours=12))
+    expiry = models.DateTimeField(default=default_expiry, db_index=True)
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='session')
 
     
@@ -23,3 +36,36 @@ class Session(models.Model):
         session = cls(session_token=token, user=user)
         session.save()
         return session
+
+
+class RevokedToken(models.Model):
+    """
+    A signed token that is no longer accepted (see user_sessions.tokens):
+    either the one with `jti`, or every token of `user_id` issued before
+    `revoked_at`. Rows older than SESSION_LIFETIME can no longer match an
+    unexpired token and are removed by purge_expired_sessions.
+    """
+    jti = models.CharField(max_length=32, unique=True, null=True, blank=True)
+    # Not a foreign key: revocations must outlive a deleted user
+    user_id = models.IntegerField(null=True, blank=True)
+    revoked_at = models.DateTimeField(default=now, db_index=True)
+
+    def __str__(self):
+        return f"Revoked {self.jti or f'all tokens of user {self.user_id}'} at {self.revoked_at}"
+
+
+@receiver([post_save, post_delete], sender=Session)
+def invalidate_cached_session(sender, instance, **kwargs):
+    """Drop a cached token on login, logout or any other change to its session"""
+    invalidate_sessions([instance.session_token])
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user_sessions(sender, instance, created=False, **kwargs):
+    """Cached sessions carry the user and role, so refresh them when the user changes"""
+    invalidate_sessions(user_id=instance.pk)
+
+    # Signed tokens embed the role id: sign the user out when it changes or the user is removed
+    deleted = kwargs.get('signal') is post_delete
+    if signed_tokens_enabled() and not created and (deleted or instance.role_id != getattr(instance, '_loaded_role_id', instance.role_id)):
+        revoke_user_tokens(instance.pk)
+    instance._loaded_role_id = instance.role_id
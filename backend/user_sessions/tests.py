@@ -1,3 +1,109 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from backend.testing import SignedInMixin, auth_headers, create_user
+from roles.models import Role
+from users.models import User
+
+from . import tokens
+from .utils import aget_auth_context
+from .views import averify_token
+
+
+class VerifyTokenTests(SignedInMixin, TestCase):
+
+    def verify(self, **headers):
+        return self.client.get("/api/verify-token/", headers=headers)
+
+    def test_valid_token(self):
+        response = self.verify(**{"Session-Token": self.token})
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_token(self):
+        response = self.verify(**{"Session-Token": "unknown"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_checks_session_token_header_not_authorization(self):
+        response = self.verify(**{
+            "Authorization": f"Session {self.token}",
+            "Session-Token": "unknown",
+        })
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_twin_checks_session_token_header(self):
+        request = AsyncRequestFactory().get("/api/verify-token/", headers={
+            "Authorization": f"Session {self.token}",
+            "Session-Token": "unknown",
+        })
+        # As resolved by the middleware, from the Authorization header
+        await aget_auth_context(request)
+        response = await averify_token(request)
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(SESSION_SIGNED_TOKENS=True, AUDIT_ASYNC=False)
+class SignedTokenTests(TestCase):
+    def setUp(self):
+        # The revocation list is per process; give each test its own
+        patcher = mock.patch.object(tokens, "_revocations", tokens.RevocationList())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = create_user(password="secret")
+
+    def issue(self, expires_in=timedelta(hours=1), issued_ago=timedelta(0)):
+        now = timezone.now()
+        return tokens.issue_token(self.user, now + expires_in, now - issued_ago)
+
+    def verify(self, token):
+        return self.client.get("/api/verify-token/", headers={"Session-Token": token}).status_code
+
+    def login(self):
+        response = self.client.post("/api/users/login-api/", {"username": "staff", "password": "secret"})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["session_token"]
+
+    def test_login_issues_a_signed_token(self):
+        token = self.login()
+
+        self.assertTrue(tokens.is_signed_token(token))
+        self.assertEqual(tokens.read_token(token)["u"], self.user.pk)
+        self.assertEqual(self.verify(token), 200)
+
+    def test_expired_and_tampered_tokens(self):
+        self.assertEqual(self.verify(self.issue(expires_in=-timedelta(seconds=1))), 401)
+        self.assertEqual(self.verify(self.issue()[:-2] + "xx"), 404)
+
+    def test_logout_revokes_only_that_token(self):
+        token, other = self.login(), self.issue()
+
+        response = self.client.delete("/api/users/logout-api/", headers=auth_headers(token))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.verify(token), 404)
+        self.assertEqual(self.verify(other), 200)
+
+    def test_new_login_revokes_earlier_tokens(self):
+        earlier = self.issue(issued_ago=timedelta(seconds=1))
+        token = self.login()
+
+        self.assertEqual(self.verify(earlier), 404)
+        self.assertEqual(self.verify(token), 200)
+
+    def test_role_change_revokes_tokens(self):
+        token = self.issue(issued_ago=timedelta(seconds=1))
+        user = User.objects.get(pk=self.user.pk)
+        user.role = Role.objects.create(name="Viewer")
+        user.save()
+
+        self.assertEqual(self.verify(token), 404)
+
+    def test_revocations_reach_other_processes(self):
+        token = self.issue()
+        tokens.revoke_token(token)
+
+        # Another worker only learns about it from the RevokedToken rows
+        with mock.patch.object(tokens, "_revocations", tokens.RevocationList()):
+            self.assertEqual(self.verify(token), 404)
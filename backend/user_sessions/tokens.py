@@ -0,0 +1,130 @@
+"""
+Stateless signed session tokens (enabled with SESSION_SIGNED_TOKENS).
+
+A signed token carries the user id, username, role id, expiry, issue time
+and a random id (jti), signed with SECRET_KEY, so any worker can verify it
+without a database query. Opaque tokens (Session.session_token) keep
+working alongside them. Logouts revoke one jti; a new login or a role change
+revokes every token of the user issued before it. Revocations are stored in
+RevokedToken and mirrored in a per-process list refreshed every
+SESSION_REVOCATION_REFRESH seconds, so a logout in another worker takes
+effect within that interval.
+"""
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+SALT = "user_sessions.tokens"
+
+
+def signed_tokens_enabled():
+    return getattr(settings, "SESSION_SIGNED_TOKENS", False)
+
+
+def is_signed_token(token):
+    # Opaque tokens are alphanumeric; signed ones always contain the signer's separator
+    return bool(token) and ":" in token
+
+
+def _millis(value):
+    return int(value.timestamp() * 1000)
+
+
+def issue_token(user, expiry, issued_at=None):
+    """Return a signed token for `user` valid until `expiry`"""
+    issued_at = issued_at or timezone.now()
+    payload = {
+        "u": user.pk,
+        "n": user.username,
+        "r": user.role_id,
+        "e": _millis(expiry),
+        "i": _millis(issued_at),
+        "j": secrets.token_hex(8),
+    }
+    return signing.dumps(payload, salt=SALT, compress=True)
+
+
+def read_token(token):
+    """Return the payload of a correctly signed, unrevoked token, or None. Expiry is left to the caller."""
+    try:
+        payload = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        return None
+    if _revocations.is_revoked(payload):
+        return None
+    payload["expiry"] = datetime.fromtimestamp(payload["e"] / 1000, dt_timezone.utc)
+    return payload
+
+
+def revoke_token(token):
+    """Revoke one signed token (logout)"""
+    payload = read_token(token)
+    if payload is not None:
+        _revocations.add(jti=payload["j"])
+
+
+def revoke_user_tokens(user_id, before=None):
+    """Revoke every token of a user issued before `before` (default: now)"""
+    _revocations.add(user_id=user_id, revoked_at=before or timezone.now())
+
+
+class RevocationList:
+    """Per-process copy of the RevokedToken rows that can still match an unexpired token"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis = {}
+        self._user_cutoffs = {}
+        self._loaded_at = None
+
+    def _interval(self):
+        return getattr(settings, "SESSION_REVOCATION_REFRESH", 30)
+
+    def is_revoked(self, payload):
+        self._refresh()
+        with self._lock:
+            return payload["j"] in self._jtis or payload["i"] < self._user_cutoffs.get(payload["u"], float("-inf"))
+
+    def add(self, jti=None, user_id=None, revoked_at=None):
+        from .models import RevokedToken
+
+        revoked_at = revoked_at or timezone.now()
+        RevokedToken.objects.create(jti=jti, user_id=user_id, revoked_at=revoked_at)
+        self._remember(jti, user_id, revoked_at)
+
+    def _remember(self, jti, user_id, revoked_at):
+        with self._lock:
+            revoked_at = _millis(revoked_at)
+            if jti:
+                self._jtis[jti] = revoked_at
+            if user_id is not None:
+                self._user_cutoffs[user_id] = max(revoked_at, self._user_cutoffs.get(user_id, revoked_at))
+
+    def _refresh(self):
+        with self._lock:
+            loaded_at = self._loaded_at
+            if loaded_at is not None and time.monotonic() - loaded_at[0] < self._interval():
+                return
+            self._loaded_at = (time.monotonic(), timezone.now())
+
+        from .models import SESSION_LIFETIME, RevokedToken
+
+        # Re-read a margin before the last load, so rows committed late are not missed
+        since = loaded_at[1] - timedelta(seconds=self._interval()) if loaded_at else timezone.now() - SESSION_LIFETIME
+        rows = RevokedToken.objects.filter(revoked_at__gte=since).values_list("jti", "user_id", "revoked_at")
+        for jti, user_id, revoked_at in rows:
+            self._remember(jti, user_id, revoked_at)
+
+        # Tokens issued before this have expired, so older revocations can be forgotten
+        horizon = _millis(timezone.now() - SESSION_LIFETIME)
+        with self._lock:
+            self._jtis = {jti: at for jti, at in self._jtis.items() if at >= horizon}
+            self._user_cutoffs = {user_id: at for user_id, at in self._user_cutoffs.items() if at >= horizon}
+
+
+_revocations = RevocationList()
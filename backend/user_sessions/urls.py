@@ -1,7 +1,9 @@
 from django.urls import path
 
-from .views import verify_token
+from backend.async_views import read_view
+
+from .views import averify_token, verify_token
 
 urlpatterns = [
-    path('verify-token/', verify_token, name='verify_token'),
+    path('verify-token/', read_view(verify_token, averify_token), name='verify_token'),
 ]
\ No newline at end of file
@@ -1,13 +1,36 @@
+from .cache import get_session
 from .models import Session
+from .tokens import is_signed_token, read_token, revoke_token, signed_tokens_enabled
+from asgiref.sync import sync_to_async
 from django.utils import timezone
+from users.models import User
 
 def format_token(token):
     if token.startswith('Session '):
         token = token.split(' ')[1]
     return token
 
+def signed_session(token):
+    """
+    Build an unsaved Session and User from a signed token, without a query.
+    The user only has id, username and role_id set and must not be saved.
+    """
+    if not signed_tokens_enabled():
+        return None
+    payload = read_token(token)
+    if payload is None:
+        return None
+
+    user = User(id=payload['u'], username=payload['n'], role_id=payload['r'])
+    user._state.adding = False
+    user._state.db = 'default'
+    return Session(session_token=token, user=user, expiry=payload['expiry'])
+
 def verify_session(session_token):
     session_token = format_token(session_token)
+    if is_signed_token(session_token):
+        session = signed_session(session_token)
+        return None if session is None else session.expiry > timezone.now()
     
     try:
         session = Session.objects.get(session_token=session_token)
@@ -19,12 +42,104 @@ def verify_session(session_token):
 
 def get_user_from_session(session_token):
     session_token = format_token(session_token)
-    
-    try:
-        session = Session.objects.get(session_token=session_token)
-    except Session.DoesNotExist:
+    if is_signed_token(session_token):
+        session = signed_session(session_token)
+    else:
+        session = Session.objects.filter(session_token=session_token).first()
+    if session is None:
         return None
     
     if session.expiry > timezone.now():
         return session.user
     return None
+
+
+class AuthContext:
+    """Session, user and permission codes resolved once for a request."""
+
+    def __init__(self, token=None, session=None, permissions=frozenset()):
+        self.token = token
+        self.session = session
+        self.permissions = permissions
+
+    @property
+    def is_expired(self):
+        return self.session is not None and self.session.expiry <= timezone.now()
+
+    @property
+    def is_valid(self):
+        return self.session is not None and not self.is_expired
+
+    @property
+    def user(self):
+        return self.session.user if self.is_valid else None
+
+    def has_permission(self, *permission_codes):
+        return self.is_valid and all(code in self.permissions for code in permission_codes)
+
+
+def get_request_token(request):
+    """Read the session token from the Authorization or Session-Token header"""
+    authorization_header = request.headers.get("Authorization", "")
+    if authorization_header:
+        return format_token(authorization_header)
+    return request.headers.get("Session-Token") or None
+
+
+def load_auth_context(token):
+    """Load session, user and role from a signed token, the token cache or a single joined query"""
+    if not token:
+        return AuthContext()
+
+    session = signed_session(token) if is_signed_token(token) else get_session(token)
+    if session is None:
+        return AuthContext(token)
+
+    # Permission codes come from the per-process role cache
+    return AuthContext(token, session, session.user.get_permission_codes())
+
+
+def get_auth_context(request):
+    """Return the request's AuthContext, resolving it on first access"""
+    request = getattr(request, '_request', request) # unwrap DRF requests
+    context = getattr(request, 'auth_context', None)
+    if context is None:
+        context = load_auth_context(get_request_token(request))
+        request.auth_context = context
+    return context
+
+
+async def aget_auth_context(request):
+    """Async get_auth_context(); under ASGI the middleware has usually resolved it already"""
+    request = getattr(request, '_request', request)
+    context = getattr(request, 'auth_context', None)
+    if context is None:
+        # The session and role caches are thread-safe, not async; load them in a thread
+        context = await sync_to_async(get_auth_context)(request)
+    return context
+
+
+def get_token_auth_context(request, token):
+    """
+    AuthContext for a token taken from a specific header, which may differ
+    from the one the request authenticates with; reuses the request's context
+    when it was resolved from the same token.
+    """
+    token = format_token(token)
+    request = getattr(request, '_request', request)
+    context = getattr(request, 'auth_context', None)
+    if context is not None and context.token == token:
+        return context
+    return load_auth_context(token)
+
+
+async def aget_token_auth_context(request, token):
+    return await sync_to_async(get_token_auth_context)(request, token)
+
+
+def end_session(auth):
+    """Log out: revoke a signed token, or delete the opaque token's session row"""
+    if is_signed_token(auth.token):
+        revoke_token(auth.token)
+    else:
+        auth.session.delete()
@@ -2,9 +2,11 @@ from django.shortcuts import render
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 
-from .models import Session
-from django.utils import timezone
+from backend.async_views import json_response
+from .utils import aget_token_auth_context, get_token_auth_context
 
 # Create your views here.
 @api_view(['GET', 'POST'])
@@ -13,20 +15,29 @@ def verify_token(request):
     if not token:
         return Response({'error': 'Token is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Here you would typically verify the token with your authentication backend
-    # Replace with actual token validation logic
-    try:
-        session = Session.objects.get(session_token=token)
-        if session.expiry > timezone.now():
-            is_valid = True
-        else:
-            is_valid = False
-    except Session.DoesNotExist:
-        is_valid = False
+    # The token in Session-Token, even when an Authorization header carries another
+    auth = get_token_auth_context(request, token)
+    if not auth.session:
         return Response({'message': 'Session does not exist'}, status=status.HTTP_404_NOT_FOUND)
-    
+    is_valid = auth.is_valid
 
     if is_valid:
         return Response({'message': 'Token is valid'}, status=status.HTTP_200_OK)
     else:
         return Response({'error': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
+
+
+@csrf_exempt # like every DRF view
+@require_http_methods(['GET', 'POST'])
+async def averify_token(request):
+    """verify_token for the ASGI deployment (see backend/async_views.py)"""
+    token = request.headers.get('Session-Token')
+    if not token:
+        return json_response({'error': 'Token is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    auth = await aget_token_auth_context(request, token)
+    if not auth.session:
+        return json_response({'message': 'Session does not exist'}, status=status.HTTP_404_NOT_FOUND)
+    if auth.is_valid:
+        return json_response({'message': 'Token is valid'}, status=status.HTTP_200_OK)
+    return json_response({'error': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from roles.models import Role
+from roles.cache import get_role_permissions
 
 
 class CustomUserManager(BaseUserManager):
@@ -36,9 +37,20 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored role so a role change can sign the user out
+        instance._loaded_role_id = instance.__dict__.get('role_id')
+        return instance
     
+    def get_permission_codes(self):
+        """Permission codes of the user's role, loaded once per instance"""
+        if not hasattr(self, '_permission_codes'):
+            self._permission_codes = get_role_permissions(self.role_id)
+        return self._permission_codes
+
     def has_permission(self, permission_code):
-        if not self.role:
-            return False
-        return self.role.permissions.filter(code=permission_code).exists()
+        return permission_code in self.get_permission_codes()
 
@@ -12,10 +12,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'role', 'permissions', 'role']
 
     def get_permissions(self, obj):
-        if not obj.role:
-            return []
-        
-        return list(obj.role.permissions.values_list('code', flat=True))
+        return sorted(obj.get_permission_codes())
     
 class UserCreateSerializer(serializers.ModelSerializer):
     role = RoleField(queryset=Role.objects.all())
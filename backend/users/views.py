@@ -8,10 +8,19 @@ from django.views.decorators.csrf import csrf_exempt, requires_csrf_token, ensur
 
 from .serializers import UserSerializer, UserCreateSerializer
 
-from user_sessions.utils import verify_session, get_user_from_session
+from user_sessions.tokens import issue_token, revoke_user_tokens, signed_tokens_enabled
+from user_sessions.utils import end_session, get_auth_context
+from django.utils import timezone
+from backend.listing import list_response
+from backend.bulk import bulk_delete_response
+from backend.writes import coordinated_write
+
+USER_FILTERS = {'role': 'role__name__iexact'}
+USER_ORDERINGS = {'username': 'username'}
 
 # Create your views here.
 @api_view(['POST'])
+@coordinated_write('users.login_view')
 def login_view(request):
     username = request.data.get("username")
     password = request.data.get("password")
@@ -34,40 +43,46 @@ def login_view(request):
         else: user_session = Session.create_session(user)
 
         user_session.save()
+        session_token = user_session.session_token
+        if signed_tokens_enabled():
+            # Like replacing the session row, a new login signs out the user's earlier tokens
+            issued_at = timezone.now()
+            revoke_user_tokens(user.pk, before=issued_at)
+            session_token = issue_token(user, user_session.expiry, issued_at)
+
         serialized = UserSerializer(user, many=False)
         print(serialized.data)   
-        return Response({"message": "Login successful.", "session_token": user_session.session_token, "user": serialized.data}, status=status.HTTP_200_OK)
+        return Response({"message": "Login successful.", "session_token": session_token, "user": serialized.data}, status=status.HTTP_200_OK)
     except User.DoesNotExist:
         return Response({"error": "Invalid username or password."}, status=status.HTTP_401_UNAUTHORIZED)
 
 @api_view(['DELETE'])
+@coordinated_write('users.logout_view')
 def logout_view(request):
-    authorization_header = request.headers.get("Authorization", "")
-    if authorization_header.startswith("Session "):
-        token = authorization_header.split(" ")[1]
-        try:
-            session = Session.objects.get(session_token=token)
-            session.delete()
-            return Response({"message": "Logout successful."}, status=status.HTTP_200_OK)
-        except Session.DoesNotExist:
+    auth = get_auth_context(request)
+    if auth.token:
+        if not auth.session:
             return Response({"error": "Invalid session."}, status=status.HTTP_401_UNAUTHORIZED)
+        end_session(auth)
+        return Response({"message": "Logout successful."}, status=status.HTTP_200_OK)
     return Response({"error": "Authorization header missing."}, status=status.HTTP_401_UNAUTHORIZED)
 
 @api_view(['POST'])
 @requires_csrf_token
+@coordinated_write('users.create_user')
 def create_user(request):
     if request.method == 'POST':
-        authorization_header = request.headers.get('Authorization')
+        auth = get_auth_context(request)
 
-        is_session_valid = verify_session(authorization_header)
+        is_session_valid = auth.is_valid
 
         if not is_session_valid:
             return Response({"error":"Session is invalid or expired."}, status=status.HTTP_403_FORBIDDEN)
         
-        user = get_user_from_session(authorization_header)
+        user = auth.user
 
         if not user:
-            return Response({"error":f"No user associated with token {authorization_header} was found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"error":f"No user associated with token {auth.token} was found."}, status=status.HTTP_404_NOT_FOUND)
         
         if not user.has_permission("manage_users") or not user.has_permission("view_dashboard"):
             return Response({"error":"You do not have permission to manage users."}, status=status.HTTP_403_FORBIDDEN)
@@ -86,74 +101,63 @@ def create_user(request):
 @ensure_csrf_cookie
 def list_users(request):
     if request.method == 'GET':
-        authorization_header = request.headers.get('Authorization')
+        auth = get_auth_context(request)
 
-        is_session_valid = verify_session(authorization_header)
+        is_session_valid = auth.is_valid
 
         if not is_session_valid:
             return Response({"error":"Session is invalid or expired."}, status=status.HTTP_403_FORBIDDEN)
         
-        user = get_user_from_session(authorization_header)
+        user = auth.user
 
         if not user:
-            return Response({"error":f"No user associated with token {authorization_header} was found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"error":f"No user associated with token {auth.token} was found."}, status=status.HTTP_404_NOT_FOUND)
         
         if not user.has_permission("manage_users") or not user.has_permission("view_dashboard"):
             return Response({"error":"You do not have permission to view users."}, status=status.HTTP_403_FORBIDDEN)
         
-        users = User.objects.all()
-        serialized = UserSerializer(users, many=True)
+        users = User.objects.select_related('role')
 
-        return Response(serialized.data, status=status.HTTP_200_OK)
+        return list_response(request, users, UserSerializer, filters=USER_FILTERS, orderings=USER_ORDERINGS)
     
 @api_view(['DELETE'])
 @requires_csrf_token
+@coordinated_write('users.delete_user')
 def delete_user(request):
     if request.method == 'DELETE':
-        authorization_header = request.headers.get('Authorization')
+        auth = get_auth_context(request)
 
-        is_session_valid = verify_session(authorization_header)
+        is_session_valid = auth.is_valid
 
         if not is_session_valid:
             return Response({"error":"Session is invalid or expired."}, status=status.HTTP_403_FORBIDDEN)
         
-        user = get_user_from_session(authorization_header)
+        user = auth.user
 
         if not user:
-            return Response({"error":f"No user associated with token {authorization_header} was found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"error":f"No user associated with token {auth.token} was found."}, status=status.HTTP_404_NOT_FOUND)
         
         if not user.has_permission("manage_users") or not user.has_permission("view_dashboard"):
             return Response({"error":"You do not have permission to delete users."}, status=status.HTTP_403_FORBIDDEN)
         
-        try:
-            user_ids = request.data.get('element_ids')
-            for user_to_delete in user_ids:
-                try:
-                    user_instance = User.objects.get(id=user_to_delete)
-                    user_instance.delete()
-                except User.DoesNotExist:
-                    return Response({"error":f"User with ID {user_to_delete} not found."}, status=status.HTTP_404_NOT_FOUND)
-
-            
-            return Response({"ids": user_ids}, status=status.HTTP_200_OK)
-        except User.DoesNotExist:
-            return Response({"error":"User not found."}, status=status.HTTP_404_NOT_FOUND)
+        return bulk_delete_response(request, User.objects.all(), "User with ID {id} not found.")
         
 @api_view(['PUT'])
 @requires_csrf_token
+@coordinated_write('users.edit_user')
 def edit_user(request):
     if request.method == 'PUT':
-        authorization_header = request.headers.get('Authorization')
+        auth = get_auth_context(request)
 
-        is_session_valid = verify_session(authorization_header)
+        is_session_valid = auth.is_valid
 
         if not is_session_valid:
             return Response({"error":"Session is invalid or expired."}, status=status.HTTP_403_FORBIDDEN)
         
-        user = get_user_from_session(authorization_header)
+        user = auth.user
 
         if not user:
-            return Response({"error":f"No user associated with token {authorization_header} was found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"error":f"No user associated with token {auth.token} was found."}, status=status.HTTP_404_NOT_FOUND)
         
         if not user.has_permission("manage_users") or not user.has_permission("view_dashboard"):
             return Response({"error":"You do not have permission to edit users."}, status=status.HTTP_403_FORBIDDEN)